@@ -0,0 +1,92 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# Micro-benchmark: 6502 effective address computation
+#
+#    compares the addressing mode dispatch bound at chip creation (Chip.getData)
+#    with the previous if/elif chain walked on each execution (legacyGetData below)
+#    for LDA absoluteX and LDA indirectY
+#
+#    usage: python benchmark/bench_6502_addressing.py [number of loads]
+#
+
+import os
+import sys
+import timeit
+
+# same search path as the board_simulator launcher
+srcDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+for subDir in ("", "hardware", os.path.join("hardware", "arch"), os.path.join("hardware", "device")):
+    sys.path.insert(0, os.path.join(srcDir, subDir))
+
+import libproc
+from board import Board
+from processor import Parameter
+
+
+def legacyGetAddress(chip, board, parameter):
+    "Previous implementation: addressing mode found by comparing it with each mode"
+    ptype = parameter.getAddressing()
+    pvalue = parameter.getValue()
+    psize = parameter.getSize()
+    if ptype == chip.zeroPage or ptype == chip.absolute:
+        address = libproc.ltoui(pvalue, psize)
+    elif ptype == chip.zeroPageX or ptype == chip.absoluteX:
+        address = libproc.ltoui(pvalue, psize)
+        address += chip.regX.get()
+    elif ptype == chip.zeroPageY or ptype == chip.absoluteY:
+        address = libproc.ltoui(pvalue, psize)
+        address += chip.regY.get()
+    elif ptype == chip.indirect:
+        address = libproc.ltoui(pvalue, psize)
+        address = board.memory.get(address, chip.getAddressSize())
+    elif ptype == chip.indirectX:
+        address = libproc.ltoui(pvalue, psize) + chip.regX.get()
+        address = board.memory.get(address, chip.getAddressSize())
+    elif ptype == chip.indirectY:
+        address = libproc.ltoui(pvalue, psize)
+        address = board.memory.get(address, chip.getAddressSize())
+        address = address + chip.regY.get()
+    return libproc.ltoui(address, chip.getAddressSize())
+
+def legacyGetData(chip, board, parameter, datasize):
+    ptype = parameter.getAddressing()
+    if ptype == chip.accumulator:
+        return chip.regA.get()
+    if ptype == chip.immediate:
+        return libproc.ltoi(parameter.getValue(), parameter.getSize())
+    address = legacyGetAddress(chip, board, parameter)
+    return board.memory.get(address, datasize)
+
+def measure(fct, number):
+    "Best of 3 runs, in nanoseconds per call"
+    return min(timeit.repeat(fct, number=number, repeat=3)) * 1e9 / number
+
+def main(argv):
+    number = 200000
+    if len(argv) > 0:
+        number = int(argv[0])
+
+    Board.getList()
+    board = Board("6502_simple", None)
+    board.build()
+    chip = board.chip
+    chip.regX.set(3)
+    chip.regY.set(5)
+    # pointer used by indirectY: $0300
+    board.memory.set(0x10, 2, 0x0300)
+
+    parameterList = [("LDA $0200,X", Parameter(chip.absoluteX, 0x0200, 2)),
+                     ("LDA ($10),Y", Parameter(chip.indirectY, 0x10, 1))]
+
+    print '{:14s}{:>12s}{:>12s}{:>10s}'.format("load", "if/elif", "dispatch", "speedup")
+    for label, parameter in parameterList:
+        assert legacyGetData(chip, board, parameter, 1) == chip.getData(board, parameter, 1)
+        legacy = measure(lambda: legacyGetData(chip, board, parameter, 1), number)
+        dispatch = measure(lambda: chip.getData(board, parameter, 1), number)
+        print '{:14s}{:>9.0f} ns{:>9.0f} ns{:>9.2f}x'.format(label, legacy, dispatch, legacy / dispatch)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,140 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# Benchmark: 6502 lockstep engine against sequential interpreter runs
+#
+#    runs a small program on N inputs: once per input with the interpreter (BoardRunner),
+#    then on N machines at once with the lockstep engine (LockstepEngine)
+#    interpreter time is measured on a sample of the inputs and scaled to N
+#    results of the sampled inputs are checked to be the same
+#
+#    programs: 8 x 8 bits multiplication by shift and add (same path for all inputs except one instruction
+#    per iteration), multiplication by repeated addition (number of iterations depends on the input)
+#
+#    usage: python benchmark/bench_6502_lockstep.py [number of machines [number of sampled interpreter runs]]
+#
+#    requires NumPy
+#
+
+import os
+import sys
+import tempfile
+import time
+
+# same search path as the board_simulator launcher
+srcDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+for subDir in ("", "hardware", os.path.join("hardware", "arch"), os.path.join("hardware", "device")):
+    sys.path.insert(0, os.path.join(srcDir, subDir))
+
+import numpy as np
+
+from boardRunner import BoardRunner
+
+
+# inputs at $0300 and $0301, product at $0302 (low byte) and $0303 (high byte)
+shiftAddProgram = """
+	ORG	$0200
+	LDA	#$00
+	LDX	#$08
+LOOP	LSR	$0300
+	BCC	SKIP
+	CLC
+	ADC	$0301
+SKIP	ROR	A
+	ROR	$0302
+	DEX
+	BNE	LOOP
+	STA	$0303
+	END
+"""
+
+repeatedAddProgram = """
+	ORG	$0200
+	LDA	#$00
+	STA	$0303
+	LDX	$0300
+	BEQ	DONE
+LOOP	CLC
+	ADC	$0301
+	BCC	NEXT
+	INC	$0303
+NEXT	DEX
+	BNE	LOOP
+DONE	STA	$0302
+	END
+"""
+
+def loadProgram(runner, text):
+    "Assemble the program text into the board of the runner"
+    handle, fileName = tempfile.mkstemp(suffix=".ass")
+    try:
+        os.write(handle, text)
+        os.close(handle)
+        if not runner.load(fileName):
+            raise Exception("program not loaded")
+    finally:
+        os.remove(fileName)
+
+def runSequential(runner, snapshot, inputList):
+    "Interpreter: one run per input, return the seconds spent and the final state of each run"
+    chip = runner.board.chip
+    memory = runner.board.memory
+    resultList = []
+    start = time.time()
+    for values in inputList:
+        runner.restore(snapshot)
+        memory.set(0x300, 1, int(values[0]))
+        memory.set(0x301, 1, int(values[1]))
+        runner.run(100000)
+        resultList.append((chip.PC.get(), chip.regA.get(), chip.regX.get(), chip.getStatus(), chip.getCycles(),
+                           memory.peek(0x302, 1) & 0xff, memory.peek(0x303, 1) & 0xff))
+    return time.time() - start, resultList
+
+def runLockstep(runner, snapshot, inputArray):
+    "Lockstep engine: one machine per input, return the seconds spent (engine creation included) and the engine"
+    runner.restore(snapshot)
+    start = time.time()
+    engine = runner.board.chip.createLockstepEngine(runner.board, len(inputArray))
+    engine.setMemory(0x300, inputArray)
+    engine.run(100000)
+    return time.time() - start, engine
+
+def checkResults(engine, sampleList, resultList):
+    "Same final state for the sampled inputs"
+    product = engine.getMemory(0x302, 2)
+    for machine, result in zip(sampleList, resultList):
+        report = engine.getReport(machine)
+        registers = report["registers"]
+        state = (registers["PC"], registers["A"], registers["X"], registers["PSR"], report["cycles"],
+                 int(product[machine, 0]), int(product[machine, 1]))
+        assert report["status"] == "end", report
+        assert state == result, (machine, state, result)
+
+def main(argv):
+    count = 30000
+    sampleCount = 200
+    if len(argv) > 0:
+        count = int(argv[0])
+    if len(argv) > 1:
+        sampleCount = int(argv[1])
+
+    runner = BoardRunner("6502_simple", detectLoop=False)
+    random = np.random.RandomState(6502)
+    inputArray = random.randint(0, 256, size=(count, 2))
+    sampleList = np.linspace(0, count - 1, min(sampleCount, count)).astype(int)
+
+    print '{} machines, interpreter measured on {} inputs'.format(count, len(sampleList))
+    print '{:22s}{:>14s}{:>12s}{:>10s}'.format("program", "interpreter", "lockstep", "speedup")
+    for label, text in (("shift and add", shiftAddProgram), ("repeated addition", repeatedAddProgram)):
+        loadProgram(runner, text)
+        snapshot = runner.snapshot()
+        sampleTime, resultList = runSequential(runner, snapshot, inputArray[sampleList])
+        sequential = sampleTime * count / len(sampleList)
+        lockstep, engine = runLockstep(runner, snapshot, inputArray)
+        checkResults(engine, sampleList, resultList)
+        print '{:22s}{:>12.2f} s{:>10.3f} s{:>9.0f}x'.format(label, sequential, lockstep, sequential / lockstep)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,10 +1,27 @@
-set PYTHONPATH=%PYTHONPATH%;src;src\Ui;src\hardware\arch;src\hardware\device
-rem check if python is defined into the path
-where python.exe
-if errorlevel 1 (
-	echo assume python is installed at the usual place
-  	C:\Python27\python.exe src\boardSimu.py
-) else (
-	echo python is included into PATH
-	python.exe src\boardSimu.py
+set PYTHONPATH=%PYTHONPATH%;src;src\Ui;src\hardware\arch;src\hardware\device
+rem --headless: execute a program without GUI (see src\boardRunner.py)
+rem --grade: execute programs against test vectors (see src\boardGrader.py)
+rem --tracediff: find the first divergence between two execution traces (see src\traceDiff.py)
+set SCRIPT=src\boardSimu.py
+set ARGS=
+if "%1"=="--headless" (
+	set SCRIPT=src\boardRunner.py
+	set ARGS=%*
+)
+if "%1"=="--grade" (
+	set SCRIPT=src\boardGrader.py
+	set ARGS=%*
+)
+if "%1"=="--tracediff" (
+	set SCRIPT=src\traceDiff.py
+	set ARGS=%*
+)
+rem check if python is defined into the path
+where python.exe
+if errorlevel 1 (
+	echo assume python is installed at the usual place
+  	C:\Python27\python.exe %SCRIPT% %ARGS%
+) else (
+	echo python is included into PATH
+	python.exe %SCRIPT% %ARGS%
 )
\ No newline at end of file
@@ -0,0 +1,81 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# Check: profile and trace of examples/arch_6502/test_timer.ass on board 6502_timer
+#
+#    the timer interrupts the idle loop 8 times: each interrupt entry is counted and recorded apart,
+#    and each line of the handler (from PHA at $0700 to RTI) is executed 8 times
+#
+#    usage: python examples/check_timer_interrupts.py
+#
+
+import os
+import sys
+import tempfile
+
+# same search path as the board_simulator launcher
+exampleDir = os.path.dirname(os.path.abspath(__file__))
+srcDir = os.path.join(exampleDir, "..", "src")
+for subDir in ("", "hardware", os.path.join("hardware", "arch"), os.path.join("hardware", "device")):
+    sys.path.insert(0, os.path.join(srcDir, subDir))
+
+from boardRunner import BoardRunner
+from traceFile import TraceReader
+
+programFile = os.path.join(exampleDir, "arch_6502", "test_timer.ass")
+handlerAddress = 0x700
+interruptCount = 8
+entryCycles = 7
+
+def checkProfile(runner):
+    "Each handler line executed once per interrupt, entries counted apart with their own cycles"
+    profiler = runner.board.profiler
+    assert profiler.getInterruptCount() == interruptCount, profiler.getInterruptCount()
+    assert profiler.getInterruptCycles() == interruptCount * entryCycles, profiler.getInterruptCycles()
+    for instLine in runner.board.program.getInstructionList():
+        if (instLine.type == instLine.Code) and (instLine.getAddress() >= handlerAddress):
+            assert profiler.getCount(instLine.getAddress()) == interruptCount, (instLine.getMnemonic(),
+                                                                                 profiler.getCount(instLine.getAddress()))
+    assert profiler.getMnemonicCount("PHA") == interruptCount
+    # the idle loop is left by its last BNE: each of its instructions is executed as many times
+    counts = [profiler.getMnemonicCount(mnemonic) for mnemonic in ("CMP", "BNE")]
+    assert counts == [profiler.getMnemonicCount("LDA") - interruptCount - 3] * 2, counts
+
+def checkTrace(reader):
+    "Each interrupt entry has its own record, followed by the record of PHA at the handler address"
+    entryList = [record for record in reader if record.isInterrupt()]
+    assert len(entryList) == interruptCount, len(entryList)
+    for entry in entryList:
+        assert entry.operand == handlerAddress
+        previous = reader[entry.index - 1]
+        assert entry.cycles - previous.cycles >= entryCycles
+        handler = reader[entry.index + 1]
+        assert (handler.address, handler.opcode) == (handlerAddress, 0x48), (entry.index, handler.address)
+        assert handler.cycles - entry.cycles == 3
+
+def main():
+    handle, traceFile = tempfile.mkstemp(suffix=".trc")
+    os.close(handle)
+    try:
+        runner = BoardRunner("6502_timer")
+        if not runner.load(programFile):
+            raise Exception("program not loaded")
+        runner.board.enableProfiler()
+        runner.board.enableTrace(traceFile)
+        try:
+            runner.run(1000000)
+        finally:
+            runner.board.disableTrace()
+        assert runner.end
+        checkProfile(runner)
+        checkTrace(TraceReader(traceFile))
+    finally:
+        os.remove(traceFile)
+    for line in runner.board.profiler.getAddressReport(runner.board.program):
+        print line
+    print "OK"
+
+if __name__ == '__main__':
+    main()
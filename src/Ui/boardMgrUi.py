@@ -76,6 +76,33 @@ class Ui_BoardMgr(object):
         self.stepButton.setSizePolicy(sizePolicy)
         self.stepButton.setObjectName(_fromUtf8("stepButton"))
         self.buttonsLayout.addWidget(self.stepButton)
+        self.breakButton = QtGui.QPushButton(self.centralwidget)
+        self.breakButton.setEnabled(False)
+        sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Fixed, QtGui.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.breakButton.sizePolicy().hasHeightForWidth())
+        self.breakButton.setSizePolicy(sizePolicy)
+        self.breakButton.setObjectName(_fromUtf8("breakButton"))
+        self.buttonsLayout.addWidget(self.breakButton)
+        self.backButton = QtGui.QPushButton(self.centralwidget)
+        self.backButton.setEnabled(False)
+        sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Fixed, QtGui.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.backButton.sizePolicy().hasHeightForWidth())
+        self.backButton.setSizePolicy(sizePolicy)
+        self.backButton.setObjectName(_fromUtf8("backButton"))
+        self.buttonsLayout.addWidget(self.backButton)
+        self.backToButton = QtGui.QPushButton(self.centralwidget)
+        self.backToButton.setEnabled(False)
+        sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Fixed, QtGui.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.backToButton.sizePolicy().hasHeightForWidth())
+        self.backToButton.setSizePolicy(sizePolicy)
+        self.backToButton.setObjectName(_fromUtf8("backToButton"))
+        self.buttonsLayout.addWidget(self.backToButton)
         spacerItem1 = QtGui.QSpacerItem(20, 40, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Expanding)
         self.buttonsLayout.addItem(spacerItem1)
         self.globalLayout.addLayout(self.buttonsLayout, 0, 2, 1, 1)
@@ -177,6 +204,12 @@ class Ui_BoardMgr(object):
         self.runButton.setText(QtGui.QApplication.translate("BoardMgr", "Run", None, QtGui.QApplication.UnicodeUTF8))
         self.stopButton.setText(QtGui.QApplication.translate("BoardMgr", "Stop", None, QtGui.QApplication.UnicodeUTF8))
         self.stepButton.setText(QtGui.QApplication.translate("BoardMgr", "Step", None, QtGui.QApplication.UnicodeUTF8))
+        self.breakButton.setToolTip(QtGui.QApplication.translate("BoardMgr", "Run at full speed until a breakpoint (double-click an instruction to set or remove a breakpoint)", None, QtGui.QApplication.UnicodeUTF8))
+        self.breakButton.setText(QtGui.QApplication.translate("BoardMgr", "To break", None, QtGui.QApplication.UnicodeUTF8))
+        self.backButton.setToolTip(QtGui.QApplication.translate("BoardMgr", "Undo the last executed instruction", None, QtGui.QApplication.UnicodeUTF8))
+        self.backButton.setText(QtGui.QApplication.translate("BoardMgr", "Step back", None, QtGui.QApplication.UnicodeUTF8))
+        self.backToButton.setToolTip(QtGui.QApplication.translate("BoardMgr", "Undo executed instructions until the selected instruction is the next one to execute", None, QtGui.QApplication.UnicodeUTF8))
+        self.backToButton.setText(QtGui.QApplication.translate("BoardMgr", "Back to", None, QtGui.QApplication.UnicodeUTF8))
         self.menuHelp.setTitle(QtGui.QApplication.translate("BoardMgr", "Information", None, QtGui.QApplication.UnicodeUTF8))
         self.actionAboutBoard.setText(QtGui.QApplication.translate("BoardMgr", "Board", None, QtGui.QApplication.UnicodeUTF8))
         self.actionAboutProcessor.setText(QtGui.QApplication.translate("BoardMgr", "Processor", None, QtGui.QApplication.UnicodeUTF8))
@@ -10,8 +10,22 @@ import shlex
 from memory import Memory, MemError
 from config import Config
 from controller import Controller
+from clock import Clock
+from scheduler import Scheduler
+from journal import Journal
+from profiler import Profiler
+from traceFile import TraceRecorder
 from program import Program, ProgramError
 
+class BoardSnapshot:
+    """
+    Board state saved by Board.snapshot(): memory pages and chip state
+    """
+    
+    def __init__(self, memory, chip):
+        self.memory = memory
+        self.chip = chip
+        
 class Board:
     """
     Board definition and handling
@@ -43,6 +57,17 @@ class Board:
         self.program    = None
         self.boardHelp  = None
         self.archHelp   = None
+        # clock frequency in Hz: 0 if not defined
+        self.clockFrequency = 0
+        # addresses of instructions stopping "run until break" executions
+        self.breakpointSet = set()
+        # memory used by the undo journal (bytes) and journal when enabled
+        self.journalSize = Journal.defaultSize
+        self.journal = None
+        # execution profile when enabled
+        self.profiler = None
+        # binary trace of executed instructions when enabled
+        self.recorder = None
         
         self.loadDefinition(boardName)
 
@@ -56,6 +81,8 @@ class Board:
         """
         items = Board.config.getItems(boardName)
         self.deviceList = []
+        # read-only areas: (address, size)
+        self.romList = []
         for item in items:
             name = item[0]
             value = item[1]
@@ -66,6 +93,13 @@ class Board:
                     self.memorySize = -1
                 else:
                     self.memorySize = int(value)
+            elif name == "clock":
+                self.clockFrequency = int(value)
+            elif name == "journal":
+                self.journalSize = int(value)
+            elif name[0:3] == "rom":
+                address, size = value.split()
+                self.romList.append((int(address, 0), int(size, 0)))
             elif name[0:6] == "device":
                 device = shlex.split(value, "#")
                 self.deviceList.append(device)
@@ -92,19 +126,176 @@ class Board:
         if (self.memorySize == -1):
             self.memorySize = 2 ** (self.chip.getAddressSize() * 8)
         self.controller = Controller(self.display)
+        self.controller.attachProcessor(self.chip)
+        self.scheduler = Scheduler()
+        self.chip.attachScheduler(self.scheduler)
+        self.controller.attachScheduler(self.scheduler)
         self.controller.loadDeviceList()
         self.memory = Memory(self, self.memorySize)
+        for address, size in self.romList:
+            self.memory.mapRegion(address, size, Memory.rom)
         self.memory.addController(self.controller)
+        self.memory.whenCodeChanged(self.chip.invalidateDecoded)
+        # translated code checks watched pages only if there were watchpoints when it was translated
+        self.memory.whenWatchChanged(self.chip.clearTranslated)
+        self.clock = Clock(self.clockFrequency)
          
         for device in self.deviceList:
             self.deviceModuleList.append(self.controller.createDevice(device))
             
+    def attachObserver(self, fct):
+        """
+        Attach the function called with all changes (chip and memory) done by each execution step
+        Without observer, updates are not recorded at all
+        """
+        changes = self.chip.attachObserver(fct)
+        self.memory.setChangeSet(changes)
+        
+    def detachObserver(self):
+        self.chip.detachObserver()
+        self.memory.setChangeSet(None)
+            
     def clear(self):
         """
         Clear the board: reset memory and chip (PC, SP, other registers and so on)
         """
         self.memory.clear()
         self.chip.clear()
+        self.controller.reset()
+        self.clock.reset()
+        if (self.journal):
+            self.journal.clear()
+        if (self.profiler):
+            self.profiler.clear()
+            
+    #
+    # SNAPSHOT management
+    #
+    def snapshot(self):
+        """
+        Save memory, registers, indicators and cycle counter
+        Memory pages are copied on write: only pages written since the previous snapshot are copied
+        """
+        return BoardSnapshot(self.memory.snapshot(), self.chip.saveState())
+    
+    def restore(self, snapshot):
+        """
+        Restore the state saved by snapshot()
+        Only memory pages written since the previous snapshot or restore are copied back
+        """
+        self.memory.restore(snapshot.memory)
+        self.chip.restoreState(snapshot.chip)
+        self.clock.reset()
+        if (self.journal):
+            self.journal.clear()
+            
+    #
+    # JOURNAL management: execution can be undone instruction per instruction
+    #
+    def enableJournal(self):
+        if (self.journal is None):
+            self.journal = Journal(len(self.chip.getRegisterList()), self.journalSize)
+            self.journal.attachDevices(self.controller.saveState)
+            self.memory.setJournal(self.journal)
+            self.chip.attachJournal(self.journal)
+            
+    def disableJournal(self):
+        self.journal = None
+        self.memory.setJournal(None)
+        self.chip.attachJournal(None)
+        
+    def stepBack(self):
+        """
+        Undo the last executed instruction: registers, indicators and written memory bytes get back their previous values,
+        so do devices, scheduled events and interrupt lines if the instruction changed them
+        Return False if there is no instruction to undo
+        """
+        if (self.journal is None):
+            return False
+        undone = self.journal.undo()
+        if (undone is None):
+            return False
+        state, byteList, deviceState = undone
+        memory = self.memory
+        for address, value in byteList:
+            memory.undoByte(address, value)
+        self.chip.restoreState(state)
+        # after the bytes: undone writes of device inputs have been passed on to the devices
+        if (deviceState is not None):
+            self.controller.restoreState(deviceState)
+        return True
+    
+    def runBackTo(self, address):
+        """
+        Undo executed instructions until the instruction at address is the next one to execute
+        Return False if the journal doesn't go back to such an instruction (all recorded instructions are undone)
+        """
+        while self.stepBack():
+            if (self.chip.PC.get() == address):
+                return True
+        return False
+            
+    #
+    # PROFILER management: executions and cycles per instruction
+    #
+    def enableProfiler(self):
+        if (self.profiler is None):
+            self.profiler = Profiler(self.chip, self.memory.getSize())
+            self.chip.attachProfiler(self.profiler)
+        return self.profiler
+            
+    def disableProfiler(self):
+        self.profiler = None
+        self.chip.attachProfiler(None)
+            
+    #
+    # TRACE management: one record per executed instruction appended to a file (see traceFile)
+    #
+    def enableTrace(self, fileName):
+        self.disableTrace()
+        self.recorder = TraceRecorder(fileName, self.chip)
+        self.memory.setRecorder(self.recorder)
+        self.chip.attachRecorder(self.recorder)
+        return self.recorder
+    
+    def disableTrace(self):
+        "Stop recording: the trace file is completed and closed"
+        if (self.recorder is not None):
+            self.recorder.close()
+        self.recorder = None
+        self.memory.setRecorder(None)
+        self.chip.attachRecorder(None)
+            
+    #
+    # BREAKPOINT management
+    #
+    def addBreakpoint(self, address):
+        self.breakpointSet.add(address)
+        # translated code doesn't stop by itself
+        self.chip.invalidateTranslated(address, 1)
+        
+    def removeBreakpoint(self, address):
+        self.breakpointSet.discard(address)
+        self.chip.invalidateTranslated(address, 1)
+        
+    def toggleBreakpoint(self, address):
+        "Return True if a breakpoint is now set at address"
+        if address in self.breakpointSet:
+            self.removeBreakpoint(address)
+            return False
+        self.addBreakpoint(address)
+        return True
+    
+    def clearBreakpoints(self):
+        for address in list(self.breakpointSet):
+            self.removeBreakpoint(address)
+            
+    def isBreakpoint(self, address):
+        return address in self.breakpointSet
+            
+    def getCycles(self):
+        "Number of clock cycles spent since the board has been cleared"
+        return self.chip.getCycles()
             
     def delete(self):
         """
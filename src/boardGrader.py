@@ -0,0 +1,255 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# Batch grading of programs against test vectors
+#
+#    each (program, test vector) job is executed by a pool of processes, each one owning a headless board
+#    a program is assembled once per process: its loaded state is restored before each test vector
+#    one result per job is written as a JSON line as soon as it is available
+#
+#    board_simulator --grade --board <board> --vectors <file> [--jobs N] [--max N] [--cycles N] [--no-loop-detection]
+#                            [--engine block] <program or directory>...
+#
+#    test vector file: one JSON object per line
+#        {"name": "t1",
+#         "memory": {"$0300": [1, 2]}, "registers": {"A": 5},
+#         "expect": {"registers": {"A": 6}, "indicators": {"Z": 0}, "memory": {"RESULT": [3]}}}
+#    memory keys are addresses (decimal, 0x or $ for hexadecimal) or labels of the program
+#
+#    programs stuck into an infinite loop are stopped as soon as it is detected (status "loop")
+#
+
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+
+from boardRunner import BoardRunner, parseLocation
+from processor import ExecError
+from error import Error
+
+class Grader:
+    """
+    Headless board of one process: programs are loaded once and restored before each test vector
+    """
+
+    def __init__(self, boardName, translate, vectorList, maxInstructions, maxCycles=None, detectLoop=True):
+        self.runner = BoardRunner(boardName, translate, detectLoop=detectLoop)
+        self.vectorList = vectorList
+        self.maxInstructions = maxInstructions
+        self.maxCycles = maxCycles
+        # per program file: (program, snapshot of the board once loaded) - snapshot is None if loading failed
+        self.programDict = {}
+
+    def load(self, fileName):
+        if fileName not in self.programDict:
+            runner = self.runner
+            if runner.load(fileName):
+                self.programDict[fileName] = (runner.board.program, runner.snapshot())
+            else:
+                self.programDict[fileName] = (runner.board.program, None)
+        return self.programDict[fileName]
+
+    def grade(self, fileName, vectorIndex):
+        "Execute the program with a test vector and return the result as a dictionary"
+        vector = self.vectorList[vectorIndex]
+        result = {"program": fileName, "vector": vector.get("name", vectorIndex)}
+        runner = self.runner
+        board = runner.board
+        program, snapshot = self.load(fileName)
+        if snapshot is None:
+            result["status"] = "invalid"
+            result["errors"] = program.errorList if program else []
+            result["passed"] = False
+            return result
+        # labels of the program are used to find addresses
+        board.program = program
+        runner.restore(snapshot)
+        count = runner.instructionCount
+        try:
+            self.setInput(vector)
+            if runner.run(self.maxInstructions, self.maxCycles):
+                result["status"] = "end"
+            else:
+                result["status"] = "limit"
+        except ExecError as e:
+            result["status"] = {ExecError.budget: "limit", ExecError.loop: "loop"}.get(e.kind, "error")
+            result["message"] = str(e)
+        except Error as e:
+            result["status"] = "error"
+            result["message"] = str(e)
+        chip = board.chip
+        result["instructions"] = runner.instructionCount - count
+        result["cycles"] = board.getCycles()
+        result["registers"] = dict([(reg.getName(), reg.get()) for reg in chip.getRegisterList()])
+        result["indicators"] = dict([(indicator.getName(), indicator.get()) for indicator in chip.getIndicatorList()])
+        try:
+            assertionList = self.check(vector.get("expect", {}), result)
+        except Error as e:
+            assertionList = []
+            result["status"] = "error"
+            result["message"] = str(e)
+        result["assertions"] = assertionList
+        result["passed"] = (result["status"] == "end") and all([assertion["passed"] for assertion in assertionList])
+        return result
+
+    def setInput(self, vector):
+        runner = self.runner
+        memory = runner.board.memory
+        for location, valueList in vector.get("memory", {}).items():
+            address = runner.getAddress(parseLocation(location))
+            if not isinstance(valueList, list):
+                valueList = [valueList]
+            memory.writeBytes(address, bytearray([value & 0xff for value in valueList]))
+        registerDict = dict([(reg.getName(), reg) for reg in runner.board.chip.getRegisterList()])
+        for name, value in vector.get("registers", {}).items():
+            if name not in registerDict:
+                raise Error(Error.error, "register " + name + " doesn't exist")
+            registerDict[name].set(value)
+
+    def check(self, expect, result):
+        "List of assertions: expected and actual values of registers, indicators and memory"
+        assertionList = []
+        for kind in ("registers", "indicators"):
+            for name, value in sorted(expect.get(kind, {}).items()):
+                if name not in result[kind]:
+                    raise Error(Error.error, kind[:-1] + " " + name + " doesn't exist")
+                actual = result[kind][name]
+                assertionList.append({"check": name, "expected": value, "actual": actual, "passed": actual == value})
+        runner = self.runner
+        memory = runner.board.memory
+        for location, valueList in sorted(expect.get("memory", {}).items()):
+            address = runner.getAddress(parseLocation(location))
+            if not isinstance(valueList, list):
+                valueList = [valueList]
+            actual = list(memory.readBytes(address, max(0, min(len(valueList), memory.getSize() - address))))
+            assertionList.append({"check": location, "expected": valueList, "actual": actual, "passed": actual == valueList})
+        return assertionList
+
+#
+# POOL of processes: one grader per process
+#
+
+grader = None
+# error raised while creating the grader: reported by each job of the process
+graderError = None
+
+def initWorker(boardName, translate, vectorList, maxInstructions, maxCycles=None, detectLoop=True):
+    global grader, graderError
+    # errors are part of results
+    Error.whenHappen(ignoreError)
+    try:
+        grader = Grader(boardName, translate, vectorList, maxInstructions, maxCycles, detectLoop)
+    except Error as e:
+        graderError = str(e)
+
+def gradeJob(job):
+    fileName, vectorIndex = job
+    if grader is None:
+        return {"program": fileName, "vector": vectorIndex, "status": "error", "message": graderError, "passed": False}
+    return grader.grade(fileName, vectorIndex)
+
+def ignoreError(exception):
+    pass
+
+def grade(boardName, translate, fileList, vectorList, maxInstructions, processCount, maxCycles=None, detectLoop=True):
+    """
+    Generator of results of all (program, test vector) jobs, in completion order
+    Jobs of a program are kept together so that each process assembles as few programs as possible
+    """
+    jobList = [(fileName, index) for fileName in fileList for index in range(len(vectorList))]
+    if processCount == 1:
+        initWorker(boardName, translate, vectorList, maxInstructions, maxCycles, detectLoop)
+        for job in jobList:
+            yield gradeJob(job)
+        return
+    chunkSize = max(1, min(len(vectorList), len(jobList) / (processCount * 4)))
+    pool = multiprocessing.Pool(processCount, initWorker,
+                                (boardName, translate, vectorList, maxInstructions, maxCycles, detectLoop))
+    try:
+        for result in pool.imap_unordered(gradeJob, jobList, chunkSize):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def readVectors(fileName):
+    vectorList = []
+    with open(fileName) as vectorFile:
+        for number, line in enumerate(vectorFile):
+            if not line.strip():
+                continue
+            try:
+                vector = json.loads(line)
+            except ValueError as e:
+                raise Error(Error.error, fileName + ":" + str(number + 1) + ": " + str(e))
+            if not isinstance(vector, dict):
+                raise Error(Error.error, fileName + ":" + str(number + 1) + ": JSON object expected")
+            vectorList.append(vector)
+    return vectorList
+
+def findPrograms(pathList):
+    "Program files: given files and .ass files of given directories"
+    fileList = []
+    for path in pathList:
+        if os.path.isdir(path):
+            for fileName in sorted(os.listdir(path)):
+                if fileName.endswith(".ass"):
+                    fileList.append(os.path.join(path, fileName))
+        elif os.path.isfile(path):
+            fileList.append(path)
+        else:
+            raise Error(Error.error, path + ": file not found")
+    return fileList
+
+def displayError(exception):
+    sys.stderr.write(str(exception) + "\n")
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="board_simulator --grade",
+                                     description="Execute programs against test vectors and write one JSON line per result")
+    parser.add_argument("--grade", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--board", required=True, help="name of the board section in board_description.cfg")
+    parser.add_argument("--vectors", required=True, help="test vector file: one JSON object per line")
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(),
+                        help="number of processes (default: number of CPUs)")
+    parser.add_argument("--max", type=int, default=1000000, help="maximum number of instructions per job (default: 1000000)")
+    parser.add_argument("--cycles", type=int, help="maximum number of clock cycles per job (default: no limit)")
+    parser.add_argument("--no-loop-detection", dest="detectLoop", action="store_false",
+                        help="don't stop programs stuck into an infinite loop")
+    parser.add_argument("--engine", choices=["interpreter", "block"], default="interpreter",
+                        help="execute instructions one by one or by translated blocks (default: interpreter)")
+    parser.add_argument("program", nargs="+", help="program file or directory of programs")
+    args = parser.parse_args(argv)
+
+    Error.whenHappen(displayError)
+    try:
+        vectorList = readVectors(args.vectors)
+        fileList = findPrograms(args.program)
+        # check the board once before starting processes
+        BoardRunner.checkBoard(args.board)
+    except (Error, IOError) as e:
+        displayError(e)
+        return 2
+
+    status = 0
+    try:
+        for result in grade(args.board, args.engine == "block", fileList, vectorList, args.max, max(1, args.jobs),
+                            args.cycles, args.detectLoop):
+            sys.stdout.write(json.dumps(result, sort_keys=True) + "\n")
+            sys.stdout.flush()
+            if not result["passed"]:
+                status = 1
+    except Error as e:
+        displayError(e)
+        return 2
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
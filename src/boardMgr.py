@@ -14,7 +14,7 @@ from boardMgrUi import Ui_BoardMgr
 
 from board import Board
 from memory import Memory
-from processor import Processor, Register, Indicator
+from processor import Processor, Register, Indicator, ChangeSet
 from error import *
 import helpMgr
 
@@ -23,6 +23,8 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
     
     # number of bytes displayed per line in the memory windows
     __memoryBytesPerLine = 8
+    # instructions executed between two processing of events when running until a breakpoint
+    __instructionsPerEvent = 2000
     
     # used to display messages stopping execution
     def displayCritical(self, exception):
@@ -57,6 +59,8 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
         
         # initialize the board content: processor instructions, memory and controllers
         self.board.build()
+        # executed instructions can be undone
+        self.board.enableJournal()
         # action of the board window
         self.defineActions()
         
@@ -86,10 +90,7 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
         self.displayIndicator(self.board)
 
         Error.whenHappen(self.displayCritical)
-        Register.whenUpdated(self.updateRegister)
-        Indicator.whenUpdated(self.updateIndicator)
-        Memory.whenUpdated(self.updateMemory)
-        Processor.whenUpdated(self.displayInstruction)
+        self.board.attachObserver(self.updateChanges)
 
     #
     # Predefined Windows Management functions
@@ -114,6 +115,10 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
         QtCore.QObject.connect(self.runButton, QtCore.SIGNAL('clicked()'), self.runProgram)
         QtCore.QObject.connect(self.stepButton, QtCore.SIGNAL('clicked()'), self.stepProgram)
         QtCore.QObject.connect(self.stopButton, QtCore.SIGNAL('clicked()'), self.stopProgram)
+        QtCore.QObject.connect(self.breakButton, QtCore.SIGNAL('clicked()'), self.runToBreak)
+        QtCore.QObject.connect(self.backButton, QtCore.SIGNAL('clicked()'), self.stepBack)
+        QtCore.QObject.connect(self.backToButton, QtCore.SIGNAL('clicked()'), self.runBackTo)
+        QtCore.QObject.connect(self.instructionTable, QtCore.SIGNAL('cellDoubleClicked(int, int)'), self.toggleBreakpoint)
         QtCore.QObject.connect(self.hexaMode, QtCore.SIGNAL('toggled(bool)'), self.changeHexaMode)
         QtCore.QObject.connect(self.speedSlider, QtCore.SIGNAL('valueChanged(int)'), self.changeSpeed)
         
@@ -147,20 +152,30 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
     #
     def processFile(self, fileName):
         self.board.clear()
+        self.board.clearBreakpoints()
         self.displayMemory(self.board.memory, self.board.chip.getWordSize(), self.board.chip.getAddressSize())
         self.instructionTable.clear()
         
         if (self.board.loadProgram(fileName)):
             self.runButton.setEnabled(True)
             self.stepButton.setEnabled(True)
+            self.breakButton.setEnabled(True)
+            self.backButton.setEnabled(True)
+            self.backToButton.setEnabled(True)
             self.stopButton.setEnabled(False)
             self.board.chip.PC.set(self.board.program.getCodeBase())
             self.initProgram(self.board.program)
+            # display changes done while loading the program
+            self.board.chip.notifyChanges()
             return True
         else:
             self.runButton.setEnabled(False)
             self.stepButton.setEnabled(False)
+            self.breakButton.setEnabled(False)
+            self.backButton.setEnabled(False)
+            self.backToButton.setEnabled(False)
             self.stopButton.setEnabled(False)
+            self.board.chip.notifyChanges()
             return False
         
     #
@@ -177,12 +192,19 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
         self.stop = False
         self.runButton.setEnabled(False)
         self.stepButton.setEnabled(False)
+        self.breakButton.setEnabled(False)
+        self.backButton.setEnabled(False)
+        self.backToButton.setEnabled(False)
         self.stopButton.setEnabled(True)
+        # a program stuck into an infinite loop is stopped with an error
+        self.board.chip.setLoopDetection(True)
         while (not self.stop and not self.end):
             self.executeNext(self.board)
             # need 2 calls on Linux to get a refresh of windows (unknown reason)
             self.app.processEvents()
             self.app.processEvents()          
+            if self.board.isBreakpoint(self.board.chip.PC.get()):
+                break
             # sleep without preventing interaction
             # - sleep is in 1/10 seconds so loop until required time
             # - note that sleep time can be changed during the loop
@@ -199,16 +221,123 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
     def stepProgram(self):
         self.runButton.setEnabled(True)
         self.stepButton.setEnabled(True)
+        self.breakButton.setEnabled(True)
+        self.backButton.setEnabled(True)
+        self.backToButton.setEnabled(True)
         self.stopButton.setEnabled(False)
  
         self.executeNext(self.board)
             
+    #
+    # run at full speed until a breakpoint or a watchpoint: display is only updated when execution stops
+    #
+    def runToBreak(self):
+        self.stop = False
+        self.runButton.setEnabled(False)
+        self.stepButton.setEnabled(False)
+        self.breakButton.setEnabled(False)
+        self.backButton.setEnabled(False)
+        self.backToButton.setEnabled(False)
+        self.stopButton.setEnabled(True)
+        
+        self.cleanMemoryMarker(self.board.memory)
+        self.cleanRegisterMarker()
+        self.cleanIndicatorMarker()
+        board = self.board
+        chip = board.chip
+        breakpointSet = board.breakpointSet
+        # registers and indicators before execution: their changes are found by comparison when execution stops
+        registerBefore = [reg.get() for reg in chip.getRegisterList()]
+        indicatorBefore = [indicator.get() for indicator in chip.getIndicatorList()]
+        
+        memory = board.memory
+        memory.resetWatchHit()
+        board.detachObserver()
+        # memory areas written while running are collected by a change set given to memory only
+        runChanges = ChangeSet(chip.getStatus())
+        memory.setChangeSet(runChanges)
+        writtenSet = set()
+        chip.setLoopDetection(True)
+        try:
+            reached = False
+            while (not self.stop) and (not self.end) and (not reached):
+                count = 0
+                while (not self.end) and (count < BoardMgr.__instructionsPerEvent):
+                    self.end = chip.executeNext(board)
+                    count += 1
+                    if (chip.PC.get() in breakpointSet) or (memory.watchHit is not None):
+                        reached = True
+                        break
+                self.collectWritten(runChanges, writtenSet)
+                # let devices be refreshed and Stop button be used
+                self.app.processEvents()
+        except Error as e:
+            self.end = True
+            e.display()
+        finally:
+            self.collectWritten(runChanges, writtenSet)
+            board.attachObserver(self.updateChanges)
+            self.displayRunChanges(writtenSet, registerBefore, indicatorBefore)
+        self.stopProgram()
+            
+    def collectWritten(self, changes, writtenSet):
+        "Move written areas of the change set into the set of written addresses: the list stays short on long runs"
+        for address, length in changes.memoryList:
+            writtenSet.update(range(address, address + length))
+        del changes.memoryList[:]
+            
+    def displayRunChanges(self, writtenSet, registerBefore, indicatorBefore):
+        "Display all changes done since the given state: registers and indicators values, written addresses"
+        chip = self.board.chip
+        self.displayInstruction(chip.PC.get())
+        for reg, value in zip(chip.getRegisterList(), registerBefore):
+            if reg.get() != value:
+                self.updateRegister(reg)
+        for indicator, value in zip(chip.getIndicatorList(), indicatorBefore):
+            if indicator.get() != value:
+                self.updateIndicator(indicator)
+        memory = self.board.memory
+        for address in sorted(writtenSet):
+            self.updateMemory(memory, address, 1)
+            
+    #
+    # undo executed instructions: display is updated once they are all undone
+    #
+    def stepBack(self):
+        self.cleanMemoryMarker(self.board.memory)
+        self.cleanRegisterMarker()
+        self.cleanIndicatorMarker()
+        self.board.stepBack()
+        self.displayBack()
+        
+    def runBackTo(self):
+        "Undo instructions until the selected instruction is the next one to execute"
+        row = self.instructionTable.currentRow()
+        if (row < 0):
+            return
+        self.cleanMemoryMarker(self.board.memory)
+        self.cleanRegisterMarker()
+        self.cleanIndicatorMarker()
+        self.board.runBackTo(self.board.program.getInstruction(row).getAddress())
+        self.displayBack()
+        
+    def displayBack(self):
+        chip = self.board.chip
+        chip.notifyChanges()
+        self.displayInstruction(chip.PC.get())
+        self.end = chip.isEndProgram()
+        self.stopProgram()
+            
     def stopProgram(self):
         self.stop = True
+        self.board.chip.setLoopDetection(False)
         self.stopButton.setEnabled(False)
+        self.backButton.setEnabled(True)
+        self.backToButton.setEnabled(True)
         if not self.end:
             self.runButton.setEnabled(True)
             self.stepButton.setEnabled(True)
+            self.breakButton.setEnabled(True)
         
     def executeNext(self, board):
         
@@ -225,16 +354,32 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
             self.stop = False
             self.runButton.setEnabled(False)
             self.stepButton.setEnabled(False)
+            self.breakButton.setEnabled(False)
             self.stopButton.setEnabled(False)
             e.display()
         finally:
             if (self.end):
                 self.runButton.setEnabled(False)
                 self.stepButton.setEnabled(False)
+                self.breakButton.setEnabled(False)
                 self.stopButton.setEnabled(False)
 
 
 
+    #
+    # display all changes done by an execution step
+    #
+    def updateChanges(self, changes):
+        if changes.address is not None:
+            self.displayInstruction(changes.address)
+        for reg in changes.registerSet:
+            self.updateRegister(reg)
+        for indicator in changes.indicatorList:
+            self.updateIndicator(indicator)
+        wordSize = self.board.chip.getWordSize()
+        for address, length in changes.memoryList:
+            self.updateMemory(self.board.memory, address, length, wordSize)
+
     #
     # MEMORY
     #
@@ -269,7 +414,7 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
             while (col < self.nbMemoryCol):
                 item = QtGui.QTableWidgetItem("")
                 self.memoryTable.setItem(row, col, item)
-                mem = memory.get(row * BoardMgr.__memoryBytesPerLine + col, wordSize)
+                mem = memory.peek(row * BoardMgr.__memoryBytesPerLine + col, wordSize)
                 value = libproc.ltoh(mem, wordSize)
                 item = QtGui.QTableWidgetItem(value)
                 item.setTextAlignment(QtCore.Qt.AlignVCenter | QtCore.Qt.AlignRight)
@@ -300,7 +445,7 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
         while (i < size) & (i < address + length):
             row = i / BoardMgr.__memoryBytesPerLine
             col = i - (row * BoardMgr.__memoryBytesPerLine)
-            mem = memory.get(row * BoardMgr.__memoryBytesPerLine + col, wordSize)
+            mem = memory.peek(row * BoardMgr.__memoryBytesPerLine + col, wordSize)
             value = libproc.ltoh(mem, wordSize)
             self.memoryTable.item(row, col).setText(value)
             self.memoryTable.item(row, col).setBackground(QtGui.QColor(0,160,0))
@@ -367,6 +512,24 @@ class BoardMgr(QtGui.QMainWindow, Ui_BoardMgr):
             row +=1
         self.instructionTable.setVerticalHeaderLabels(addressList)
             
+    #
+    # BREAKPOINT: set or removed by double-clicking an instruction
+    #
+    def toggleBreakpoint(self, row, column):
+        inst = self.board.program.getInstruction(row)
+        self.board.toggleBreakpoint(inst.getAddress())
+        self.displayBreakpoints()
+        
+    def displayBreakpoints(self):
+        for row in range(self.instructionTable.rowCount()):
+            inst = self.board.program.getInstruction(row)
+            if self.board.isBreakpoint(inst.getAddress()):
+                color = QtGui.QColor(255,120,120)
+            else:
+                color = QtGui.QColor(255,255,255)
+            for col in range(self.instructionTable.columnCount()):
+                self.instructionTable.item(row, col).setBackground(color)
+            
     #
     # highlight the instruction line corresponding to the program counter
     #
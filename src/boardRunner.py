@@ -0,0 +1,477 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# Headless execution of programs
+#
+#    runs a program at full speed without any GUI (no Qt required)
+#    used for batch processing like automated checking of student programs
+#
+#    board_simulator --headless --board <board> [--max N] [--cycles N] [--no-loop-detection] [--dump ADDR:LENGTH]...
+#                                [--engine block] [--realtime] [--break ADDR|LABEL]... [--watch ADDR:LENGTH[:r|w|rw]]...
+#                                [--log ADDR:LENGTH[:r|w|rw]]... [--profile] [--flamegraph FILE] [--trace FILE] <program>
+#
+
+import os
+import sys
+import time
+import argparse
+
+import libproc
+from board import Board
+from memory import Watchpoint
+from processor import ExecError
+from error import Error
+
+class BoardRunner:
+    """
+    Board without display: load and execute programs, report final state
+    """
+
+    # number of bytes displayed per line in memory dumps
+    __memoryBytesPerLine = 8
+    # instructions executed between two synchronizations with the board clock (real time execution)
+    __sliceInstructions = 1000
+
+    def __init__(self, boardName, translate=False, realTime=False, detectLoop=True):
+        """
+        create and build the board
+
+        @param boardName: name of board in board description file
+        @type  boardName: string
+        @param translate: execute blocks of instructions translated by the engine of the processor
+        @type  translate: boolean
+        @param realTime: pace execution on the clock frequency of the board
+        @type  realTime: boolean
+        @param detectLoop: stop with an ExecError (kind ExecError.loop) when the program is stuck into an infinite loop
+        @type  detectLoop: boolean
+        """
+        BoardRunner.checkBoard(boardName)
+        # no display: devices are created with their headless backend
+        self.board = Board(boardName, None)
+        self.board.build()
+        self.engine = None
+        if translate:
+            self.engine = self.board.chip.createEngine(self.board)
+            if not self.engine:
+                raise Error(Error.error, "board " + boardName + ": no translation engine for this processor")
+        self.realTime = realTime
+        self.detectLoop = detectLoop
+        if realTime and not self.board.clock.getFrequency():
+            raise Error(Error.error, "board " + boardName + ": no clock frequency defined")
+        self.instructionCount = 0
+        self.duration = 0.0
+        self.end = False
+        # file of the loaded program
+        self.fileName = None
+        # address of the breakpoint or watchpoint access (see Memory.watchHit) which stopped the last run
+        # None if any
+        self.breakpoint = None
+        self.watchHit = None
+
+    @staticmethod
+    def checkBoard(boardName):
+        "Raise an error if the board is not described into the configuration file"
+        boardList = Board.getList()
+        if boardName not in [boardDesc[0] for boardDesc in boardList]:
+            raise Error(Error.error, "board " + boardName + " doesn't exist")
+
+    def load(self, fileName):
+        """
+        Clear the board and load the program
+
+        @param fileName: file containing the code to execute
+        @type  fileName: string
+        @return: True if the program has been loaded without error
+        """
+        self.board.clear()
+        self.instructionCount = 0
+        self.duration = 0.0
+        self.end = False
+        self.breakpoint = None
+        self.watchHit = None
+        self.board.memory.watchLog = []
+        self.fileName = fileName
+        if not self.board.loadProgram(fileName):
+            return False
+        self.board.chip.PC.set(self.board.program.getCodeBase())
+        return True
+
+    #
+    # SNAPSHOT
+    #
+
+    def snapshot(self):
+        "Save the board state (see Board.snapshot): typically once the program is loaded"
+        return self.board.snapshot()
+
+    def restore(self, snapshot):
+        "Restore a board state saved by snapshot(): next run starts from this state"
+        self.board.restore(snapshot)
+        self.end = self.board.chip.isEndProgram()
+        self.breakpoint = None
+        self.watchHit = None
+
+    #
+    # BREAKPOINT
+    #
+
+    def addBreakpoint(self, location):
+        """
+        Stop execution before the instruction at location
+        
+        @param location: address or label of the program
+        @type  location: integer or string
+        """
+        self.board.addBreakpoint(self.getAddress(location))
+
+    def removeBreakpoint(self, location):
+        self.board.removeBreakpoint(self.getAddress(location))
+
+    #
+    # WATCHPOINT
+    #
+
+    def addWatchpoint(self, location, length, access=Watchpoint.read | Watchpoint.write, action=Watchpoint.stop):
+        """
+        Stop execution after an instruction accessing the memory range, or log such accesses
+        
+        @param location: address or label of the range
+        @type  location: integer or string
+        @param access: Watchpoint.read and/or Watchpoint.write
+        @param action: Watchpoint.stop or Watchpoint.log
+        @return: the watchpoint
+        """
+        return self.board.memory.addWatchpoint(self.getAddress(location), length, access, action)
+
+    def removeWatchpoint(self, watchpoint):
+        self.board.memory.removeWatchpoint(watchpoint)
+
+    def getAddress(self, location):
+        "Address of a location: integer address or label of the loaded program"
+        if not isinstance(location, basestring):
+            return location
+        program = self.board.program
+        if (not program) or (location not in program.labelDict):
+            raise Error(Error.error, "label " + location + " doesn't exist")
+        return program.labelDict[location]
+
+    #
+    # EXECUTION
+    #
+
+    def run(self, maxInstructions, maxCycles=None):
+        """
+        Execute instructions until the end of the program, a breakpoint, a watchpoint or until the budget is exhausted
+        On a breakpoint, the instruction at the breakpoint is not executed: next run starts with it
+        On a watchpoint, execution stops after the instruction accessing the watched range
+        An ExecError of kind ExecError.budget is raised when maxCycles are spent, of kind ExecError.loop
+        when the program is stuck (see detectLoop)
+
+        @param maxInstructions: maximum number of instructions to execute
+        @type  maxInstructions: integer
+        @param maxCycles: maximum number of clock cycles to spend, None if any
+        @type  maxCycles: integer
+        @return: True if the end of the program has been reached
+        """
+        board = self.board
+        chip = board.chip
+        PC = chip.PC
+        memory = board.memory
+        breakpointSet = board.breakpointSet
+        count = 0
+        end = self.end
+        stopped = False
+        self.breakpoint = None
+        self.watchHit = None
+        memory.resetWatchHit()
+        chip.setBudget(None, maxCycles)
+        chip.setLoopDetection(self.detectLoop)
+        start = time.time()
+        try:
+            while (not end) and (count < maxInstructions) and (not stopped):
+                limit = maxInstructions
+                if self.realTime:
+                    limit = min(maxInstructions, count + BoardRunner.__sliceInstructions)
+                if self.engine:
+                    # a block never runs through a breakpoint or a watchpoint hit: check after each of them
+                    engine = self.engine
+                    while (not end) and (count < limit):
+                        count += engine.executeNext(limit - count)
+                        end = chip.isEndProgram()
+                        if (PC.get() in breakpointSet) or (memory.watchHit is not None):
+                            stopped = True
+                            break
+                elif (breakpointSet) or (memory.watchList):
+                    while (not end) and (count < limit):
+                        end = chip.executeNext(board)
+                        count += 1
+                        if (PC.get() in breakpointSet) or (memory.watchHit is not None):
+                            stopped = True
+                            break
+                else:
+                    while (not end) and (count < limit):
+                        end = chip.executeNext(board)
+                        count += 1
+                if self.realTime:
+                    board.clock.throttle(board.getCycles())
+            if stopped:
+                self.watchHit = memory.watchHit
+                if PC.get() in breakpointSet:
+                    self.breakpoint = PC.get()
+        finally:
+            chip.setBudget()
+            chip.setLoopDetection(False)
+            self.duration += time.time() - start
+            self.instructionCount += count
+            self.end = end
+        return end
+
+    #
+    # REPORT
+    #
+
+    def getRegisterReport(self):
+        lines = []
+        for reg in self.board.chip.getRegisterList():
+            lines.append('{:6s}{:>8s}  x{:s}'.format(reg.getName(), str(reg.get()), libproc.ltoh(reg.get(), reg.getSize())))
+        return lines
+
+    def getIndicatorReport(self):
+        items = []
+        for indicator in self.board.chip.getIndicatorList():
+            items.append(indicator.getName() + "=" + str(indicator.get()))
+        return ["  ".join(items)]
+
+    def getMemoryReport(self, address, length):
+        memory = self.board.memory
+        lines = []
+        end = min(address + length, memory.getSize())
+        while address < end:
+            line = "x" + libproc.ltoh(address, self.board.chip.getAddressSize()) + ":"
+            for i in range(address, min(address + BoardRunner.__memoryBytesPerLine, end)):
+                line += " " + libproc.ltoh(memory.getByte(i), 1)
+            lines.append(line)
+            address += BoardRunner.__memoryBytesPerLine
+        return lines
+
+    def getWatchReport(self):
+        "Accesses logged by watchpoints"
+        lines = []
+        addressSize = self.board.chip.getAddressSize()
+        for access, address, length, value in self.board.memory.watchLog:
+            lines.append(formatAccess(access, address, length, value, addressSize))
+        return lines
+
+    def getDeviceReport(self):
+        lines = []
+        for device in self.board.controller.connectedDeviceList:
+            if hasattr(device, "report"):
+                lines.append(device.report())
+        return lines
+
+    def getProfileReport(self):
+        """
+        Instructions sorted by cycles spent, subroutines, executions per mnemonic and annotated source
+        (see Board.enableProfiler)
+        """
+        profiler = self.board.profiler
+        if (profiler is None):
+            return []
+        lines = ["Hot spots"]
+        lines += ["    " + line for line in profiler.getAddressReport(self.board.program)]
+        callReport = profiler.getCallReport(self.board.program)
+        if len(callReport) > 1:
+            lines.append("Subroutines")
+            lines += ["    " + line for line in callReport]
+        lines.append("Mnemonics")
+        lines += ["    " + line for line in profiler.getMnemonicReport()]
+        if self.board.program and self.fileName:
+            lines.append("Annotated source (executions, cycles)")
+            lines += ["    " + line for line in profiler.getAnnotatedSource(self.board.program, self.fileName)]
+        return lines
+
+    def writeFlameGraph(self, fileName):
+        "Write cycles per call stack in collapsed format (input of flame graph tools)"
+        with open(fileName, "w") as stackFile:
+            for line in self.board.profiler.getCollapsedStacks(self.board.program):
+                stackFile.write(line + "\n")
+
+    def getSpeedReport(self):
+        speed = 0
+        if self.duration > 0:
+            speed = int(self.instructionCount / self.duration)
+        lines = ['{:d} instructions in {:.3f} s ({:d} instructions/s)'.format(self.instructionCount, self.duration, speed)]
+        cycles = self.board.getCycles()
+        line = '{:d} cycles'.format(cycles)
+        clock = self.board.clock
+        if clock.getFrequency():
+            line += ' ({:.6f} s at {:d} Hz)'.format(clock.getDuration(cycles), clock.getFrequency())
+        lines.append(line)
+        return lines
+
+
+def parseRange(string):
+    "Convert ADDR:LENGTH (decimal, 0x or $ for hexadecimal) into a tuple"
+    try:
+        address, length = string.split(":")
+        return (parseInt(address), parseInt(length))
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid memory range " + string + " (expected ADDR:LENGTH)")
+
+def parseWatch(string):
+    "Convert ADDR:LENGTH[:r|w|rw] into a tuple (address, length, access)"
+    accessDict = {"r": Watchpoint.read, "w": Watchpoint.write, "rw": Watchpoint.read | Watchpoint.write}
+    try:
+        itemList = string.split(":")
+        if len(itemList) == 2:
+            itemList.append("rw")
+        address, length, access = itemList
+        return (parseInt(address), parseInt(length), accessDict[access])
+    except (ValueError, KeyError):
+        raise argparse.ArgumentTypeError("invalid watched range " + string + " (expected ADDR:LENGTH[:r|w|rw])")
+
+def formatAccess(access, address, length, value, addressSize):
+    "Text of a memory access found by a watchpoint"
+    text = "write" if access == Watchpoint.write else "read"
+    return text + " x" + libproc.ltoh(address, addressSize) + ": x" + libproc.ltoh(value, length)
+
+def parseInt(string):
+    if string[0] == '$':
+        return int(string[1:], 16)
+    return int(string, 0)
+
+def parseLocation(string):
+    "Address (decimal, 0x or $ for hexadecimal) or label"
+    try:
+        return parseInt(string)
+    except ValueError:
+        return string
+
+def displayError(exception):
+    sys.stderr.write(str(exception) + "\n")
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="board_simulator --headless",
+                                     description="Execute a program without GUI and display the final state of the board")
+    parser.add_argument("--headless", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--board", required=True, help="name of the board section in board_description.cfg")
+    parser.add_argument("--max", type=int, default=1000000, help="maximum number of instructions to execute (default: 1000000)")
+    parser.add_argument("--cycles", type=int, help="maximum number of clock cycles to spend (default: no limit)")
+    parser.add_argument("--no-loop-detection", dest="detectLoop", action="store_false",
+                        help="don't stop programs stuck into an infinite loop (jump to itself, same state without memory write)")
+    parser.add_argument("--dump", type=parseRange, action="append", default=[], metavar="ADDR:LENGTH",
+                        help="memory range to display at the end of the execution (can be repeated)")
+    parser.add_argument("--engine", choices=["interpreter", "block"], default="interpreter",
+                        help="execute instructions one by one or by translated blocks (default: interpreter)")
+    parser.add_argument("--realtime", action="store_true",
+                        help="pace execution on the clock frequency of the board instead of running at full speed")
+    parser.add_argument("--break", dest="breakList", action="append", default=[], metavar="ADDR|LABEL",
+                        help="stop before the instruction at this address or label (can be repeated)")
+    parser.add_argument("--watch", type=parseWatch, action="append", default=[], metavar="ADDR:LENGTH[:r|w|rw]",
+                        help="stop after an instruction reading and/or writing this memory range (can be repeated)")
+    parser.add_argument("--log", type=parseWatch, action="append", default=[], metavar="ADDR:LENGTH[:r|w|rw]",
+                        help="display all reads and/or writes of this memory range (can be repeated)")
+    parser.add_argument("--profile", action="store_true",
+                        help="display executions and cycles per instruction (instructions are executed one by one)")
+    parser.add_argument("--flamegraph", metavar="FILE",
+                        help="write cycles per call stack in collapsed format for flame graph tools (implies --profile)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record each executed instruction into a binary trace file (instructions are executed one by one)")
+    parser.add_argument("program", help="program file")
+    args = parser.parse_args(argv)
+
+    # errors are displayed on the console instead of a message box
+    Error.whenHappen(displayError)
+    try:
+        runner = BoardRunner(args.board, args.engine == "block", args.realtime, args.detectLoop)
+    except Error as e:
+        displayError(e)
+        return 2
+    if not os.path.isfile(args.program):
+        displayError(args.program + ": file not found")
+        return 2
+    if args.profile or args.flamegraph:
+        runner.board.enableProfiler()
+    if args.trace:
+        try:
+            runner.board.enableTrace(args.trace)
+        except IOError as e:
+            displayError(e)
+            return 2
+    if not runner.load(args.program):
+        if runner.board.program:
+            for msg in runner.board.program.errorList:
+                displayError(msg)
+        return 2
+
+    status = 0
+    try:
+        for location in args.breakList:
+            runner.addBreakpoint(parseLocation(location))
+        for address, length, access in args.watch:
+            runner.addWatchpoint(address, length, access, Watchpoint.stop)
+        for address, length, access in args.log:
+            runner.addWatchpoint(address, length, access, Watchpoint.log)
+        end = runner.run(args.max, args.cycles)
+        addressSize = runner.board.chip.getAddressSize()
+        if (not end) and (runner.watchHit is not None):
+            watchpoint, access, address, length, value = runner.watchHit
+            displayError("Execution stopped: watchpoint hit by " + formatAccess(access, address, length, value, addressSize))
+            status = 3
+        elif (not end) and (runner.breakpoint is not None):
+            displayError("Execution stopped: breakpoint at x" + libproc.ltoh(runner.breakpoint, addressSize))
+            status = 3
+        elif not end:
+            displayError("Execution stopped: limit of " + str(args.max) + " instructions reached")
+            status = 1
+    except ExecError as e:
+        displayError(e)
+        if e.kind == ExecError.budget:
+            status = 1
+        elif e.kind == ExecError.loop:
+            status = 4
+        else:
+            status = 2
+    except Error as e:
+        displayError(e)
+        status = 2
+    if args.trace:
+        runner.board.disableTrace()
+
+    print "Registers"
+    for line in runner.getRegisterReport():
+        print "    " + line
+    print "Indicators"
+    for line in runner.getIndicatorReport():
+        print "    " + line
+    for address, length in args.dump:
+        print "Memory"
+        for line in runner.getMemoryReport(address, length):
+            print "    " + line
+    watchReport = runner.getWatchReport()
+    if watchReport:
+        print "Watched accesses"
+        for line in watchReport:
+            print "    " + line
+    deviceReport = runner.getDeviceReport()
+    if deviceReport:
+        print "Devices"
+        for line in deviceReport:
+            print "    " + line
+    if args.profile:
+        for line in runner.getProfileReport():
+            print line
+    if args.flamegraph:
+        try:
+            runner.writeFlameGraph(args.flamegraph)
+        except IOError as e:
+            displayError(e)
+            status = 2
+    for line in runner.getSpeedReport():
+        print line
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
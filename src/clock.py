@@ -0,0 +1,58 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+
+import time
+
+class Clock:
+    """
+    Virtual clock of a board
+    Convert cycles spent by the chip into emulated time and pace the execution on the clock frequency
+    """
+
+    def __init__(self, frequency):
+        """
+        @param frequency: clock frequency in Hz (0: unknown, execution is not paced)
+        @type  frequency: integer
+        """
+        self.__frequency = frequency
+        # real time and cycle counter when pacing started
+        self.__startTime = None
+        self.__startCycles = 0
+
+    def setFrequency(self, value):
+        self.__frequency = value
+        self.reset()
+
+    def reset(self):
+        "Pacing starts again on next throttle()"
+        self.__startTime = None
+
+    def getFrequency(self):
+        return self.__frequency
+
+    def getDuration(self, cycles):
+        "Emulated time (in seconds) of cycles"
+        if not self.__frequency:
+            return 0.0
+        return float(cycles) / self.__frequency
+
+    def start(self, cycles):
+        "Start pacing: cycles is the current value of the cycle counter"
+        self.__startTime = time.time()
+        self.__startCycles = cycles
+
+    def throttle(self, cycles):
+        """
+        Sleep until real time catches up with emulated time
+        Called regularly by run loops with the current value of the cycle counter
+        """
+        if not self.__frequency:
+            return
+        if self.__startTime is None:
+            self.start(cycles)
+            return
+        delay = self.getDuration(cycles - self.__startCycles) - (time.time() - self.__startTime)
+        if delay > 0:
+            time.sleep(delay)
@@ -28,12 +28,80 @@ class Controller:
         self.connectedDeviceList = []
         # list of handlers to process when memory is updated
         self.connectedHanderList = []
+        # list of handlers giving values when memory is read
+        self.connectedOutputList = []
+        # memory whose I/O pages are declared inputs and outputs
+        self.memory = None
+        # processor receiving interrupts raised by devices
+        self.processor = None
+        # events of devices scheduled on the cycle counter
+        self.scheduler = None
         # used to assign a rank to each created device
         # useful to differentiate device when severals of same type are created
         # also used to shift UI in order to prevent windows to cover each other
         self.deviceRank = 0
 
         
+    def attachMemory(self, memory):
+        "Memory passing on accesses to its I/O pages: inputs and outputs are mapped as I/O"
+        self.memory = memory
+        for device in self.connectedHanderList:
+            memory.mapRegion(device[Controller.__address], device[Controller.__size], memory.io)
+        for device in self.connectedOutputList:
+            memory.mapRegion(device[Controller.__address], device[Controller.__size], memory.ioRead)
+        
+    def attachProcessor(self, processor):
+        self.processor = processor
+        
+    def attachScheduler(self, scheduler):
+        self.scheduler = scheduler
+        
+    def getCycles(self):
+        "Current value of the cycle counter of the processor"
+        return self.processor.getCycles()
+        
+    def scheduleEvent(self, delay, fct):
+        "Call by devices: fct(cycle) will be called once delay cycles are spent, return the event"
+        return self.scheduler.schedule(self.processor.getCycles() + delay, fct)
+    
+    def scheduleEventAt(self, cycle, fct):
+        "Call by devices: fct(cycle) will be called once the cycle counter reaches cycle (periodic events)"
+        return self.scheduler.schedule(cycle, fct)
+    
+    def cancelEvent(self, event):
+        self.scheduler.cancel(event)
+        
+    def reset(self):
+        "Board cleared: events are cancelled and devices start again"
+        if (self.scheduler is not None):
+            self.scheduler.clear()
+        for device in self.connectedDeviceList:
+            device.resetDevice()
+        
+    def raiseInterrupt(self, line):
+        "Call by devices to assert an interrupt line of the processor (Processor.irq, Processor.nmi)"
+        if (self.processor is not None):
+            self.processor.raiseInterrupt(line)
+            
+    def clearInterrupt(self, line):
+        "Call by devices to release an interrupt line (an IRQ stays asserted until it is released)"
+        if (self.processor is not None):
+            self.processor.clearInterrupt(line)
+        
+    def saveState(self):
+        "Scheduled events, state of devices (those implementing saveState) and asserted interrupt lines"
+        deviceList = [(device, device.saveState()) for device in self.connectedDeviceList if hasattr(device, "saveState")]
+        return (self.scheduler.saveState(), deviceList, self.processor.getInterrupts())
+        
+    def restoreState(self, state):
+        "Put back the state returned by saveState()"
+        schedulerState, deviceList, lines = state
+        self.scheduler.restoreState(schedulerState)
+        for device, deviceState in deviceList:
+            device.restoreState(deviceState)
+        self.processor.clearInterrupt(self.processor.getInterrupts())
+        self.processor.raiseInterrupt(lines)
+        
     def delete(self):
         for device in self.connectedDeviceList:
             device.deleteDevice()
@@ -72,17 +140,34 @@ class Controller:
         "- Device handler will be called when a change will occur to this address"
         
         self.connectedHanderList.append([name, address, size, fct])
+        if (self.memory is not None):
+            self.memory.mapRegion(address, size, self.memory.io)
+        
+    def declareOutput(self, name, address, size, fct):
+        "Call by each device during its initialization "
+        "- Defines memory address read by the program to get device values (switches, status...)"
+        "- Device handler fct(address, size) will be called when this address is read: it returns the size current bytes"
+        
+        self.connectedOutputList.append([name, address, size, fct])
+        if (self.memory is not None):
+            self.memory.mapRegion(address, size, self.memory.ioRead)
+        
+    def callOutput(self, memory, address, size):
+        "Call each device handler declaring a read memory area as its output: memory is updated with its values"
+        
+        for device in self.connectedOutputList:
+            if (address < device[Controller.__address] + device[Controller.__size]) and \
+               (device[Controller.__address] < address + size):
+                data = device[Controller.__fct](device[Controller.__address], device[Controller.__size])
+                memory.updateBytes(device[Controller.__address], bytearray(data))
         
     def callInput(self, memory, address, size):
         "Call each device handler declaring a specific memory area as its input"
         
         for device in self.connectedHanderList:          
-            impacted = False      
-            # check if the device is impacted by memory update
-            for i in range(size):
-                if device[Controller.__address] <= address + i < (device[Controller.__address] + device[Controller.__size]):
-                    impacted = True
-                    break
+            # check if the device is impacted by memory update: both areas overlap
+            impacted = (address < device[Controller.__address] + device[Controller.__size]) and \
+                       (device[Controller.__address] < address + size)
             
             if impacted:
             # create a buffer to communicate with the device
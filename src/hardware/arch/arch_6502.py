@@ -13,6 +13,9 @@ class Chip(Processor):
 
     __hexaChar        = '$'
     __decChar         = ''
+    # addresses of interrupt handlers
+    nmiVector         = 0xfffa
+    irqVector         = 0xfffe
 
     
     def __init__(self):
@@ -60,191 +63,206 @@ class Chip(Processor):
         self.indirect    = self.addAddressingMode('indirect', "\((" + patternWord + ")\)|\((" + patternLabel + ")\)", addressSize, self.decodeInt)
         self.indirectX   = self.addAddressingMode('indirectX', "\((" + patternByte + "),X\)|\((" + patternLabel + "),X\)", offsetSize, self.decodeInt)
         self.indirectY   = self.addAddressingMode('indirectY', "\((" + patternByte + ")\),Y|\((" + patternLabel + ")\),Y", offsetSize, self.decodeInt)
+        
+        # effective address computation: bound once per addressing mode
+        # accumulator and immediate don't reference memory
+        self.zeroPage.setResolver(self.addrDirect)
+        self.absolute.setResolver(self.addrDirect)
+        self.zeroPageX.setResolver(self.addrIndexedX)
+        self.absoluteX.setResolver(self.addrIndexedX)
+        self.zeroPageY.setResolver(self.addrIndexedY)
+        self.absoluteY.setResolver(self.addrIndexedY)
+        self.indirect.setResolver(self.addrIndirect)
+        self.indirectX.setResolver(self.addrIndirectX)
+        self.indirectY.setResolver(self.addrIndirectY)
+        # index register of addressing modes which need one more cycle
+        # to read data when indexing crosses a page boundary
+        self.__pageCrossingIndex = {self.absoluteX: self.regX, self.absoluteY: self.regY, self.indirectY: self.regY}
                              
-        self.addInstruction(0x69, "ADC", self.adc, self.immediate)
-        self.addInstruction(0x65, "ADC", self.adc, self.zeroPage)
-        self.addInstruction(0x75, "ADC", self.adc, self.zeroPageX)
-        self.addInstruction(0x6d, "ADC", self.adc, self.absolute)
-        self.addInstruction(0x7d, "ADC", self.adc, self.absoluteX)
-        self.addInstruction(0x79, "ADC", self.adc, self.absoluteY)
-        self.addInstruction(0x61, "ADC", self.adc, self.indirectX)
-        self.addInstruction(0x71, "ADC", self.adc, self.indirectY)
-        
-        self.addInstruction(0x29, "AND", self.and1, self.immediate)
-        self.addInstruction(0x25, "AND", self.and1, self.zeroPage)
-        self.addInstruction(0x35, "AND", self.and1, self.zeroPageX),
-        self.addInstruction(0x2d, "AND", self.and1, self.absolute)
-        self.addInstruction(0x3d, "AND", self.and1, self.absoluteX)
-        self.addInstruction(0x39, "AND", self.and1, self.absoluteY)
-        self.addInstruction(0x21, "AND", self.and1, self.indirectX)
-        self.addInstruction(0x31, "AND", self.and1, self.indirectY)
-        
-        self.addInstruction(0x0a, "ASL", self.asl, self.accumulator)
-        self.addInstruction(0x06, "ASL", self.asl, self.zeroPage)
-        self.addInstruction(0x16, "ASL", self.asl, self.zeroPageX)
-        self.addInstruction(0x0e, "ASL", self.asl, self.absolute)
-        self.addInstruction(0x1e, "ASL", self.asl, self.absoluteX)
-        
-        self.addInstruction(0x24, "BIT", self.bit, self.zeroPage)
-        self.addInstruction(0x2c, "BIT", self.bit, self.absolute),
+        self.addInstruction(0x69, "ADC", self.adc, self.immediate, cycles=2)
+        self.addInstruction(0x65, "ADC", self.adc, self.zeroPage, cycles=3)
+        self.addInstruction(0x75, "ADC", self.adc, self.zeroPageX, cycles=4)
+        self.addInstruction(0x6d, "ADC", self.adc, self.absolute, cycles=4)
+        self.addInstruction(0x7d, "ADC", self.adc, self.absoluteX, cycles=4)
+        self.addInstruction(0x79, "ADC", self.adc, self.absoluteY, cycles=4)
+        self.addInstruction(0x61, "ADC", self.adc, self.indirectX, cycles=6)
+        self.addInstruction(0x71, "ADC", self.adc, self.indirectY, cycles=5)
+        
+        self.addInstruction(0x29, "AND", self.and1, self.immediate, cycles=2)
+        self.addInstruction(0x25, "AND", self.and1, self.zeroPage, cycles=3)
+        self.addInstruction(0x35, "AND", self.and1, self.zeroPageX, cycles=4)
+        self.addInstruction(0x2d, "AND", self.and1, self.absolute, cycles=4)
+        self.addInstruction(0x3d, "AND", self.and1, self.absoluteX, cycles=4)
+        self.addInstruction(0x39, "AND", self.and1, self.absoluteY, cycles=4)
+        self.addInstruction(0x21, "AND", self.and1, self.indirectX, cycles=6)
+        self.addInstruction(0x31, "AND", self.and1, self.indirectY, cycles=5)
+        
+        self.addInstruction(0x0a, "ASL", self.asl, self.accumulator, cycles=2)
+        self.addInstruction(0x06, "ASL", self.asl, self.zeroPage, cycles=5)
+        self.addInstruction(0x16, "ASL", self.asl, self.zeroPageX, cycles=6)
+        self.addInstruction(0x0e, "ASL", self.asl, self.absolute, cycles=6)
+        self.addInstruction(0x1e, "ASL", self.asl, self.absoluteX, cycles=7)
+        
+        self.addInstruction(0x24, "BIT", self.bit, self.zeroPage, cycles=3)
+        self.addInstruction(0x2c, "BIT", self.bit, self.absolute, cycles=4)
         
         # True indicated that value must be interpreted as a relative branch instead of an address
-        self.addInstruction(0x10, "BPL", self.bpl, self.zeroPage, True)
-        self.addInstruction(0x30, "BMI", self.bmi, self.zeroPage, True)
-        self.addInstruction(0x50, "BVC", self.bvc, self.zeroPage, True)
-        self.addInstruction(0x70, "BVS", self.bvs, self.zeroPage, True)
-        self.addInstruction(0x90, "BCC", self.bcc, self.zeroPage, True)
-        self.addInstruction(0xB0, "BCS", self.bcs, self.zeroPage, True)
-        self.addInstruction(0xD0, "BNE", self.bne, self.zeroPage, True)
-        self.addInstruction(0xF0, "BEQ", self.beq, self.zeroPage, True)
+        self.addInstruction(0x10, "BPL", self.bpl, self.zeroPage, True, cycles=2)
+        self.addInstruction(0x30, "BMI", self.bmi, self.zeroPage, True, cycles=2)
+        self.addInstruction(0x50, "BVC", self.bvc, self.zeroPage, True, cycles=2)
+        self.addInstruction(0x70, "BVS", self.bvs, self.zeroPage, True, cycles=2)
+        self.addInstruction(0x90, "BCC", self.bcc, self.zeroPage, True, cycles=2)
+        self.addInstruction(0xB0, "BCS", self.bcs, self.zeroPage, True, cycles=2)
+        self.addInstruction(0xD0, "BNE", self.bne, self.zeroPage, True, cycles=2)
+        self.addInstruction(0xF0, "BEQ", self.beq, self.zeroPage, True, cycles=2)
        
-        self.addInstruction(0x00, "BRK", self.brk, None)
-
-        self.addInstruction(0xc9, "CMP", self.cmp, self.immediate)
-        self.addInstruction(0xc5, "CMP", self.cmp, self.zeroPage)
-        self.addInstruction(0xd5, "CMP", self.cmp, self.zeroPageX)
-        self.addInstruction(0xcd, "CMP", self.cmp, self.absolute)
-        self.addInstruction(0xdd, "CMP", self.cmp, self.absoluteX)
-        self.addInstruction(0xd9, "CMP", self.cmp, self.absoluteY)
-        self.addInstruction(0xc1, "CMP", self.cmp, self.indirectX)
-        self.addInstruction(0xd1, "CMP", self.cmp, self.indirectY)
-        
-        self.addInstruction(0xe0, "CPX", self.cpx, self.immediate)
-        self.addInstruction(0xe4, "CPX", self.cpx, self.zeroPage)
-        self.addInstruction(0xec, "CPX", self.cpx, self.absolute)
-        
-        self.addInstruction(0xc0, "CPY", self.cpy, self.immediate)
-        self.addInstruction(0xc4, "CPY", self.cpy, self.zeroPage)
-        self.addInstruction(0xcc, "CPY", self.cpy, self.absolute)
-        
-        self.addInstruction(0xc6, "DEC", self.dec, self.zeroPage)
-        self.addInstruction(0xd6, "DEC", self.dec, self.zeroPageX)
-        self.addInstruction(0xce, "DEC", self.dec, self.absolute)
-        self.addInstruction(0xde, "DEC", self.dec, self.absoluteX)
-
-        self.addInstruction(0x49, "EOR", self.eor, self.immediate)
-        self.addInstruction(0x45, "EOR", self.eor, self.zeroPage)
-        self.addInstruction(0x55, "EOR", self.eor, self.zeroPageX)
-        self.addInstruction(0x4d, "EOR", self.eor, self.absolute)
-        self.addInstruction(0x5d, "EOR", self.eor, self.absoluteX)
-        self.addInstruction(0x59, "EOR", self.eor, self.absoluteY)
-        self.addInstruction(0x41, "EOR", self.eor, self.indirectX)
-        self.addInstruction(0x51, "EOR", self.eor, self.indirectY)
-        
-        self.addInstruction(0x18, "CLC", self.clc, None)
-        self.addInstruction(0x38, "SEC", self.sec, None)
-        self.addInstruction(0x58, "CLI", self.cli, None)
-        self.addInstruction(0x78, "SEI", self.sei, None)
-        self.addInstruction(0xb8, "CLV", self.clv, None)
-        self.addInstruction(0xd8, "CLD", self.cld, None)
-        self.addInstruction(0xf8, "SED", self.sed, None)
-        
-        self.addInstruction(0xe6, "INC", self.inc, self.zeroPage)
-        self.addInstruction(0xf6, "INC", self.inc, self.zeroPageX)
-        self.addInstruction(0xee, "INC", self.inc, self.absolute)
-        self.addInstruction(0xfe, "INC", self.inc, self.absoluteX)
+        self.addInstruction(0x00, "BRK", self.brk, None, cycles=7)
+
+        self.addInstruction(0xc9, "CMP", self.cmp, self.immediate, cycles=2)
+        self.addInstruction(0xc5, "CMP", self.cmp, self.zeroPage, cycles=3)
+        self.addInstruction(0xd5, "CMP", self.cmp, self.zeroPageX, cycles=4)
+        self.addInstruction(0xcd, "CMP", self.cmp, self.absolute, cycles=4)
+        self.addInstruction(0xdd, "CMP", self.cmp, self.absoluteX, cycles=4)
+        self.addInstruction(0xd9, "CMP", self.cmp, self.absoluteY, cycles=4)
+        self.addInstruction(0xc1, "CMP", self.cmp, self.indirectX, cycles=6)
+        self.addInstruction(0xd1, "CMP", self.cmp, self.indirectY, cycles=5)
+        
+        self.addInstruction(0xe0, "CPX", self.cpx, self.immediate, cycles=2)
+        self.addInstruction(0xe4, "CPX", self.cpx, self.zeroPage, cycles=3)
+        self.addInstruction(0xec, "CPX", self.cpx, self.absolute, cycles=4)
+        
+        self.addInstruction(0xc0, "CPY", self.cpy, self.immediate, cycles=2)
+        self.addInstruction(0xc4, "CPY", self.cpy, self.zeroPage, cycles=3)
+        self.addInstruction(0xcc, "CPY", self.cpy, self.absolute, cycles=4)
+        
+        self.addInstruction(0xc6, "DEC", self.dec, self.zeroPage, cycles=5)
+        self.addInstruction(0xd6, "DEC", self.dec, self.zeroPageX, cycles=6)
+        self.addInstruction(0xce, "DEC", self.dec, self.absolute, cycles=6)
+        self.addInstruction(0xde, "DEC", self.dec, self.absoluteX, cycles=7)
+
+        self.addInstruction(0x49, "EOR", self.eor, self.immediate, cycles=2)
+        self.addInstruction(0x45, "EOR", self.eor, self.zeroPage, cycles=3)
+        self.addInstruction(0x55, "EOR", self.eor, self.zeroPageX, cycles=4)
+        self.addInstruction(0x4d, "EOR", self.eor, self.absolute, cycles=4)
+        self.addInstruction(0x5d, "EOR", self.eor, self.absoluteX, cycles=4)
+        self.addInstruction(0x59, "EOR", self.eor, self.absoluteY, cycles=4)
+        self.addInstruction(0x41, "EOR", self.eor, self.indirectX, cycles=6)
+        self.addInstruction(0x51, "EOR", self.eor, self.indirectY, cycles=5)
+        
+        self.addInstruction(0x18, "CLC", self.clc, None, cycles=2)
+        self.addInstruction(0x38, "SEC", self.sec, None, cycles=2)
+        self.addInstruction(0x58, "CLI", self.cli, None, cycles=2)
+        self.addInstruction(0x78, "SEI", self.sei, None, cycles=2)
+        self.addInstruction(0xb8, "CLV", self.clv, None, cycles=2)
+        self.addInstruction(0xd8, "CLD", self.cld, None, cycles=2)
+        self.addInstruction(0xf8, "SED", self.sed, None, cycles=2)
+        
+        self.addInstruction(0xe6, "INC", self.inc, self.zeroPage, cycles=5)
+        self.addInstruction(0xf6, "INC", self.inc, self.zeroPageX, cycles=6)
+        self.addInstruction(0xee, "INC", self.inc, self.absolute, cycles=6)
+        self.addInstruction(0xfe, "INC", self.inc, self.absoluteX, cycles=7)
        
-        self.addInstruction(0x4c, "JMP", self.jmp, self.absolute)
-        self.addInstruction(0x6c, "JMP", self.jmp, self.indirect)
+        self.addInstruction(0x4c, "JMP", self.jmp, self.absolute, cycles=3)
+        self.addInstruction(0x6c, "JMP", self.jmp, self.indirect, cycles=5)
  
-        self.addInstruction(0x20, "JSR", self.jsr, self.absolute)
-
-        self.addInstruction(0xa9, "LDA", self.lda, self.immediate)
-        self.addInstruction(0xa5, "LDA", self.lda, self.zeroPage)
-        self.addInstruction(0xb5, "LDA", self.lda, self.zeroPageX)
-        self.addInstruction(0xad, "LDA", self.lda, self.absolute)
-        self.addInstruction(0xbd, "LDA", self.lda, self.absoluteX)
-        self.addInstruction(0xb9, "LDA", self.lda, self.absoluteY)
-        self.addInstruction(0xa1, "LDA", self.lda, self.indirectX)
-        self.addInstruction(0xb1, "LDA", self.lda, self.indirectY)
-        
-        self.addInstruction(0xa2, "LDX", self.ldx, self.immediate)
-        self.addInstruction(0xa6, "LDX", self.ldx, self.zeroPage)
-        self.addInstruction(0xb6, "LDX", self.ldx, self.zeroPageY)
-        self.addInstruction(0xae, "LDX", self.ldx, self.absolute)
-        self.addInstruction(0xbe, "LDX", self.ldx, self.absoluteY)
-        
-        self.addInstruction(0xa0, "LDY", self.ldy, self.immediate)
-        self.addInstruction(0xa4, "LDY", self.ldy, self.zeroPage)
-        self.addInstruction(0xb4, "LDY", self.ldy, self.zeroPageX)
-        self.addInstruction(0xac, "LDY", self.ldy, self.absolute)
-        self.addInstruction(0xbc, "LDY", self.ldy, self.absoluteX)
-
-        self.addInstruction(0x4a, "LSR", self.lsr, self.accumulator)
-        self.addInstruction(0x46, "LSR", self.lsr, self.zeroPage)
-        self.addInstruction(0x56, "LSR", self.lsr, self.zeroPageX)
-        self.addInstruction(0x4e, "LSR", self.lsr, self.absolute)
-        self.addInstruction(0x5e, "LSR", self.lsr, self.absoluteX)
-
-        self.addInstruction(0xea, "NOP", self.nop, None)
-        
-        self.addInstruction(0x09, "ORA", self.ora, self.immediate)
-        self.addInstruction(0x05, "ORA", self.ora, self.zeroPage)
-        self.addInstruction(0x15, "ORA", self.ora, self.zeroPageX)
-        self.addInstruction(0x0d, "ORA", self.ora, self.absolute)
-        self.addInstruction(0x1d, "ORA", self.ora, self.absoluteX)
-        self.addInstruction(0x19, "ORA", self.ora, self.absoluteY)
-        self.addInstruction(0x01, "ORA", self.ora, self.indirectX)
-        self.addInstruction(0x11, "ORA", self.ora, self.indirectY)
-        
-        self.addInstruction(0xaa, "TAX", self.tax, None)
-        self.addInstruction(0x8a, "TXA", self.txa, None)
-        self.addInstruction(0xca, "DEX", self.dex, None)
-        self.addInstruction(0xe8, "INX", self.inx, None)
-        self.addInstruction(0xa8, "TAY", self.tay, None)
-        self.addInstruction(0x98, "TYA", self.tya, None)
-        self.addInstruction(0x98, "DEY", self.dex, None)
-        self.addInstruction(0xc8, "INY", self.iny, None)
-        
-        self.addInstruction(0x2a, "ROL", self.rol, self.accumulator)
-        self.addInstruction(0x26, "ROL", self.rol, self.zeroPage)
-        self.addInstruction(0x36, "ROL", self.rol, self.zeroPageX)
-        self.addInstruction(0x2e, "ROL", self.rol, self.absolute)
-        self.addInstruction(0x3e, "ROL", self.rol, self.absoluteX)
-        
-        self.addInstruction(0x6a, "ROR", self.ror, self.accumulator)
-        self.addInstruction(0x66, "ROR", self.ror, self.zeroPage)
-        self.addInstruction(0x76, "ROR", self.ror, self.zeroPageX)
-        self.addInstruction(0x6e, "ROR", self.ror, self.absolute)
-        self.addInstruction(0x7e, "ROR", self.ror, self.absoluteX)
-        
-        self.addInstruction(0x40, "RTI", self.rti, None)
-        
-        self.addInstruction(0x60, "RTS", self.rts, None)
-
-        self.addInstruction(0xe9, "SBC", self.sbc, self.immediate)
-        self.addInstruction(0xe5, "SBC", self.sbc, self.zeroPage)
-        self.addInstruction(0xf5, "SBC", self.sbc, self.zeroPageX)
-        self.addInstruction(0xed, "SBC", self.sbc, self.absolute)
-        self.addInstruction(0xfd, "SBC", self.sbc, self.absoluteX)
-        self.addInstruction(0xf9, "SBC", self.sbc, self.absoluteY)
-        self.addInstruction(0xe1, "SBC", self.sbc, self.indirectX)
-        self.addInstruction(0xf1, "SBC", self.sbc, self.indirectY)
-
-        self.addInstruction(0x85, "STA", self.sta, self.zeroPage)
-        self.addInstruction(0x95, "STA", self.sta, self.zeroPageX)
-        self.addInstruction(0x8d, "STA", self.sta, self.absolute)
-        self.addInstruction(0x9d, "STA", self.sta, self.absoluteX)
-        self.addInstruction(0x99, "STA", self.sta, self.absoluteY)
-        self.addInstruction(0x81, "STA", self.sta, self.indirectX)
-        self.addInstruction(0x91, "STA", self.sta, self.indirectY)
-
-        self.addInstruction(0x9a, "TXS", self.txs, None)
-        self.addInstruction(0xba, "TSX", self.tsx, None)
-        self.addInstruction(0x48, "PHA", self.pha, None)
-        self.addInstruction(0x68, "PLA", self.pla, None)
-        self.addInstruction(0x08, "PHP", self.php, None)
-        self.addInstruction(0x28, "PLP", self.plp, None)
-        
-        self.addInstruction(0x86, "STX", self.stx, self.zeroPage)
-        self.addInstruction(0x96, "STX", self.stx, self.zeroPageY),
-        self.addInstruction(0x8e, "STX", self.stx, self.absolute)
+        self.addInstruction(0x20, "JSR", self.jsr, self.absolute, cycles=6)
+
+        self.addInstruction(0xa9, "LDA", self.lda, self.immediate, cycles=2)
+        self.addInstruction(0xa5, "LDA", self.lda, self.zeroPage, cycles=3)
+        self.addInstruction(0xb5, "LDA", self.lda, self.zeroPageX, cycles=4)
+        self.addInstruction(0xad, "LDA", self.lda, self.absolute, cycles=4)
+        self.addInstruction(0xbd, "LDA", self.lda, self.absoluteX, cycles=4)
+        self.addInstruction(0xb9, "LDA", self.lda, self.absoluteY, cycles=4)
+        self.addInstruction(0xa1, "LDA", self.lda, self.indirectX, cycles=6)
+        self.addInstruction(0xb1, "LDA", self.lda, self.indirectY, cycles=5)
+        
+        self.addInstruction(0xa2, "LDX", self.ldx, self.immediate, cycles=2)
+        self.addInstruction(0xa6, "LDX", self.ldx, self.zeroPage, cycles=3)
+        self.addInstruction(0xb6, "LDX", self.ldx, self.zeroPageY, cycles=4)
+        self.addInstruction(0xae, "LDX", self.ldx, self.absolute, cycles=4)
+        self.addInstruction(0xbe, "LDX", self.ldx, self.absoluteY, cycles=4)
+        
+        self.addInstruction(0xa0, "LDY", self.ldy, self.immediate, cycles=2)
+        self.addInstruction(0xa4, "LDY", self.ldy, self.zeroPage, cycles=3)
+        self.addInstruction(0xb4, "LDY", self.ldy, self.zeroPageX, cycles=4)
+        self.addInstruction(0xac, "LDY", self.ldy, self.absolute, cycles=4)
+        self.addInstruction(0xbc, "LDY", self.ldy, self.absoluteX, cycles=4)
+
+        self.addInstruction(0x4a, "LSR", self.lsr, self.accumulator, cycles=2)
+        self.addInstruction(0x46, "LSR", self.lsr, self.zeroPage, cycles=5)
+        self.addInstruction(0x56, "LSR", self.lsr, self.zeroPageX, cycles=6)
+        self.addInstruction(0x4e, "LSR", self.lsr, self.absolute, cycles=6)
+        self.addInstruction(0x5e, "LSR", self.lsr, self.absoluteX, cycles=7)
+
+        self.addInstruction(0xea, "NOP", self.nop, None, cycles=2)
+        
+        self.addInstruction(0x09, "ORA", self.ora, self.immediate, cycles=2)
+        self.addInstruction(0x05, "ORA", self.ora, self.zeroPage, cycles=3)
+        self.addInstruction(0x15, "ORA", self.ora, self.zeroPageX, cycles=4)
+        self.addInstruction(0x0d, "ORA", self.ora, self.absolute, cycles=4)
+        self.addInstruction(0x1d, "ORA", self.ora, self.absoluteX, cycles=4)
+        self.addInstruction(0x19, "ORA", self.ora, self.absoluteY, cycles=4)
+        self.addInstruction(0x01, "ORA", self.ora, self.indirectX, cycles=6)
+        self.addInstruction(0x11, "ORA", self.ora, self.indirectY, cycles=5)
+        
+        self.addInstruction(0xaa, "TAX", self.tax, None, cycles=2)
+        self.addInstruction(0x8a, "TXA", self.txa, None, cycles=2)
+        self.addInstruction(0xca, "DEX", self.dex, None, cycles=2)
+        self.addInstruction(0xe8, "INX", self.inx, None, cycles=2)
+        self.addInstruction(0xa8, "TAY", self.tay, None, cycles=2)
+        self.addInstruction(0x98, "TYA", self.tya, None, cycles=2)
+        self.addInstruction(0x88, "DEY", self.dey, None, cycles=2)
+        self.addInstruction(0xc8, "INY", self.iny, None, cycles=2)
+        
+        self.addInstruction(0x2a, "ROL", self.rol, self.accumulator, cycles=2)
+        self.addInstruction(0x26, "ROL", self.rol, self.zeroPage, cycles=5)
+        self.addInstruction(0x36, "ROL", self.rol, self.zeroPageX, cycles=6)
+        self.addInstruction(0x2e, "ROL", self.rol, self.absolute, cycles=6)
+        self.addInstruction(0x3e, "ROL", self.rol, self.absoluteX, cycles=7)
+        
+        self.addInstruction(0x6a, "ROR", self.ror, self.accumulator, cycles=2)
+        self.addInstruction(0x66, "ROR", self.ror, self.zeroPage, cycles=5)
+        self.addInstruction(0x76, "ROR", self.ror, self.zeroPageX, cycles=6)
+        self.addInstruction(0x6e, "ROR", self.ror, self.absolute, cycles=6)
+        self.addInstruction(0x7e, "ROR", self.ror, self.absoluteX, cycles=7)
+        
+        self.addInstruction(0x40, "RTI", self.rti, None, cycles=6)
+        
+        self.addInstruction(0x60, "RTS", self.rts, None, cycles=6)
+
+        self.addInstruction(0xe9, "SBC", self.sbc, self.immediate, cycles=2)
+        self.addInstruction(0xe5, "SBC", self.sbc, self.zeroPage, cycles=3)
+        self.addInstruction(0xf5, "SBC", self.sbc, self.zeroPageX, cycles=4)
+        self.addInstruction(0xed, "SBC", self.sbc, self.absolute, cycles=4)
+        self.addInstruction(0xfd, "SBC", self.sbc, self.absoluteX, cycles=4)
+        self.addInstruction(0xf9, "SBC", self.sbc, self.absoluteY, cycles=4)
+        self.addInstruction(0xe1, "SBC", self.sbc, self.indirectX, cycles=6)
+        self.addInstruction(0xf1, "SBC", self.sbc, self.indirectY, cycles=5)
+
+        self.addInstruction(0x85, "STA", self.sta, self.zeroPage, cycles=3)
+        self.addInstruction(0x95, "STA", self.sta, self.zeroPageX, cycles=4)
+        self.addInstruction(0x8d, "STA", self.sta, self.absolute, cycles=4)
+        self.addInstruction(0x9d, "STA", self.sta, self.absoluteX, cycles=5)
+        self.addInstruction(0x99, "STA", self.sta, self.absoluteY, cycles=5)
+        self.addInstruction(0x81, "STA", self.sta, self.indirectX, cycles=6)
+        self.addInstruction(0x91, "STA", self.sta, self.indirectY, cycles=6)
+
+        self.addInstruction(0x9a, "TXS", self.txs, None, cycles=2)
+        self.addInstruction(0xba, "TSX", self.tsx, None, cycles=2)
+        self.addInstruction(0x48, "PHA", self.pha, None, cycles=3)
+        self.addInstruction(0x68, "PLA", self.pla, None, cycles=4)
+        self.addInstruction(0x08, "PHP", self.php, None, cycles=3)
+        self.addInstruction(0x28, "PLP", self.plp, None, cycles=4)
+        
+        self.addInstruction(0x86, "STX", self.stx, self.zeroPage, cycles=3)
+        self.addInstruction(0x96, "STX", self.stx, self.zeroPageY, cycles=4)
+        self.addInstruction(0x8e, "STX", self.stx, self.absolute, cycles=4)
  
-        self.addInstruction(0x84, "STY", self.sty, self.zeroPage)
-        self.addInstruction(0x94, "STY", self.sty, self.zeroPageX)
-        self.addInstruction(0x8c, "STY", self.sty, self.absolute)
+        self.addInstruction(0x84, "STY", self.sty, self.zeroPage, cycles=3)
+        self.addInstruction(0x94, "STY", self.sty, self.zeroPageX, cycles=4)
+        self.addInstruction(0x8c, "STY", self.sty, self.absolute, cycles=4)
 
-        self.addInstruction(0xFF, "END", self.end, None)
+        self.addInstruction(0xFF, "END", self.end, None, cycles=1)
         
         self.addData('BYTE', 1, self.decodeInt)
         self.addData('WORD', 2, self.decodeInt)
@@ -258,6 +276,8 @@ class Chip(Processor):
         self.setWordSize(wordSize)
         self.setInstructionSize(instructionSize)
         self.setAddressSize(addressSize)
+        # addresses are stored low byte first
+        self.setByteOrder(Processor.littleEndian)
         
     def translateIntoOffset(self, addressing):
         return self.zeroPage
@@ -266,6 +286,44 @@ class Chip(Processor):
         super(Chip, self).clear()
         # reset the Stack Pointer to its starting value
         self.SP.set(0x1ff)
+        
+    def acceptInterrupt(self, board, lines):
+        """
+        NMI first, then IRQ unless Interrupt indicator is set (IRQ stays pending)
+        Return address and status are pushed, interrupts are disabled and PC is loaded from the vector
+        """
+        if (lines & Processor.nmi):
+            self.clearInterrupt(Processor.nmi)
+            vector = self.nmiVector
+        elif (lines & Processor.irq) and (not self.interrupt.get()):
+            vector = self.irqVector
+        else:
+            return
+        sp = self.SP.get()
+        # same order as JSR: high byte of PC first, then status
+        board.memory.write16(sp - 1, self.PC.get())
+        board.memory.set(sp - 2, self.PSR.getSize(), self.getStatus() & ~self.brkInd.getMask())
+        self.SP.set(sp - 3)
+        self.interrupt.set(1)
+        self.PC.set(board.memory.read16(vector))
+        self.addCycles(7)
+
+    def createEngine(self, board):
+        # translated code accesses memory storage directly: the whole address space must exist
+        if board.memory.getSize() < (1 << (self.getAddressSize() * 8)):
+            return None
+        from engine_6502 import BlockEngine
+        return BlockEngine(board)
+    
+    def createLockstepEngine(self, board, count):
+        # same memory requirement: effective addresses are not checked
+        if board.memory.getSize() < (1 << (self.getAddressSize() * 8)):
+            return None
+        # nor are writes into ROM, and devices are not emulated
+        if board.memory.hasRegion(board.memory.rom | board.memory.ioRead):
+            return None
+        from lockstep_6502 import LockstepEngine
+        return LockstepEngine(board, count)
     
     #
     # implementation of methods used to decode data    
@@ -305,53 +363,69 @@ class Chip(Processor):
     # implementation of callback used when executing code
     #
         
-    def getAddress(self, board, parameter):
-        ptype = parameter.getAddressing()
-        pvalue = parameter.getValue()
-        psize = parameter.getSize()
-        if ptype == self.zeroPage or ptype == self.absolute:
-            address = libproc.ltoui(pvalue, psize)
-        elif ptype == self.zeroPageX or ptype == self.absoluteX:
-            address = libproc.ltoui(pvalue, psize)
-            address += self.regX.get()
-        elif ptype == self.zeroPageY or ptype == self.absoluteY:
-            address = libproc.ltoui(pvalue, psize)
-            address += self.regY.get()
-        elif ptype == self.indirect:
-            address = libproc.ltoui(pvalue, psize)
-            address = board.memory.get(address, self.getAddressSize())
-        elif ptype == self.indirectX:
-            address = libproc.ltoui(pvalue, psize) + self.regX.get()
-            address = board.memory.get(address, self.getAddressSize())
-        elif ptype == self.indirectY:
-            address = libproc.ltoui(pvalue, psize)
-            address = board.memory.get(address, self.getAddressSize())
-            address = address + self.regY.get()
-        else:
-            print "NOT YET IMPLEMENTED"
+    #
+    # effective address of each addressing mode
+    #
+    def addrDirect(self, board, parameter):
+        return libproc.ltoui(parameter.getValue(), parameter.getSize())
+    
+    def addrIndexedX(self, board, parameter):
+        address = libproc.ltoui(parameter.getValue(), parameter.getSize()) + self.regX.get()
         return libproc.ltoui(address, self.getAddressSize())
     
+    def addrIndexedY(self, board, parameter):
+        address = libproc.ltoui(parameter.getValue(), parameter.getSize()) + self.regY.get()
+        return libproc.ltoui(address, self.getAddressSize())
+    
+    def addrIndirect(self, board, parameter):
+        address = libproc.ltoui(parameter.getValue(), parameter.getSize())
+        return board.memory.read16(address)
+    
+    def addrIndirectX(self, board, parameter):
+        address = libproc.ltoui(parameter.getValue(), parameter.getSize()) + self.regX.get()
+        return board.memory.read16(address)
+    
+    def addrIndirectY(self, board, parameter):
+        address = libproc.ltoui(parameter.getValue(), parameter.getSize())
+        address = board.memory.read16(address) + self.regY.get()
+        return libproc.ltoui(address, self.getAddressSize())
+    
+    def getAddress(self, board, parameter):
+        resolver = parameter.getResolver()
+        if not resolver:
+            raise ExecError(Error.error, "Addressing mode " + str(parameter.getAddressing()) + ": no memory address")
+        return resolver(board, parameter)
+    
     def getData(self, board, parameter, datasize):
-        ptype = parameter.getAddressing()
-        pvalue = parameter.getValue()
-        psize = parameter.getSize()
-        if ptype == self.accumulator:
+        resolver = parameter.getResolver()
+        if resolver:
+            return board.memory.get(resolver(board, parameter), datasize)
+        if parameter.getAddressing() == self.accumulator:
             return self.regA.get()
-        if ptype == self.immediate:
-            return libproc.ltoi(pvalue, psize)
-        else:
-            address = self.getAddress(board, parameter)
-            return board.memory.get(address, datasize)
+        # immediate
+        return libproc.ltoi(parameter.getValue(), parameter.getSize())
+        
+    def getReadData(self, board, parameter, datasize):
+        """
+        Same as getData() for instructions which only read their operand:
+        one more cycle is spent when indexing crosses a page boundary
+        """
+        resolver = parameter.getResolver()
+        if not resolver:
+            return self.getData(board, parameter, datasize)
+        address = resolver(board, parameter)
+        index = self.__pageCrossingIndex.get(parameter.getAddressing())
+        if (index) and ((address ^ (address - index.get())) & 0xff00):
+            self.addCycles(1)
+        return board.memory.get(address, datasize)
         
     def setData(self, board, parameter, data):
-        ptype = parameter.getAddressing()
-        pvalue = parameter.getValue()
-        psize = parameter.getSize()
-        if ptype == self.accumulator:
+        resolver = parameter.getResolver()
+        if not resolver:
+            # accumulator
             self.regA.set(data)
             return
-        address = self.getAddress(board, parameter)
-        board.memory.set(address, self.getWordSize(), data)    
+        board.memory.set(resolver(board, parameter), self.getWordSize(), data)    
         
     def getHigh(self, value):
         res = value >> (self.getWordSize() * 8)
@@ -363,7 +437,7 @@ class Chip(Processor):
         return res         
 
     def adc(self, board, parameterList):
-        value = self.getData(board, parameterList[0], self.regA.getSize())
+        value = self.getReadData(board, parameterList[0], self.regA.getSize())
         value = libproc.ltoui(value, self.getWordSize())
         #self.regA.add(value + self.carry.get())
         carry = self.carry.get()
@@ -389,7 +463,7 @@ class Chip(Processor):
     def sbc(self, board, parameterList):
         # operation are done with unsigned integer to detect carry and overflow
         # res = A + ~ M + C  
-        value = self.getData(board, parameterList[0], self.regA.getSize())
+        value = self.getReadData(board, parameterList[0], self.regA.getSize())
         carry = self.carry.get()
         cvalue = libproc.complement1(value, self.getWordSize())
         cvalue = libproc.ltoui(cvalue, self.getWordSize())
@@ -406,7 +480,7 @@ class Chip(Processor):
         self.regA.set(res)
 
     def and1(self, board, parameterList):
-        value = self.getData(board, parameterList[0], self.regA.getSize())
+        value = self.getReadData(board, parameterList[0], self.regA.getSize())
         self.regA.set(value & self.regA.get())
  
     def asl(self, board, parameterList):
@@ -461,7 +535,7 @@ class Chip(Processor):
             self.negative.set(0)
 
     def eor(self, board, parameterList):
-        value = self.getData(board, parameterList[0], self.regA.getSize())
+        value = self.getReadData(board, parameterList[0], self.regA.getSize())
         self.regA.set(value ^ self.regA.get())
         
     def inc(self, board, parameterList):
@@ -480,13 +554,15 @@ class Chip(Processor):
     def jsr(self, board, parameterList):
         address = self.getAddress(board, parameterList[0])
         pc = self.PC.get() - 1
-        val = self.getHigh(pc)
-        board.memory.set(self.SP.get(), self.getWordSize(), val)
-        self.SP.set(self.SP.get() - 1)
-        val = self.getLow(pc)
-        board.memory.set(self.SP.get(), self.getWordSize(), val)
-        self.SP.set(self.SP.get() - 1)
+        sp = self.SP.get()
+        # high byte pushed first: low byte at the lowest address
+        board.memory.write16(sp - 1, pc)
+        self.SP.set(sp - 2)
         self.PC.set(address)
+        # call graph
+        profiler = self.getProfiler()
+        if (profiler is not None):
+            profiler.enterCall(address, sp)
 
 
     def lsr(self, board, parameterList):
@@ -508,7 +584,7 @@ class Chip(Processor):
             self.zero.set(0)
 
     def ora(self, board, parameterList):
-        value = self.getData(board, parameterList[0], self.regA.getSize())
+        value = self.getReadData(board, parameterList[0], self.regA.getSize())
         self.regA.set(value | self.regA.get())
 
     def rol(self, board, parameterList):
@@ -555,23 +631,21 @@ class Chip(Processor):
             self.zero.set(0)
  
     def rti(self, board, parameterList):
-        self.SP.set(self.SP.get() - 1)
-        self.PSR.set(board.memory.get(self.SP.get(), self.PSR.getSize()))
-        self.SP.set(self.SP.get() - 1)
-        low = board.memory.get(self.SP.get(), self.getWordSize())
-        self.SP.set(self.SP.get() - 1)
-        high = board.memory.get(self.SP.get(), self.getWordSize())
-        value = (high << 4) + low
-        self.PC.set(value)
+        # pull what acceptInterrupt() pushed: status then return address
+        sp = self.SP.get()
+        self.PSR.set(board.memory.get(sp + 1, self.PSR.getSize()))
+        self.PC.set(board.memory.read16(sp + 2))
+        self.SP.set(sp + 3)
 
 
     def rts(self, board, parameterList):
-        self.SP.set(self.SP.get() + 1)
-        low = board.memory.get(self.SP.get(), self.getWordSize())
-        self.SP.set(self.SP.get() + 1)
-        high = board.memory.get(self.SP.get(), self.getWordSize())
-        value = (high << 4) + low
+        sp = self.SP.get()
+        value = board.memory.read16(sp + 1)
+        self.SP.set(sp + 2)
         self.PC.set(value + 1)
+        profiler = self.getProfiler()
+        if (profiler is not None):
+            profiler.leaveCall(self.SP.get())
 
     def txs(self, board, parameterList):
         self.SP.set(self.regX.get())
@@ -591,27 +665,13 @@ class Chip(Processor):
         board.memory.set(self.SP.get(), self.PSR.getSize(), self.PSR.get())
         self.SP.set(self.SP.get() - 1)
 
-    def forceIndic(self, indic):
-        mask = 1 << indic.getRank()
-        if (self.PSR.get() & mask) != 0:
-            indic.set(1)
-        else:
-            indic.set(0)
-            
     def plp(self, board, parameterList):
         self.SP.set(self.SP.get() + 1)
+        # indicators are bits of PSR: all of them are set by this update
         self.PSR.set(board.memory.get(self.SP.get(), self.PSR.getSize()))
-        # set all indicator based on new SP value
-        self.forceIndic(self.carry)
-        self.forceIndic(self.zero)
-        self.forceIndic(self.interrupt)
-        self.forceIndic(self.decimal)
-        self.forceIndic(self.brkInd)
-        self.forceIndic(self.overflow)
-        self.forceIndic(self.negative)
     
     def ldreg(self, board, reg, parameterList):
-        value = self.getData(board, parameterList[0], reg.getSize())
+        value = self.getReadData(board, parameterList[0], reg.getSize())
         reg.set(value)
         
     def lda(self, board, parameterList):
@@ -661,7 +721,10 @@ class Chip(Processor):
         
     def bRelatif(self, board, parameterList):
         value = libproc.ltoi(parameterList[0].getValue(), parameterList[0].getSize())
-        self.PC.set(self.PC.get() + value)
+        address = self.PC.get()
+        self.PC.set(address + value)
+        # branch taken: one more cycle, two if target is in another page
+        self.addCycles(1 + (((address ^ self.PC.get()) & 0xff00) != 0))
            
     def bpl(self, board, parameterList):
         if (self.negative.get() == 0):
@@ -718,7 +781,7 @@ class Chip(Processor):
         raise ExecError(Error.error, "Decimal mode not implemented")
    
     def cmpr(self, board, reg, parameterList):
-        value = self.getData(board, parameterList[0], reg.getSize())
+        value = self.getReadData(board, parameterList[0], reg.getSize())
         regvalue = libproc.ltoi(reg.get(), reg.getSize())
         if (regvalue == value):
             self.zero.set(1)
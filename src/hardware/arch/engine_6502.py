@@ -0,0 +1,596 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# 6502 block translation engine
+#
+#    a straight-line sequence of instructions (basic block) is translated into one
+#    generated Python function: registers and indicators are kept into local variables
+#    while the block runs and are written back when it exits
+#
+#    a block ends with a branch or a jump, or before an instruction which is not translated
+#    (stack, interrupt, END, ...): such instructions are executed by the interpreter
+#    a block ending with a branch to its own start loops without leaving the function
+#
+#    translated code behaves exactly like the callbacks of arch_6502.Chip
+#    blocks are invalidated when memory they have been translated from is overwritten
+#    a breakpoint can only be on the first instruction of a block: the block is then run once
+#    memory watchpoints are checked only by blocks translated while watchpoints exist
+#
+
+import libproc
+from error import Error
+from memory import Watchpoint
+from scheduler import Scheduler
+
+
+class Block:
+
+    def __init__(self, address, size, length, run):
+        # address of first instruction
+        self.address    = address
+        # number of bytes translated
+        self.size       = size
+        # number of instructions executed by one pass through the block
+        self.length     = length
+        # generated function: run(budget) executes the block, returns the number of executed instructions
+        self.run        = run
+
+
+class BlockCode:
+    "Source code of a block being translated"
+
+    def __init__(self, start):
+        self.start          = start
+        self.lineList       = []
+        # number of translated instructions and their cycles (without penalties)
+        self.length         = 0
+        self.cycles         = 0
+        # address of the instruction being translated and of the next one
+        self.address        = start
+        self.nextAddress    = start
+        # conditions to leave the block after the current instruction
+        self.exitList       = []
+        # True when accesses to watched memory pages must be checked
+        self.watched        = False
+        # True when reads of device outputs (memory map) must be checked
+        self.polled         = False
+        # True when writes into device inputs (memory map) must be checked
+        self.io             = False
+        # True when the block ends with a branch or a jump
+        self.terminated     = False
+        # registers modified by the block
+        self.writtenSet     = set()
+
+    def emit(self, line, indent=0):
+        # body is inside the "while True" loop of the generated function
+        self.lineList.append("            " + "    " * indent + line)
+
+
+class BlockEngine:
+
+    # maximum number of instructions translated into one block
+    __maxBlockLength = 64
+
+    # local variable holding each register into generated code
+    __regVariable = {'A': 'a', 'X': 'x', 'Y': 'y'}
+
+    def __init__(self, board):
+        self.board = board
+        self.chip = board.chip
+        self.memory = board.memory
+
+        # translated block per start address
+        # False when no block can start at this address (executed by the interpreter)
+        self.blockCache = {}
+        # size in bytes of the largest translated block
+        self.maxBlockSize = 0
+
+        chip = self.chip
+        # code generator per callback of the chip
+        self.generatorDict = {
+            'lda': self.genLoad, 'ldx': self.genLoad, 'ldy': self.genLoad,
+            'sta': self.genStore, 'stx': self.genStore, 'sty': self.genStore,
+            'adc': self.genAdc, 'sbc': self.genSbc,
+            'and1': self.genLogical, 'ora': self.genLogical, 'eor': self.genLogical,
+            'asl': self.genAsl, 'lsr': self.genLsr, 'rol': self.genRol, 'ror': self.genRor,
+            'bit': self.genBit,
+            'inc': self.genIncDec, 'dec': self.genIncDec,
+            'inx': self.genIncDecReg, 'iny': self.genIncDecReg, 'dex': self.genIncDecReg, 'dey': self.genIncDecReg,
+            'tax': self.genTransfer, 'txa': self.genTransfer, 'tay': self.genTransfer, 'tya': self.genTransfer,
+            'cmp': self.genCompare, 'cpx': self.genCompare, 'cpy': self.genCompare,
+            'clc': self.genFlag, 'sec': self.genFlag, 'clv': self.genFlag,
+            'nop': self.genNop,
+            'bpl': self.genBranch, 'bmi': self.genBranch, 'bvc': self.genBranch, 'bvs': self.genBranch,
+            'bcc': self.genBranch, 'bcs': self.genBranch, 'bne': self.genBranch, 'beq': self.genBranch,
+            'jmp': self.genJump,
+        }
+        # register (local variable) used by each callback
+        self.regDict = {
+            'lda': 'a', 'sta': 'a', 'cmp': 'a',
+            'ldx': 'x', 'stx': 'x', 'cpx': 'x', 'inx': 'x', 'dex': 'x',
+            'ldy': 'y', 'sty': 'y', 'cpy': 'y', 'iny': 'y', 'dey': 'y',
+        }
+        # index variable of addressing modes spending one more cycle when indexing crosses a page
+        self.pageCrossingDict = {chip.absoluteX: 'x', chip.absoluteY: 'y', chip.indirectY: 'y'}
+        # condition of each branch
+        self.conditionDict = {
+            'bpl': "not n", 'bmi': "n", 'bvc': "not v", 'bvs': "v",
+            'bcc': "not c", 'bcs': "c", 'bne': "not z", 'beq': "z",
+        }
+        # effective address of each resolver: %d is replaced by the operand
+        addressSize = chip.getAddressSize()
+        addressMask = str((1 << (addressSize * 8)) - 1)
+        self.addressDict = {
+            'addrDirect':       "%d",
+            'addrIndexedX':     "((%d + x) & " + addressMask + ")",
+            'addrIndexedY':     "((%d + y) & " + addressMask + ")",
+            'addrIndirect':     "read16(%d)",
+            'addrIndirectX':    "read16(%d + x)",
+            'addrIndirectY':    "((read16(%d) + y) & " + addressMask + ")",
+        }
+
+        # most cycles one instruction can spend: page crossing or branch taken to another page add 2 at most
+        self.maxInstructionCycles = max([inst.getCycles() for inst in chip.getInstructionSet()]) + 2
+
+        chip.attachEngine(self)
+
+    #
+    # EXECUTION
+    #
+
+    def executeNext(self, maxInstructions):
+        """
+        Execute the block starting at PC or, if there is none or if it doesn't fit into
+        maxInstructions, one instruction through the interpreter
+        Blocks are not used when the chip is instrumented (journal, profiler, trace): they are filled per instruction
+        nor when an interrupt line is asserted: the interpreter accepts it
+        A block never reaches the deadline of the next device event: the interpreter runs the instructions before it
+        When the chip is supervised (budget, loop detection), a block only runs the instructions allowed
+        until the next check
+        Return the number of executed instructions
+        """
+        chip = self.chip
+        address = chip.PC.get()
+        block = self.blockCache.get(address)
+        if block is None:
+            block = self.translate(address)
+        if block and (block.length <= maxInstructions) and (not chip.isInstrumented()) and (not chip.getInterrupts()):
+            if not chip.isSupervised():
+                maxInstructions = self.getEventLimit(maxInstructions)
+                if block.length <= maxInstructions:
+                    return block.run(maxInstructions)
+                chip.executeNext(self.board)
+                return 1
+            # supervision may fast-forward cycles to the next event
+            chip.supervise(self.board)
+            maxInstructions = self.getEventLimit(maxInstructions)
+            left = chip.getBudgetLeft()
+            if left is None:
+                left = maxInstructions
+            if (block.length <= left) and (block.length <= maxInstructions):
+                count = block.run(min(maxInstructions, left))
+                chip.addExecuted(count)
+                return count
+        chip.executeNext(self.board)
+        return 1
+
+    def getEventLimit(self, maxInstructions):
+        "Instructions which can run before the deadline of the next device event"
+        nextEvent = self.chip.getNextEvent()
+        if nextEvent == Scheduler.never:
+            return maxInstructions
+        return min(maxInstructions, int(nextEvent - self.chip.getCycles()) // self.maxInstructionCycles)
+
+    #
+    # CACHE management
+    #
+
+    def invalidate(self, address, length):
+        "Memory overwritten: remove all blocks overlapping the updated area"
+        for start in range(address - self.maxBlockSize + 1, address + length):
+            self.blockCache.pop(start, None)
+
+    def clear(self):
+        self.blockCache = {}
+
+    #
+    # TRANSLATION
+    #
+
+    def translate(self, address):
+        try:
+            block = self.buildBlock(address)
+        except Error:
+            # decoding outside memory: let the interpreter report the error
+            block = False
+        self.blockCache[address] = block
+        return block
+
+    def buildBlock(self, address):
+        chip = self.chip
+        memory = self.memory
+        code = BlockCode(address)
+        code.watched = len(memory.watchList) > 0
+        code.polled = memory.hasRegion(memory.ioRead)
+        code.io = memory.hasRegion(memory.io)
+        breakpointSet = self.board.breakpointSet
+        while (code.length < BlockEngine.__maxBlockLength) and (not code.terminated):
+            if (code.length > 0) and (code.nextAddress in breakpointSet):
+                # execution must stop before this instruction
+                break
+            inst, parameterList, nextAddress = chip.decodeInstruction(memory, code.nextAddress)
+            if not inst:
+                break
+            generator = self.generatorDict.get(inst.getCallback().__name__)
+            if not generator:
+                break
+            code.address = code.nextAddress
+            code.nextAddress = nextAddress
+            mark = len(code.lineList)
+            code.length += 1
+            code.cycles += inst.getCycles()
+            code.exitList = []
+            if generator(code, inst.getCallback().__name__, parameterList) == False:
+                # not translated: discard generated lines
+                del code.lineList[mark:]
+                code.length -= 1
+                code.cycles -= inst.getCycles()
+                code.nextAddress = code.address
+                break
+            if code.exitList and not code.terminated:
+                # self-modifying code, watchpoint hit: leave the block
+                code.emit("if " + " or ".join(code.exitList) + ":")
+                code.emit("count += " + str(code.length), 1)
+                code.emit("cy += " + str(code.cycles), 1)
+                code.emit("pc = " + str(code.nextAddress), 1)
+                code.emit("break", 1)
+
+        if code.length == 0:
+            return False
+        if not code.terminated:
+            code.emit("count += " + str(code.length))
+            code.emit("cy += " + str(code.cycles))
+            code.emit("pc = " + str(code.nextAddress))
+            code.emit("break")
+
+        size = code.nextAddress - address
+        block = Block(address, size, code.length, self.compile(code))
+        if size > self.maxBlockSize:
+            self.maxBlockSize = size
+        memory.markCode(address, size)
+        return block
+
+    def compile(self, code):
+        chip = self.chip
+        flagList = [('c', chip.carry), ('z', chip.zero), ('v', chip.overflow), ('n', chip.negative)]
+        keepMask = ~(chip.carry.getMask() | chip.zero.getMask() | chip.overflow.getMask() | chip.negative.getMask())
+
+        lineList = ["def run(budget):",
+                    "    st = memory.storage",
+                    "    codeMap = memory.codeMap",
+                    "    wmap = memory.watchMap",
+                    "    pmap = memory.pageMap",
+                    "    a = regA.get()",
+                    "    x = regX.get()",
+                    "    y = regY.get()",
+                    "    status = getStatus()"]
+        for name, indicator in flagList:
+            lineList.append("    " + name + " = (status >> " + str(indicator.getRank()) + ") & 1")
+        lineList.append("    count = 0")
+        lineList.append("    pc = " + str(code.start))
+        # cycles of completed passes, cycles of current pass up to an instruction which may fail
+        lineList.append("    cy = 0")
+        lineList.append("    k = 0")
+        lineList.append("    try:")
+        lineList.append("        while True:")
+        lineList += code.lineList
+
+        # state is written back even if an instruction failed (like the interpreter does)
+        # registers first, then indicators: setting a register updates Zero and Negative
+        lineList.append("    except:")
+        lineList.append("        cy += k")
+        lineList.append("        raise")
+        lineList.append("    finally:")
+        for variable, reg in (('a', 'regA'), ('x', 'regX'), ('y', 'regY')):
+            if variable in code.writtenSet:
+                lineList.append("        " + reg + ".set(" + variable + ")")
+        flags = " | ".join(["(" + name + " and " + str(indicator.getMask()) + ")" for name, indicator in flagList])
+        lineList.append("        setStatus((getStatus() & " + str(keepMask) + ") | " + flags + ")")
+        lineList.append("        PC.set(pc)")
+        lineList.append("        addCycles(cy)")
+        lineList.append("    return count")
+        source = "\n".join(lineList) + "\n"
+
+        namespace = {'memory': self.memory, 'read16': self.memory.read16, 'readDevices': self.memory.readDevices, 'setByte': self.memory.setByte,
+                     'regA': chip.regA, 'regX': chip.regX, 'regY': chip.regY, 'PC': chip.PC,
+                     'watch': self.memory.checkWatch,
+                     'getStatus': chip.getStatus, 'setStatus': chip.setStatus, 'addCycles': chip.addCycles}
+        exec compile(source, "<block " + libproc.ltoh(code.start, chip.getAddressSize()) + ">", "exec") in namespace
+        return namespace['run']
+
+    #
+    # helpers generating code
+    #
+
+    def signed(self, expression):
+        "Expression converted into a signed byte (like libproc.ltoi)"
+        return "((((" + expression + ") & 255) ^ 128) - 128)"
+
+    def address(self, code, parameter):
+        "Effective address of a parameter: constant or 'ea' computed by generated code. None if not translated"
+        resolver = parameter.getResolver()
+        if not resolver:
+            return None
+        pattern = self.addressDict.get(resolver.__name__)
+        if not pattern:
+            return None
+        base = libproc.ltoui(parameter.getValue(), parameter.getSize())
+        if pattern == "%d":
+            return str(base)
+        if "read16" in pattern:
+            # memory read may fail: PC is already on next instruction and cycles are spent when it happens
+            code.emit("pc = " + str(code.nextAddress))
+            code.emit("k = " + str(code.cycles))
+            if code.watched:
+                # pointer is read through read16(): watchpoints are checked
+                self.leaveOnWatchHit(code)
+        code.emit("ea = " + (pattern % base))
+        return "ea"
+
+    def read(self, code, parameter, readOnly=False):
+        """
+        Expression of the signed value read by getData() (getReadData() if readOnly is True)
+        None if not translated
+        """
+        if not parameter.getResolver():
+            if parameter.getAddressing() == self.chip.accumulator:
+                return "a"
+            # immediate
+            return str(libproc.ltoi(parameter.getValue(), parameter.getSize()))
+        address = self.address(code, parameter)
+        if address is None:
+            return None
+        index = self.pageCrossingDict.get(parameter.getAddressing())
+        if readOnly and index:
+            code.emit("if (ea ^ (ea - " + index + ")) & 65280:")
+            code.emit("cy += 1", 1)
+        if code.polled:
+            # device outputs: values are updated before being read
+            if address != "ea":
+                if self.memory.getRegion(int(address)) & self.memory.ioRead:
+                    self.syncCycles(code)
+                    code.emit("readDevices(" + address + ", 1)")
+            else:
+                code.emit("if pmap[ea >> " + str(self.memory.pageShift) + "] & " + str(self.memory.ioRead) + ":")
+                self.syncCycles(code, 1)
+                code.emit("readDevices(ea, 1)", 1)
+        if code.watched:
+            code.emit("if wmap[" + address + " >> " + str(self.memory.pageShift) + "] & " + str(Watchpoint.read) + ":")
+            code.emit("watch(" + address + ", 1, " + str(Watchpoint.read) + ")", 1)
+            self.leaveOnWatchHit(code)
+        return "((st[" + address + "] ^ 128) - 128)"
+
+    def write(self, code, parameter, variable):
+        "Same as setData(): variable holds the value"
+        if not parameter.getResolver():
+            # accumulator: value converted like Register.set() does, variable kept unchanged
+            self.setReg(code, 'a', self.signed(variable))
+            return
+        address = "ea"
+        if parameter.getResolver().__name__ == 'addrDirect':
+            address = str(libproc.ltoui(parameter.getValue(), parameter.getSize()))
+        if self.memory.hasRegion(self.memory.rom):
+            # write into ROM fails: PC is already on next instruction and cycles are spent when it happens
+            code.emit("pc = " + str(code.nextAddress))
+            code.emit("k = " + str(code.cycles))
+        if code.io:
+            # devices see the cycle counter of the interpreter, block is left once they are written:
+            # they may raise an interrupt or schedule an event
+            if address != "ea":
+                if self.memory.getRegion(int(address)) & self.memory.io:
+                    self.syncCycles(code)
+                    code.exitList.append("True")
+            else:
+                code.emit("dev = pmap[ea >> " + str(self.memory.pageShift) + "] & " + str(self.memory.io))
+                code.emit("if dev:")
+                self.syncCycles(code, 1)
+                code.exitList.append("dev")
+        code.emit("smc = codeMap[" + address + "]")
+        code.emit("setByte(" + address + ", " + variable + ")")
+        code.exitList.append("smc")
+        if code.watched:
+            self.leaveOnWatchHit(code)
+
+    def syncCycles(self, code, indent=0):
+        "Cycles spent up to the current instruction (included) are added to the chip before a device is accessed"
+        code.emit("addCycles(cy + " + str(code.cycles) + ")", indent)
+        code.emit("cy = -" + str(code.cycles), indent)
+
+    def leaveOnWatchHit(self, code):
+        "Leave the block after the current instruction if a watchpoint stopping execution has been hit"
+        condition = "memory.watchHit is not None"
+        if condition not in code.exitList:
+            code.exitList.append(condition)
+
+    def setReg(self, code, variable, expression):
+        "Same as Register.set() for A, X or Y: Zero and Negative are updated"
+        code.emit(variable + " = " + expression)
+        code.emit("z = " + variable + " == 0")
+        code.emit("n = " + variable + " < 0")
+        code.writtenSet.add(variable)
+
+    def leave(self, code, condition, target):
+        "Last instruction of a block: branch to target if condition is true (None: always)"
+        code.terminated = True
+        code.emit("count += " + str(code.length))
+        indent = 0
+        if condition:
+            # branch taken: one more cycle, two if target is in another page
+            penalty = 1 + (((code.nextAddress ^ target) & 0xff00) != 0)
+            code.emit("if " + condition + ":")
+            code.emit("cy += " + str(code.cycles + penalty), 1)
+            indent = 1
+        else:
+            code.emit("cy += " + str(code.cycles))
+        if (target == code.start) and (target not in self.board.breakpointSet):
+            # loop on the block as long as budget allows it
+            code.emit("if count + " + str(code.length) + " <= budget:", indent)
+            code.emit("continue", indent + 1)
+        code.emit("pc = " + str(target), indent)
+        if condition:
+            code.emit("else:")
+            code.emit("cy += " + str(code.cycles), 1)
+            code.emit("pc = " + str(code.nextAddress), 1)
+        code.emit("break")
+
+    #
+    # code generators: one per callback of arch_6502.Chip
+    #    return False when the instruction cannot be translated
+    #
+
+    def genLoad(self, code, name, parameterList):
+        value = self.read(code, parameterList[0], True)
+        if value is None:
+            return False
+        self.setReg(code, self.regDict[name], value)
+
+    def genStore(self, code, name, parameterList):
+        if self.address(code, parameterList[0]) is None:
+            return False
+        self.write(code, parameterList[0], self.regDict[name])
+
+    def genAdc(self, code, name, parameterList):
+        value = self.read(code, parameterList[0], True)
+        if value is None:
+            return False
+        code.emit("m = " + value + " & 255")
+        code.emit("t = (a & 255) + m + c")
+        code.emit("c = t > 255")
+        code.emit("v = ((a & 128) == (m & 128)) and ((a & 128) != (t & 128))")
+        self.setReg(code, 'a', self.signed("t"))
+
+    def genSbc(self, code, name, parameterList):
+        value = self.read(code, parameterList[0], True)
+        if value is None:
+            return False
+        code.emit("t = (a & 255) + (~" + value + " & 255) + c")
+        code.emit("c = t > 255")
+        code.emit("v = t > 127 or t < -128")
+        self.setReg(code, 'a', self.signed("t"))
+
+    def genLogical(self, code, name, parameterList):
+        value = self.read(code, parameterList[0], True)
+        if value is None:
+            return False
+        operator = {'and1': " & ", 'ora': " | ", 'eor': " ^ "}[name]
+        self.setReg(code, 'a', self.signed(value + operator + "a"))
+
+    def genAsl(self, code, name, parameterList):
+        value = self.read(code, parameterList[0])
+        if value is None:
+            return False
+        code.emit("w = " + value)
+        code.emit("c = w < 0")
+        code.emit("w = (w << 1) & -2")
+        self.write(code, parameterList[0], "w")
+        code.emit("n = w < 0")
+        code.emit("z = w == 0")
+
+    def genLsr(self, code, name, parameterList):
+        value = self.read(code, parameterList[0])
+        if value is None:
+            return False
+        code.emit("w = " + value)
+        code.emit("b = w & 1")
+        code.emit("w = (w >> 1) & -129")
+        self.write(code, parameterList[0], "w")
+        code.emit("c = b")
+        code.emit("n = 0")
+        code.emit("z = w == 0")
+
+    def genRol(self, code, name, parameterList):
+        value = self.read(code, parameterList[0])
+        if value is None:
+            return False
+        code.emit("w = " + value)
+        code.emit("b = w < 0")
+        code.emit("w = ((w << 1) & -2) | c")
+        self.write(code, parameterList[0], "w")
+        code.emit("c = b")
+        code.emit("n = w < 0")
+        code.emit("z = w == 0")
+
+    def genRor(self, code, name, parameterList):
+        value = self.read(code, parameterList[0])
+        if value is None:
+            return False
+        code.emit("w = " + value)
+        code.emit("b = w & 1")
+        code.emit("w = ((w >> 1) & -129) | (c << 7)")
+        self.write(code, parameterList[0], "w")
+        code.emit("c = b")
+        code.emit("n = w < 0")
+        code.emit("z = w == 0")
+
+    def genBit(self, code, name, parameterList):
+        value = self.read(code, parameterList[0])
+        if value is None:
+            return False
+        code.emit("w = " + value + " & a")
+        code.emit("z = w == 0")
+        code.emit("n = w < 0")
+        code.emit("v = (w & 32) != 0")
+
+    def genIncDec(self, code, name, parameterList):
+        value = self.read(code, parameterList[0])
+        if value is None:
+            return False
+        operator = {'inc': " + 1", 'dec': " - 1"}[name]
+        code.emit("w = " + self.signed(value + operator))
+        self.write(code, parameterList[0], "w")
+        code.emit("z = w == 0")
+        code.emit("n = w < 0")
+
+    def genIncDecReg(self, code, name, parameterList):
+        variable = self.regDict[name]
+        operator = {'i': " + 1", 'd': " - 1"}[name[0]]
+        self.setReg(code, variable, self.signed(variable + operator))
+
+    def genTransfer(self, code, name, parameterList):
+        # t<source><destination>
+        source = self.__regVariable[name[1].upper()]
+        destination = self.__regVariable[name[2].upper()]
+        self.setReg(code, destination, source)
+
+    def genCompare(self, code, name, parameterList):
+        value = self.read(code, parameterList[0], True)
+        if value is None:
+            return False
+        variable = self.regDict[name]
+        code.emit("w = " + value)
+        code.emit("z = " + variable + " == w")
+        code.emit("c = " + variable + " >= w")
+        code.emit("n = " + variable + " - w < 0")
+
+    def genFlag(self, code, name, parameterList):
+        statement = {'clc': "c = 0", 'sec': "c = 1", 'clv': "v = 0"}[name]
+        code.emit(statement)
+
+    def genNop(self, code, name, parameterList):
+        code.emit("pass")
+
+    def genBranch(self, code, name, parameterList):
+        parameter = parameterList[0]
+        offset = libproc.ltoi(parameter.getValue(), parameter.getSize())
+        target = libproc.ltoui(code.nextAddress + offset, self.chip.PC.getSize())
+        self.leave(code, self.conditionDict[name], target)
+
+    def genJump(self, code, name, parameterList):
+        parameter = parameterList[0]
+        resolver = parameter.getResolver()
+        if (not resolver) or (resolver.__name__ != 'addrDirect'):
+            # indirect jump: target is only known at execution
+            return False
+        self.leave(code, None, libproc.ltoui(parameter.getValue(), parameter.getSize()))
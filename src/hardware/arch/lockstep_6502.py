@@ -0,0 +1,661 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# 6502 lockstep engine
+#
+#    runs the program loaded into a board on many machines at once, each one with its own inputs:
+#    registers of all machines are NumPy vectors
+#
+#    memory is split into pages read from the board image, shared by all machines, until a machine writes them:
+#    machines only get their own bytes for written pages (stack, variables...), kept into a pool where
+#    each address of these pages is a row with one byte per machine
+#
+#    the instruction at the lowest program counter of running machines is executed by all machines
+#    having this program counter: masks let machines diverge on branches and converge again later
+#
+#    instructions behave exactly like the callbacks of arch_6502.Chip
+#    instructions are decoded once while no machine has written their bytes (they are the same for all machines)
+#    else they are decoded at each execution: only machines having the same bytes execute the instruction together
+#    devices and watchpoints are not involved
+#
+#    requires NumPy
+#
+
+import numpy as np
+
+import libproc
+from error import Error
+from memory import MemError
+
+
+class LockstepEngine:
+
+    # machine states
+    running     = 0
+    end         = 1
+    limit       = 2
+    error       = 3
+
+    __stateName = {running: "running", end: "end", limit: "limit", error: "error"}
+
+    # memory pages
+    pageShift   = 8
+    pageSize    = 1 << pageShift
+
+    def __init__(self, board, count):
+        """
+        Create count machines in the state of the board (registers and memory)
+
+        @param board: board with a loaded program
+        @param count: number of machines
+        @type  count: integer
+        """
+        chip = board.chip
+        self.chip = chip
+        self.count = count
+        self.size = board.memory.getSize()
+
+        # board image: bytes of pages no machine has written
+        self.image = np.frombuffer(bytes(board.memory.storage), dtype=np.uint8).copy()
+        # written pages: pool row per address (one byte per machine), -1 while its page is shared
+        self.rowMap = np.full(self.size, -1, dtype=np.int32)
+        self.pool = np.empty((0, count), dtype=np.uint8)
+        # rows of the pool in use: next ones are free
+        self.poolCount = 0
+        # registers: A, X, Y are signed like the registers of the chip
+        self.pc = np.full(count, chip.PC.get(), dtype=np.int32)
+        self.sp = np.full(count, chip.SP.get(), dtype=np.int32)
+        self.a = np.full(count, chip.regA.get(), dtype=np.int32)
+        self.x = np.full(count, chip.regX.get(), dtype=np.int32)
+        self.y = np.full(count, chip.regY.get(), dtype=np.int32)
+        self.status = np.full(count, chip.getStatus(), dtype=np.int32)
+        self.cycles = np.full(count, chip.getCycles(), dtype=np.int64)
+        self.instructions = np.zeros(count, dtype=np.int64)
+        self.state = np.full(count, LockstepEngine.running, dtype=np.int8)
+        # error message per machine in error state
+        self.errorDict = {}
+        # set when a machine leaves the running state
+        self.stopped = True
+
+        # register arrays per register of the chip
+        self.registerDict = {chip.PC: self.pc, chip.SP: self.sp, chip.regA: self.a, chip.regX: self.x,
+                             chip.regY: self.y, chip.PSR: self.status}
+
+        self.carry = chip.carry.getMask()
+        self.zero = chip.zero.getMask()
+        self.overflow = chip.overflow.getMask()
+        self.negative = chip.negative.getMask()
+        # Zero and Negative bits per byte value
+        byteList = np.arange(256)
+        self.zeroNegTable = ((byteList == 0) * self.zero | (byteList >= 128) * self.negative).astype(np.int32)
+
+        # decoded instruction per address: (callback name, parameter, next address, cycles)
+        # callback name is None if opcode is invalid: parameter is then the opcode
+        self.decodeCache = {}
+        # size (opcode + operands) of the longest decoded instruction
+        self.maxDecodedSize = 0
+        # bytes of instructions kept into the decode cache
+        self.codeMap = np.zeros(self.size, dtype=bool)
+        # bytes written by a machine or by setMemory(): they may differ between machines
+        self.writtenMap = np.zeros(self.size, dtype=bool)
+
+        # execution per callback of the chip
+        self.executorDict = {
+            'lda': self.exeLoad, 'ldx': self.exeLoad, 'ldy': self.exeLoad,
+            'sta': self.exeStore, 'stx': self.exeStore, 'sty': self.exeStore,
+            'adc': self.exeAdc, 'sbc': self.exeSbc,
+            'and1': self.exeLogical, 'ora': self.exeLogical, 'eor': self.exeLogical,
+            'asl': self.exeShift, 'lsr': self.exeShift, 'rol': self.exeShift, 'ror': self.exeShift,
+            'bit': self.exeBit,
+            'inc': self.exeIncDec, 'dec': self.exeIncDec,
+            'inx': self.exeIncDecReg, 'iny': self.exeIncDecReg, 'dex': self.exeIncDecReg, 'dey': self.exeIncDecReg,
+            'tax': self.exeTransfer, 'txa': self.exeTransfer, 'tay': self.exeTransfer, 'tya': self.exeTransfer,
+            'txs': self.exeTxs, 'tsx': self.exeTransfer,
+            'cmp': self.exeCompare, 'cpx': self.exeCompare, 'cpy': self.exeCompare,
+            'clc': self.exeFlag, 'sec': self.exeFlag, 'cli': self.exeFlag, 'sei': self.exeFlag,
+            'clv': self.exeFlag, 'cld': self.exeFlag, 'sed': self.exeFlag,
+            'nop': self.exeNop, 'brk': self.exeBrk, 'end': self.exeEnd,
+            'bpl': self.exeBranch, 'bmi': self.exeBranch, 'bvc': self.exeBranch, 'bvs': self.exeBranch,
+            'bcc': self.exeBranch, 'bcs': self.exeBranch, 'bne': self.exeBranch, 'beq': self.exeBranch,
+            'jmp': self.exeJump, 'jsr': self.exeJsr, 'rts': self.exeRts, 'rti': self.exeRti,
+            'pha': self.exePush, 'php': self.exePush, 'pla': self.exePull, 'plp': self.exePull,
+        }
+        # register used by each callback
+        self.regDict = {
+            'lda': self.a, 'sta': self.a, 'cmp': self.a,
+            'ldx': self.x, 'stx': self.x, 'cpx': self.x, 'inx': self.x, 'dex': self.x,
+            'ldy': self.y, 'sty': self.y, 'cpy': self.y, 'iny': self.y, 'dey': self.y,
+        }
+        # source and destination registers of transfers
+        self.transferDict = {
+            'tax': (self.a, self.x), 'txa': (self.x, self.a), 'tay': (self.a, self.y), 'tya': (self.y, self.a),
+            'tsx': (self.sp, self.x),
+        }
+        # bit and value set by flag instructions
+        self.flagDict = {
+            'clc': (self.carry, 0), 'sec': (self.carry, 1), 'cli': (chip.interrupt.getMask(), 0),
+            'sei': (chip.interrupt.getMask(), 1), 'clv': (self.overflow, 0), 'cld': (chip.decimal.getMask(), 0),
+            'sed': (chip.decimal.getMask(), 1),
+        }
+        # bit tested by each branch and value taking the branch
+        self.conditionDict = {
+            'bpl': (self.negative, 0), 'bmi': (self.negative, 1), 'bvc': (self.overflow, 0), 'bvs': (self.overflow, 1),
+            'bcc': (self.carry, 0), 'bcs': (self.carry, 1), 'bne': (self.zero, 0), 'beq': (self.zero, 1),
+        }
+        # index register of addressing modes spending one more cycle when indexing crosses a page
+        self.pageCrossingDict = {chip.absoluteX: self.x, chip.absoluteY: self.y, chip.indirectY: self.y}
+
+    #
+    # INPUTS and RESULTS
+    #
+
+    def getRegister(self, name):
+        "Values of a register for all machines"
+        return self.registerDict[self.findRegister(name)].copy()
+
+    def setRegister(self, name, values):
+        "Same as Register.set() on all machines: values is a scalar or one value per machine"
+        reg = self.findRegister(name)
+        values = np.resize(np.asarray(values, dtype=np.int32), self.count)
+        if reg in (self.chip.regA, self.chip.regX, self.chip.regY):
+            self.setReg(self.registerDict[reg], np.arange(self.count), values)
+        elif reg is self.chip.PSR:
+            self.status[:] = values & 0xff
+        else:
+            self.registerDict[reg][:] = values & 0xffff
+
+    def findRegister(self, name):
+        for reg in self.registerDict:
+            if reg.getName() == name:
+                return reg
+        raise Error(Error.error, "register " + name + " doesn't exist")
+
+    def getIndicator(self, name):
+        for indicator in self.chip.getIndicatorList():
+            if indicator.getName() == name:
+                return ((self.status & indicator.getMask()) != 0).astype(np.int8)
+        raise Error(Error.error, "indicator " + name + " doesn't exist")
+
+    def getMemory(self, address, length):
+        "Bytes of all machines: one row per machine"
+        addressList = np.arange(max(0, address), min(address + length, self.size))
+        values = np.tile(self.image[addressList], (self.count, 1))
+        rows = self.rowMap[addressList]
+        written = rows >= 0
+        values[:, written] = self.pool[rows[written]].T
+        return values
+
+    def setMemory(self, address, values):
+        """
+        Write bytes into memory of all machines
+        values: one byte, one byte per machine or one row of bytes per machine
+        """
+        values = np.asarray(values)
+        if values.ndim < 2:
+            values = np.resize(values, (self.count, 1))
+        length = values.shape[1]
+        if (address < 0) or (address + length > self.size):
+            raise MemError(Error.error, "Out of memory", address, length)
+        addressList = np.arange(address, address + length)
+        self.ownPages(addressList)
+        self.pool[self.rowMap[addressList]] = (values & 0xff).T
+        self.markWritten(addressList)
+
+    def getReport(self, machine):
+        "Final state of a machine as a dictionary"
+        report = {
+            "status": LockstepEngine.__stateName[self.state[machine]],
+            "registers": dict([(reg.getName(), int(values[machine])) for reg, values in self.registerDict.items()]),
+            "indicators": dict([(indicator.getName(), int((self.status[machine] & indicator.getMask()) != 0))
+                                for indicator in self.chip.getIndicatorList()]),
+            "instructions": int(self.instructions[machine]),
+            "cycles": int(self.cycles[machine]),
+        }
+        if machine in self.errorDict:
+            report["message"] = self.errorDict[machine]
+        return report
+
+    #
+    # EXECUTION
+    #
+
+    def run(self, maxInstructions):
+        """
+        Execute until all machines reach the end of the program, an error or maxInstructions instructions
+        Return the number of lockstep steps (instructions executed by a group of machines)
+        """
+        steps = 0
+        state = self.state
+        pc = self.pc
+        # running machines are searched again only once a machine stopped
+        self.stopped = True
+        # bound of the instruction count of machines: the limit is not checked while it can't be reached
+        mostInstructions = int(self.instructions.max())
+        while True:
+            if self.stopped:
+                active = np.flatnonzero(state == LockstepEngine.running)
+                everyMachine = (len(active) == self.count)
+                self.stopped = False
+            if len(active) == 0:
+                break
+            pcList = pc if everyMachine else pc[active]
+            address = int(pcList.min())
+            selected = (pcList == address)
+            if selected.all():
+                idx = active
+                # counters of the whole group are updated through a slice, faster than indexing
+                group = slice(None) if everyMachine else idx
+            else:
+                idx = active[selected]
+                group = idx
+            decoded = self.decodeCache.get(address)
+            if decoded is None:
+                try:
+                    decoded = self.decode(idx[0], address)
+                except MemError as e:
+                    self.instructions[idx] += 1
+                    self.fail(idx, str(e))
+                    continue
+                if address not in self.decodeCache:
+                    # machines with other bytes at this address execute it later
+                    same = np.ones(len(idx), dtype=bool)
+                    for byte in range(address, decoded[2]):
+                        values = self.load(idx, byte)
+                        same &= (values == values[0])
+                    idx = idx[same]
+                    group = idx
+            name, parameter, nextAddress, cycles = decoded
+            pc[group] = nextAddress & 0xffff
+            self.cycles[group] += cycles
+            self.instructions[group] += 1
+            if name is None:
+                self.fail(idx, "Address: " + str(hex(address)) + ": invalid opcode " + str(hex(parameter)))
+            else:
+                self.executorDict[name](name, idx, parameter)
+            mostInstructions += 1
+            if mostInstructions >= maxInstructions:
+                over = idx[self.instructions[idx] >= maxInstructions]
+                if len(over):
+                    over = over[state[over] == LockstepEngine.running]
+                    state[over] = LockstepEngine.limit
+                    self.stopped = True
+            steps += 1
+        return steps
+
+    def decode(self, machine, address):
+        """
+        Decode the instruction at address from the memory of a machine
+        It is kept into the decode cache if no machine has written its bytes
+        """
+        chip = self.chip
+        memory = MachineMemory(self, machine)
+        inst, parameterList, nextAddress = chip.decodeInstruction(memory, address)
+        if not inst:
+            size = chip.getInstructionSize()
+            opcode = libproc.ltoui(memory.peek(address, size), size)
+            decoded = (None, opcode, nextAddress, 0)
+        else:
+            parameter = None
+            if parameterList:
+                parameter = parameterList[0]
+            decoded = (inst.getCallback().__name__, parameter, nextAddress, inst.getCycles())
+        if not self.writtenMap[address:nextAddress].any():
+            self.decodeCache[address] = decoded
+            self.codeMap[address:nextAddress] = True
+            self.maxDecodedSize = max(self.maxDecodedSize, nextAddress - address)
+        return decoded
+
+    def markWritten(self, address):
+        "Bytes written by machines: decoded instructions overlapping them are removed from the cache"
+        self.writtenMap[address] = True
+        overwritten = self.codeMap[address]
+        if overwritten.any():
+            for byte in np.unique(address[overwritten]):
+                for start in range(byte - self.maxDecodedSize + 1, byte + 1):
+                    self.decodeCache.pop(start, None)
+                self.codeMap[byte] = False
+
+    #
+    # MEMORY PAGES
+    #
+
+    def load(self, idx, address):
+        "Unsigned bytes of machines idx: address is the same for all machines or one address per machine"
+        if np.ndim(address) == 0:
+            row = self.rowMap[address]
+            if row < 0:
+                return np.full(np.shape(idx), self.image[address], dtype=np.uint8)
+            return self.pool[row, idx]
+        values = self.image[address]
+        rows = self.rowMap[address]
+        written = rows >= 0
+        if written.any():
+            values[written] = self.pool[rows[written], idx[written]]
+        return values
+
+    def store(self, idx, address, values):
+        "Write one byte per machine at one address per machine"
+        rows = self.rowMap[address]
+        shared = rows < 0
+        if shared.any():
+            self.ownPages(address[shared])
+            rows = self.rowMap[address]
+        self.pool[rows, idx] = values & 0xff
+        self.markWritten(address)
+
+    def ownPages(self, address):
+        "Give their own bytes to all machines for the pages of these addresses: copies of the board image"
+        for page in np.unique(address >> LockstepEngine.pageShift):
+            start = page << LockstepEngine.pageShift
+            if self.rowMap[start] >= 0:
+                continue
+            end = min(start + LockstepEngine.pageSize, self.size)
+            first = self.poolCount
+            last = first + end - start
+            if last > len(self.pool):
+                # the pool doubles when it is full
+                pool = np.empty((max(last, 2 * len(self.pool)), self.count), dtype=np.uint8)
+                pool[:first] = self.pool[:first]
+                self.pool = pool
+            self.pool[first:last] = self.image[start:end, np.newaxis]
+            self.rowMap[start:end] = np.arange(first, last, dtype=np.int32)
+            self.poolCount = last
+
+    def fail(self, idx, msg):
+        "Machines stop on an error: like the interpreter, the failing instruction is not counted"
+        self.state[idx] = LockstepEngine.error
+        self.stopped = True
+        self.instructions[idx] -= 1
+        for machine in idx:
+            self.errorDict[int(machine)] = msg
+
+    #
+    # OPERANDS
+    #
+
+    def address(self, idx, parameter):
+        """
+        Effective address of the parameter for machines idx
+        Return machines without error and their address
+        """
+        value = libproc.ltoui(parameter.getValue(), parameter.getSize())
+        resolver = parameter.getResolver().__name__
+        if resolver == 'addrDirect':
+            return idx, np.full(len(idx), value, dtype=np.int32)
+        if resolver == 'addrIndexedX':
+            return idx, (value + self.x[idx]) & 0xffff
+        if resolver == 'addrIndexedY':
+            return idx, (value + self.y[idx]) & 0xffff
+        if resolver == 'addrIndirect':
+            return self.read16(idx, np.full(len(idx), value, dtype=np.int32))
+        if resolver == 'addrIndirectX':
+            return self.read16(idx, value + self.x[idx])
+        idx, address = self.read16(idx, np.full(len(idx), value, dtype=np.int32))
+        return idx, (address + self.y[idx]) & 0xffff
+
+    def inMemory(self, idx, address, length):
+        """
+        Machines accessing length bytes at address outside memory fail with the error of the Memory class
+        Return the other machines and their address
+        """
+        bad = (address < 0) | (address + length > self.size)
+        if bad.any():
+            for machine, value in zip(idx[bad], address[bad]):
+                msg = "Negative value" if value < 0 else "Out of memory"
+                self.fail(np.array([machine]), str(MemError(Error.error, msg, int(value), length)))
+            idx = idx[~bad]
+            address = address[~bad]
+        return idx, address
+
+    def read16(self, idx, pointer):
+        "Same as Memory.read16(): low byte first, machines reading outside memory fail"
+        idx, pointer = self.inMemory(idx, pointer, 2)
+        return idx, self.load(idx, pointer).astype(np.int32) | (self.load(idx, pointer + 1).astype(np.int32) << 8)
+
+    def read(self, idx, parameter, readOnly=False):
+        """
+        Operand value (signed) for machines idx
+        Return machines without error, their value and the address of the operand (None for the accumulator or an immediate value)
+        """
+        chip = self.chip
+        addressing = parameter.getAddressing()
+        if addressing == chip.accumulator:
+            return idx, self.a[idx], None
+        if addressing == chip.immediate:
+            return idx, np.full(len(idx), libproc.ltoi(parameter.getValue(), parameter.getSize()), dtype=np.int32), None
+        idx, address = self.address(idx, parameter)
+        index = self.pageCrossingDict.get(addressing)
+        if readOnly and (index is not None):
+            self.cycles[idx] += ((address ^ (address - index[idx])) & 0xff00) != 0
+        return idx, self.load(idx, address).view(np.int8).astype(np.int32), address
+
+    def write(self, idx, address, values):
+        "Store into the accumulator (address is None) or into memory"
+        if address is None:
+            self.setReg(self.a, idx, values)
+            return
+        self.store(idx, address, values)
+
+    #
+    # REGISTERS and INDICATORS
+    #
+
+    def setReg(self, reg, idx, values):
+        "Same as Register.set() of A, X or Y: convert into a signed byte, update Zero and Negative"
+        values = ((values + 128) & 0xff) - 128
+        reg[idx] = values
+        self.setZeroNeg(idx, values)
+
+    def setZeroNeg(self, idx, values):
+        self.status[idx] = (self.status[idx] & ~(self.zero | self.negative)) | self.zeroNegTable[values & 0xff]
+
+    def setFlag(self, idx, mask, condition):
+        self.status[idx] = (self.status[idx] & ~mask) | (condition * mask)
+
+    def getCarry(self, idx):
+        return (self.status[idx] & self.carry) != 0
+
+    #
+    # INSTRUCTIONS
+    #
+
+    def exeLoad(self, name, idx, parameter):
+        idx, values, address = self.read(idx, parameter, True)
+        self.setReg(self.regDict[name], idx, values)
+
+    def exeStore(self, name, idx, parameter):
+        idx, address = self.address(idx, parameter)
+        self.write(idx, address, self.regDict[name][idx])
+
+    def exeAdc(self, name, idx, parameter):
+        idx, values, address = self.read(idx, parameter, True)
+        values = values & 0xff
+        a = self.a[idx] & 0xff
+        result = a + values + self.getCarry(idx)
+        self.setFlag(idx, self.carry, result > 255)
+        b1 = a & 0x80
+        self.setFlag(idx, self.overflow, (b1 == (values & 0x80)) & (b1 != (result & 0x80)))
+        self.setReg(self.a, idx, result)
+
+    def exeSbc(self, name, idx, parameter):
+        idx, values, address = self.read(idx, parameter, True)
+        result = (self.a[idx] & 0xff) + (~values & 0xff) + self.getCarry(idx)
+        self.setFlag(idx, self.carry, result > 255)
+        self.setFlag(idx, self.overflow, result > 127)
+        self.setReg(self.a, idx, result)
+
+    def exeLogical(self, name, idx, parameter):
+        idx, values, address = self.read(idx, parameter, True)
+        a = self.a[idx]
+        if name == 'and1':
+            result = values & a
+        elif name == 'ora':
+            result = values | a
+        else:
+            result = values ^ a
+        self.setReg(self.a, idx, result)
+
+    def exeShift(self, name, idx, parameter):
+        # flags are computed on the shifted value before it is converted into a byte
+        idx, values, address = self.read(idx, parameter)
+        if name in ('asl', 'rol'):
+            carry = values < 0
+            result = (values << 1) & -2
+            if name == 'rol':
+                result |= self.getCarry(idx)
+        else:
+            carry = (values & 1) != 0
+            result = (values >> 1) & ~0x80
+            if name == 'ror':
+                result |= self.getCarry(idx).astype(np.int32) << 7
+        self.write(idx, address, result)
+        self.setFlag(idx, self.carry, carry)
+        # lsr: sign bit is cleared, result can't be negative
+        self.setFlag(idx, self.negative, (result < 0) & (name != 'lsr'))
+        self.setFlag(idx, self.zero, result == 0)
+
+    def exeBit(self, name, idx, parameter):
+        idx, values, address = self.read(idx, parameter)
+        values = values & self.a[idx]
+        self.setFlag(idx, self.zero, values == 0)
+        self.setFlag(idx, self.negative, values < 0)
+        self.setFlag(idx, self.overflow, (values & (1 << 5)) != 0)
+
+    def exeIncDec(self, name, idx, parameter):
+        idx, values, address = self.read(idx, parameter)
+        if name == 'inc':
+            values = values + 1
+        else:
+            values = values - 1
+        values = ((values + 128) & 0xff) - 128
+        self.write(idx, address, values)
+        self.setZeroNeg(idx, values)
+
+    def exeIncDecReg(self, name, idx, parameter):
+        reg = self.regDict[name]
+        if name in ('inx', 'iny'):
+            self.setReg(reg, idx, reg[idx] + 1)
+        else:
+            self.setReg(reg, idx, reg[idx] - 1)
+
+    def exeTransfer(self, name, idx, parameter):
+        source, destination = self.transferDict[name]
+        self.setReg(destination, idx, source[idx])
+
+    def exeTxs(self, name, idx, parameter):
+        self.sp[idx] = self.x[idx] & 0xffff
+
+    def exeCompare(self, name, idx, parameter):
+        idx, values, address = self.read(idx, parameter, True)
+        reg = self.regDict[name][idx]
+        self.setFlag(idx, self.zero, reg == values)
+        self.setFlag(idx, self.carry, reg >= values)
+        self.setFlag(idx, self.negative, (reg - values) < 0)
+
+    def exeFlag(self, name, idx, parameter):
+        mask, value = self.flagDict[name]
+        if value:
+            self.status[idx] |= mask
+        else:
+            self.status[idx] &= ~mask
+        if name == 'sed':
+            self.fail(idx, "Decimal mode not implemented")
+
+    def exeNop(self, name, idx, parameter):
+        return
+
+    def exeBrk(self, name, idx, parameter):
+        self.fail(idx, "BRK called")
+
+    def exeEnd(self, name, idx, parameter):
+        self.state[idx] = LockstepEngine.end
+        self.stopped = True
+
+    def exeBranch(self, name, idx, parameter):
+        mask, value = self.conditionDict[name]
+        taken = ((self.status[idx] & mask) != 0) == value
+        idx = idx[taken]
+        address = self.pc[idx]
+        target = (address + libproc.ltoi(parameter.getValue(), parameter.getSize())) & 0xffff
+        self.pc[idx] = target
+        # branch taken: one more cycle, two if target is in another page
+        self.cycles[idx] += 1 + (((address ^ target) & 0xff00) != 0)
+
+    def exeJump(self, name, idx, parameter):
+        idx, address = self.address(idx, parameter)
+        self.pc[idx] = address
+
+    #
+    # STACK: same byte order and return address computation as the callbacks of the chip
+    #
+
+    def push(self, idx, values):
+        sp = self.sp[idx]
+        self.store(idx, sp, values)
+        self.sp[idx] = (sp - 1) & 0xffff
+
+    def pull(self, idx):
+        "Signed byte at the stack pointer once incremented"
+        sp = (self.sp[idx] + 1) & 0xffff
+        self.sp[idx] = sp
+        return self.load(idx, sp).view(np.int8).astype(np.int32)
+
+    def exePush(self, name, idx, parameter):
+        if name == 'pha':
+            self.push(idx, self.a[idx])
+        else:
+            self.push(idx, self.status[idx])
+
+    def exePull(self, name, idx, parameter):
+        values = self.pull(idx)
+        if name == 'pla':
+            self.setReg(self.a, idx, values)
+        else:
+            self.status[idx] = values & 0xff
+
+    # return addresses are written and read like Memory.write16() and Memory.read16(): they don't wrap around
+    # the end of memory, machines accessing them outside memory fail
+
+    def exeJsr(self, name, idx, parameter):
+        # high byte pushed first: low byte at the lowest address
+        idx, low = self.inMemory(idx, self.sp[idx] - 1, 2)
+        idx, address = self.address(idx, parameter)
+        pc = self.pc[idx] - 1
+        self.store(idx, low + 1, pc >> 8)
+        self.store(idx, low, pc)
+        self.sp[idx] = (low - 1) & 0xffff
+        self.pc[idx] = address
+
+    def exeRts(self, name, idx, parameter):
+        idx, address = self.read16(idx, self.sp[idx] + 1)
+        self.sp[idx] = (self.sp[idx] + 2) & 0xffff
+        self.pc[idx] = (address + 1) & 0xffff
+
+    def exeRti(self, name, idx, parameter):
+        # status then return address, as pushed when an interrupt is accepted
+        idx, status = self.inMemory(idx, self.sp[idx] + 1, 1)
+        self.status[idx] = self.load(idx, status)
+        idx, address = self.read16(idx, status + 1)
+        self.sp[idx] = (self.sp[idx] + 3) & 0xffff
+        self.pc[idx] = address
+
+
+class MachineMemory:
+    "Memory of one machine seen by Processor.decodeInstruction(): same as Memory.peek()"
+
+    def __init__(self, engine, machine):
+        self.engine = engine
+        self.machine = machine
+
+    def peek(self, address, length):
+        if address < 0:
+            raise MemError(Error.error, "Negative value", address, length)
+        if address + length > self.engine.size:
+            raise MemError(Error.error, "Out of memory", address, length)
+        # low byte first, as on the 6502
+        value = 0
+        for i in range(length - 1, -1, -1):
+            value = (value * 256) + int(self.engine.load(self.machine, address + i))
+        return libproc.ltoi(value, length)
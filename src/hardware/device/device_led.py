@@ -10,12 +10,11 @@
 #        - number of leds: can be greater than word size (ex: 16 leds on 8-bit architecture)
 #        - input address: address to be used for setting led value
 #
-
-import os
-from PyQt4 import QtGui
+#    when the board is not displayed (headless run), values written to the leds
+#    are recorded instead: Qt is not required in that case
+#
 
 import libproc
-from ledUI import Ui_ledWidget
 from controller import *
 
 
@@ -23,82 +22,54 @@ def getDeviceName():
     return "Led display"
 
 def createDevice(controller, rank, paramList, parent):
+    if parent is None:
+        return LedRecorder(controller, rank, paramList)
+    # import Qt window only when leds are really displayed
+    from ledWindow import Led
     return Led(controller, rank, paramList, parent)
 
-class Led(QtGui.QMainWindow, Ui_ledWidget):
-    
-    def __init__(self, controller, rank, paramList, parent):
-        super(Led, self).__init__(parent)
-        self.setupUi(self)
+class LedRecorder:
+    "Headless backend: keep track of each value displayed by the leds"
+
+    def __init__(self, controller, rank, paramList):
         self.controller = controller
-        self.rank   = rank
+        self.rank = rank
         self.paramList = paramList
         self.nbLeds = int(paramList[1])
         self.inputAddr = int(paramList[2])
-        self.parent = parent
-        
-        self.setupUi(self)
-        
-        devicePath = os.path.dirname(os.path.abspath(__file__))
-        self.onFile = os.path.join(devicePath, "yellow-on-32.png")
-        self.offFile = os.path.join(devicePath, "yellow-off-32.png")
+        # successive values written to the leds
+        self.valueList = []
 
-        # declare itself to Board controller
+        # declare itself to Board controller
         self.controller.declareInput("LED", self.inputAddr, self.nbLeds / 8, self.changeInput)
-        
-        self.decAddr.setText(str(self.inputAddr))
-        self.hexaAddr.setText("x" + libproc.ltoh(self.inputAddr, 2))
-        self.decValue.setText("")
-        self.hexaValue.setText("")
- 
-        self.led = []
-        startX = 40
-        sizeLed = 32
-        filler = 10
-        for i in range(self.nbLeds):
-            led = QtGui.QLabel(self)
-            led.setGeometry(startX + ((self.nbLeds - 1 - i) * (sizeLed + filler)), 10, 400, 100)
-            # use full ABSOLUTE path to the image, not relative
-            led.setPixmap(QtGui.QPixmap(self.offFile))
-            led.show()
-            self.led.append(led)
-        self.resize((sizeLed + filler) * self.nbLeds + 80 ,120)
-        
-        screen = QtGui.QDesktopWidget().screenGeometry()
-        window = self.geometry()
-        # move window based on its rank to get it visible if other devices have been displayed
-        self.move((screen.width() - window.width())/2 + (self.rank * 40), 
-                  (screen.height() - window.height())/2 + self.rank * 40)
-        
-        self.show()
-        
-    def closeEvent(self, event):
-        self.parent.quit()
-    
+
     def deleteDevice(self):
-        self.deleteLater()
-        
+        return
+
+    def resetDevice(self):
+        "Board cleared: nothing to restart"
+        return
+
+    def saveState(self):
+        "Number of recorded values: values recorded since are dropped by restoreState()"
+        return len(self.valueList)
+
+    def restoreState(self, state):
+        del self.valueList[state:]
+
     def changeInput(self, address, size, data):
-        "Set on or off leds depending on value of corresponding bit"
+        "Record the value written to the leds"
         value = 0
         for i in range(size):
             value = value * 256 + data[i]
-        self.decValue.setText(libproc.ltoa(value, size))
-        self.hexaValue.setText("x" + libproc.ltoh(value, size))
-        
-        for bit in range(size * 8):
-            # process per byte
-            # remember: max..0 so 
-            # . byte 0: max ..
-            # . byte n: ..0 
-            noByte = size - (bit // 8) - 1
-            value = data[noByte]
-            mask = 1 << (bit % 8)
-            # leds are numbered right to left: max ..0
-            # so byte 0 is max.. and byte n is ..0
-            noLed = bit
-            if (value & mask):
-                self.led[noLed].setPixmap(QtGui.QPixmap(self.onFile))
-            else:
-                self.led[noLed].setPixmap(QtGui.QPixmap(self.offFile))
-        self.show()
\ No newline at end of file
+        self.valueList.append(value)
+
+    def report(self):
+        "Text summary displayed at the end of a headless run"
+        text = getDeviceName() + " at x" + libproc.ltoh(self.inputAddr, 2) + ": "
+        text += str(len(self.valueList)) + " update(s)"
+        if self.valueList:
+            size = self.nbLeds / 8
+            text += ", last value x" + libproc.ltoh(self.valueList[-1], size)
+            text += " (" + libproc.ltoa(self.valueList[-1], size) + ")"
+        return text
@@ -0,0 +1,176 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# Programmable interval timer
+#
+#    parameter in board description file
+#        - device name: "Timer"
+#        - address of its registers
+#        - clock cycles per count: optional, 1 by default
+#        - interrupt line raised when count reaches zero: IRQ or NMI, optional, IRQ by default
+#
+#    registers (2-byte values in the byte order of the processor)
+#        address + 0: count (2 bytes): reload value when written, current count when read
+#        address + 2: control: bit 0 run (the count starts from the reload value when it is set),
+#                     bit 1 interrupt when count reaches zero, bit 2 reload when count reaches zero (periodic)
+#                     bit 0 is cleared when count reaches zero without reload
+#        address + 3: status: bit 0 set when count reached zero, cleared by any write (interrupt is released)
+#
+#    count is driven by the clock cycles spent by the processor: zero is an event of the board scheduler
+#    a reload value of 0 counts 65536
+#
+
+import libproc
+from controller import *
+from processor import Processor
+
+
+def getDeviceName():
+    return "Timer"
+
+def createDevice(controller, rank, paramList, parent):
+    # no window: same device when the board is displayed or not
+    return Timer(controller, rank, paramList)
+
+class Timer:
+
+    # control bits
+    run         = 1
+    interrupt   = 2
+    periodic    = 4
+    # status bits
+    zero        = 1
+
+    def __init__(self, controller, rank, paramList):
+        self.controller = controller
+        self.rank = rank
+        self.paramList = paramList
+        self.address = int(paramList[1])
+        self.cyclesPerCount = 1
+        if len(paramList) > 2:
+            self.cyclesPerCount = max(1, int(paramList[2]))
+        self.line = Processor.irq
+        if (len(paramList) > 3) and (paramList[3].upper() == "NMI"):
+            self.line = Processor.nmi
+        self.resetDevice()
+
+        # declare itself to Board controller
+        self.controller.declareInput("TIMER_COUNT", self.address, 2, self.changeReload)
+        self.controller.declareInput("TIMER_CONTROL", self.address + 2, 1, self.changeControl)
+        self.controller.declareInput("TIMER_STATUS", self.address + 3, 1, self.changeStatus)
+        self.controller.declareOutput("TIMER_COUNT", self.address, 2, self.readCount)
+        self.controller.declareOutput("TIMER_STATUS", self.address + 3, 1, self.readStatus)
+
+    def deleteDevice(self):
+        return
+
+    def resetDevice(self):
+        "Board cleared: timer stopped (its event has been cancelled with the others)"
+        self.reload = 0
+        self.control = 0
+        self.status = 0
+        # count when stopped, zero event when running
+        self.count = 0
+        self.event = None
+        # number of times count reached zero
+        self.zeroCount = 0
+
+    #
+    # STATE saved by the undo journal (the zero event is restored by the scheduler)
+    #
+    def saveState(self):
+        return (self.reload, self.control, self.status, self.count, self.event, self.zeroCount)
+
+    def restoreState(self, state):
+        self.reload, self.control, self.status, self.count, self.event, self.zeroCount = state
+        # control register cleared by reachZero() if it has been undone
+        self.controller.memory.updateBytes(self.address + 2, bytearray([self.control]))
+
+    #
+    # REGISTERS written by the program
+    #
+    def changeReload(self, address, size, data):
+        self.reload = self.toValue(data)
+
+    def changeControl(self, address, size, data):
+        control = data[0]
+        if (control & Timer.run) and (not self.control & Timer.run):
+            self.control = control
+            self.start(self.controller.getCycles())
+        elif (self.control & Timer.run) and (not control & Timer.run):
+            self.control = control
+            self.stop()
+        else:
+            self.control = control
+
+    def changeStatus(self, address, size, data):
+        self.status = 0
+        self.controller.clearInterrupt(self.line)
+
+    #
+    # REGISTERS read by the program
+    #
+    def readCount(self, address, size):
+        return self.toBytes(self.getCount())
+
+    def readStatus(self, address, size):
+        return [self.status]
+
+    #
+    # COUNT management
+    #
+    def getPeriod(self):
+        "Clock cycles from reload value to zero"
+        return (self.reload or 0x10000) * self.cyclesPerCount
+
+    def getCount(self):
+        if (self.event is None):
+            return self.count
+        left = self.event.getCycle() - self.controller.getCycles()
+        return min(0xffff, max(0, (left + self.cyclesPerCount - 1) // self.cyclesPerCount))
+
+    def start(self, cycle):
+        self.event = self.controller.scheduleEventAt(cycle + self.getPeriod(), self.reachZero)
+
+    def stop(self):
+        self.count = self.getCount()
+        if (self.event is not None):
+            self.controller.cancelEvent(self.event)
+            self.event = None
+
+    def reachZero(self, cycle):
+        "Event of the scheduler: count reached zero at cycle"
+        self.zeroCount += 1
+        self.status |= Timer.zero
+        self.event = None
+        if (self.control & Timer.periodic):
+            self.start(cycle)
+        else:
+            self.count = 0
+            self.control &= ~Timer.run
+            self.controller.memory.updateBytes(self.address + 2, bytearray([self.control]))
+        if (self.control & Timer.interrupt):
+            self.controller.raiseInterrupt(self.line)
+
+    #
+    # 2-byte values
+    #
+    def toValue(self, data):
+        if self.controller.memory.littleEndian:
+            return data[0] + (data[1] << 8)
+        return (data[0] << 8) + data[1]
+
+    def toBytes(self, value):
+        if self.controller.memory.littleEndian:
+            return [value & 0xff, value >> 8]
+        return [value >> 8, value & 0xff]
+
+    def report(self):
+        "Text summary displayed at the end of a headless run"
+        text = getDeviceName() + " at x" + libproc.ltoh(self.address, 2) + ": "
+        text += str(self.zeroCount) + " time(s) zero"
+        if (self.event is not None):
+            text += ", running (count " + str(self.getCount()) + ")"
+        return text
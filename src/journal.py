@@ -0,0 +1,156 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+
+from array import array
+from collections import deque
+
+class Journal:
+    """
+    Undo journal: for each executed instruction, values it changed as they were before its execution
+    . one instruction record: register values, status, cycles, end of program flag and index of its first byte record
+    . one byte record per memory byte written by the instruction: address and previous value
+    . device state (devices, scheduled events, interrupt lines) before the instruction, only for instructions which
+      may change it: saved by saveDevices() before device inputs are written, events are run or interrupt lines change
+    Records are kept into ring buffers backed by arrays: when the size limit is reached, oldest instructions are forgotten
+    """
+
+    # default memory used by a journal (bytes)
+    defaultSize = 4 * 1024 * 1024
+
+    def __init__(self, registerCount, size=defaultSize):
+        """
+        @param registerCount: number of registers of the chip
+        @type  registerCount: integer
+        @param size: maximum memory used by the journal in bytes, shared by instruction and byte records
+        @type  size: integer
+        """
+        self.__registerCount = registerCount
+        # registers, status, end of program flag
+        self.__recordSize = registerCount + 2
+        # cycles and first byte record: counters which overflow a C long (32 bits on Windows) are kept
+        # into doubles, exact up to 2**53
+        itemSize = array('l').itemsize
+        counterSize = array('d').itemsize
+        self.__recordCapacity = max(1, (size / 2) / (self.__recordSize * itemSize + 2 * counterSize))
+        self.__byteCapacity = max(1, (size / 2) / (itemSize + 1))
+        self.__recordList = array('l', [0]) * (self.__recordCapacity * self.__recordSize)
+        self.__counterList = array('d', [0]) * (self.__recordCapacity * 2)
+        self.__addressList = array('l', [0]) * self.__byteCapacity
+        self.__valueList = array('B', [0]) * self.__byteCapacity
+        # function returning the device state: see attachDevices()
+        self.__deviceFct = None
+        self.clear()
+
+    def clear(self):
+        # records are numbered since the creation of the journal: ring index is number % capacity
+        # oldest kept instruction and next one
+        self.__first = 0
+        self.__next = 0
+        # oldest kept byte and next one
+        self.__firstByte = 0
+        self.__nextByte = 0
+        # (instruction number, device state) for instructions which saved it, oldest first
+        self.__deviceList = deque()
+        # device state of the instruction being executed already saved (or no instruction being executed)
+        self.__devicesSaved = True
+
+    def attachDevices(self, fct):
+        "fct() returns the device state, given back by undo() (see Controller.saveState)"
+        self.__deviceFct = fct
+
+    def getLength(self):
+        "Number of instructions which can be undone"
+        return self.__next - self.__first
+
+    def getCapacity(self):
+        "Maximum number of instructions kept (if they write no memory)"
+        return self.__recordCapacity
+
+    def record(self, state):
+        """
+        Called before executing an instruction
+
+        @param state: chip state returned by Processor.saveState()
+        """
+        if (self.__next - self.__first == self.__recordCapacity):
+            self.__forget()
+        valueList, status, cycles, end = state
+        recordList = self.__recordList
+        index = self.__next % self.__recordCapacity
+        base = index * self.__recordSize
+        for value in valueList:
+            recordList[base] = value
+            base += 1
+        recordList[base] = status
+        recordList[base + 1] = int(end)
+        counterList = self.__counterList
+        counterList[2 * index] = cycles
+        counterList[2 * index + 1] = self.__nextByte
+        self.__next += 1
+        self.__devicesSaved = False
+
+    def saveDevices(self):
+        "Called before the instruction being executed changes the device state: only the first call saves it"
+        if self.__devicesSaved or (self.__deviceFct is None):
+            return
+        self.__devicesSaved = True
+        self.__deviceList.append((self.__next - 1, self.__deviceFct()))
+
+    def saveByte(self, address, value):
+        "Called before a memory byte is written by the instruction being executed"
+        # instructions which wrote nothing free no byte record
+        while (self.__nextByte - self.__firstByte == self.__byteCapacity):
+            self.__forget()
+        index = self.__nextByte % self.__byteCapacity
+        self.__addressList[index] = address
+        self.__valueList[index] = value
+        self.__nextByte += 1
+
+    def saveBytes(self, address, data):
+        for value in data:
+            self.saveByte(address, value)
+            address += 1
+
+    def __forget(self):
+        "Forget the oldest instruction (all instructions if a single one fills the byte ring)"
+        self.__first += 1
+        if (self.__first < self.__next):
+            index = self.__first % self.__recordCapacity
+            self.__firstByte = int(self.__counterList[2 * index + 1])
+        else:
+            self.__first = self.__next
+            self.__firstByte = self.__nextByte
+        deviceList = self.__deviceList
+        while deviceList and (deviceList[0][0] < self.__first):
+            deviceList.popleft()
+
+    def undo(self):
+        """
+        Remove the last executed instruction from the journal
+        Return None if there is none, else its state (see Processor.saveState), its byte records,
+        last written first: list of (address, previous value), and the device state before it (None if unchanged)
+        """
+        # device inputs written while undoing are not recorded
+        self.__devicesSaved = True
+        if (self.__next == self.__first):
+            return None
+        self.__next -= 1
+        deviceState = None
+        if self.__deviceList and (self.__deviceList[-1][0] == self.__next):
+            deviceState = self.__deviceList.pop()[1]
+        index = self.__next % self.__recordCapacity
+        base = index * self.__recordSize
+        recordList = self.__recordList
+        counterList = self.__counterList
+        count = self.__registerCount
+        state = (tuple(recordList[base:base + count]), recordList[base + count], int(counterList[2 * index]),
+                 bool(recordList[base + count + 1]))
+        firstByte = int(counterList[2 * index + 1])
+        byteList = []
+        for number in range(self.__nextByte - 1, firstByte - 1, -1):
+            index = number % self.__byteCapacity
+            byteList.append((self.__addressList[index], self.__valueList[index]))
+        self.__nextByte = firstByte
+        return state, byteList, deviceState
@@ -3,8 +3,11 @@
 # Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
 #
 
+import struct
+
 from error import Error
 from controller import *
+from processor import Processor
 import libproc
 
 class MemError(Error):
@@ -18,22 +21,291 @@ class MemError(Error):
     def __str__(self):
         return "EXCEPTION: " + self.msg + ". Address: " + str(self.address) + ", length: " + str(self.length)
         
+class Watchpoint:
+    "Memory range whose accesses stop the execution or are logged"
+    
+    # accesses
+    read    = 1
+    write   = 2
+    # actions
+    stop    = 0
+    log     = 1
+    
+    def __init__(self, address, length, access, action):
+        self.__address = address
+        self.__length = length
+        self.__access = access
+        self.__action = action
+        
+    def getAddress(self):
+        return self.__address
+    
+    def getLength(self):
+        return self.__length
+    
+    def getAccess(self):
+        return self.__access
+    
+    def getAction(self):
+        return self.__action
+    
+    def matches(self, address, length, access):
+        return (self.__access & access) and (address < self.__address + self.__length) and (self.__address < address + length)
+        
+class MemorySnapshot:
+    """
+    Memory content saved by Memory.snapshot(): one immutable string per page
+    Pages not written between two snapshots are shared by them
+    Snapshots form a tree: parent is the snapshot memory matched when this one was taken (None if any),
+    pageSet holds the pages copied since (the only ones which may differ from the parent)
+    """
+    
+    def __init__(self, pageList, parent, pageSet):
+        self.pageList = pageList
+        self.parent = parent
+        self.pageSet = pageSet
+        self.depth = 0
+        if (parent is not None):
+            self.depth = parent.depth + 1
+        
 class Memory:
     
-    @classmethod
-    def whenUpdated(cls, fct):
-        cls.displayChange = fct
-
+    # watchpoints are looked for only when an accessed page is watched: 256 bytes per page
+    pageShift = 8
+    # longest access done by get() or set(): an access starting on the previous page can reach a watched page
+    __maxAccessLength = 4
+    # memory map: region flags per page, RAM when none is set
+    ram     = 0
+    rom     = 1     # written only when a program is loaded
+    io      = 2     # writes are passed on to controllers (device inputs)
+    ioRead  = 4     # values are asked to controllers before being read (device outputs)
+    
     def __init__(self, board, size):
         self.size = size
         self.wordSize = board.chip.getWordSize()
-        self.storage = bytearray([])
+        # multi-byte values per length in the byte order of the processor, others are converted byte per byte
+        byteOrder = board.chip.getByteOrder()
+        self.littleEndian = (byteOrder == Processor.littleEndian)
+        self.__word = struct.Struct(byteOrder + "H")
+        self.__valueFormat = {2: self.__word, 4: struct.Struct(byteOrder + "I")}
+        self.storage = bytearray(size)
         self.controllerList = []
-        for _ in range(self.size):
-            self.storage.append(0)
+        # memory map: region flags per page
+        self.pageMap = bytearray((size >> Memory.pageShift) + 1)
+        # flag per byte: set when byte belongs to an instruction kept decoded by the processor
+        self.codeMap = bytearray(size)
+        # function to call when such a byte is overwritten
+        self.codeListener = None
+        # change set of the processor when an observer is attached
+        self.changes = None
+        # accesses watched per page: Watchpoint.read and/or Watchpoint.write bits
+        self.watchMap = bytearray((size >> Memory.pageShift) + 1)
+        self.watchList = []
+        # function to call when watchpoints are added or removed
+        self.watchListener = None
+        # accesses to ranges watched with log action: (access, address, length, value)
+        self.watchLog = []
+        # first access to a range watched with stop action: (watchpoint, access, address, length, value)
+        # None if there is none since the last reset
+        self.watchHit = None
+        # pages written since memory matched self.base (last snapshot taken or restored)
+        self.pageCount = (size + (1 << Memory.pageShift) - 1) >> Memory.pageShift
+        self.dirtySet = set(range(self.pageCount))
+        self.base = None
+        # undo journal: previous values of written bytes are recorded when it is set
+        self.journal = None
+        # trace recorder: informed of written values when it is set
+        self.recorder = None
+        # number of writes: lets the processor know that memory didn't change (loop detection)
+        self.writeCount = 0
+        # number of reads of device outputs: a program polling a device is not stuck (loop detection)
+        self.pollCount = 0
             
     def addController(self, controller):
         self.controllerList.append(controller)
+        controller.attachMemory(self)
+        
+    def setChangeSet(self, changes):
+        self.changes = changes
+        
+    def whenCodeChanged(self, fct):
+        self.codeListener = fct
+        
+    def setJournal(self, journal):
+        self.journal = journal
+        
+    def setRecorder(self, recorder):
+        self.recorder = recorder
+        
+    #
+    # MEMORY MAP
+    #
+    def mapRegion(self, address, length, region):
+        "Add a region flag (Memory.rom, Memory.io) to all pages overlapping the area"
+        first = max(address, 0) >> Memory.pageShift
+        last = min(address + length - 1, self.size - 1) >> Memory.pageShift
+        for page in range(first, last + 1):
+            self.pageMap[page] |= region
+            
+    def getRegion(self, address):
+        "Region flags of the page of address"
+        return self.pageMap[address >> Memory.pageShift]
+    
+    def hasRegion(self, region):
+        "True if at least one page has the region flag"
+        return any(flag & region for flag in self.pageMap)
+    
+    def __isMapped(self, address, length, region):
+        "True if a page of the area has the region flag"
+        first = address >> Memory.pageShift
+        if (self.pageMap[first] & region):
+            return True
+        last = (address + length - 1) >> Memory.pageShift
+        return (first != last) and (region in [flag & region for flag in self.pageMap[first + 1:last + 1]])
+    
+    def __checkWrite(self, address, length):
+        if self.__isMapped(address, length, Memory.rom):
+            raise MemError(Error.error, "Read-only memory", address, length)
+        
+    def readDevices(self, address, length):
+        "Values of device outputs overlapping the area are updated before being read"
+        self.pollCount += 1
+        for controller in self.controllerList:
+            controller.callOutput(self, address, length)
+        
+    def updateBytes(self, address, data):
+        """
+        Store values given by a device: no write effect (journal, watchpoints, devices)
+        """
+        length = len(data)
+        if (self.storage[address:address + length] != data):
+            self.storage[address:address + length] = data
+            self.dirtySet.update(range(address >> Memory.pageShift, ((address + length - 1) >> Memory.pageShift) + 1))
+            self.writeCount += 1
+            if (self.changes is not None):
+                self.changes.memoryList.append((address, length))
+        
+    #
+    # WATCHPOINT management
+    #
+    def whenWatchChanged(self, fct):
+        self.watchListener = fct
+    
+    def addWatchpoint(self, address, length, access=Watchpoint.read | Watchpoint.write, action=Watchpoint.stop):
+        watchpoint = Watchpoint(address, length, access, action)
+        self.watchList.append(watchpoint)
+        self.__buildWatchMap()
+        return watchpoint
+    
+    def removeWatchpoint(self, watchpoint):
+        self.watchList.remove(watchpoint)
+        self.__buildWatchMap()
+        
+    def clearWatchpoints(self):
+        self.watchList = []
+        self.__buildWatchMap()
+        
+    def resetWatchHit(self):
+        self.watchHit = None
+        
+    def __buildWatchMap(self):
+        self.watchMap = bytearray(len(self.watchMap))
+        for watchpoint in self.watchList:
+            first = max(0, watchpoint.getAddress() - Memory.__maxAccessLength + 1) >> Memory.pageShift
+            last = (watchpoint.getAddress() + watchpoint.getLength() - 1) >> Memory.pageShift
+            for page in range(first, min(last + 1, len(self.watchMap))):
+                self.watchMap[page] |= watchpoint.getAccess()
+        if (self.watchListener):
+            self.watchListener()
+            
+    def checkWatch(self, address, length, access):
+        """
+        Detailed check of an access to a watched page
+        Return True if execution must stop
+        """
+        value = self.__getValue(address, length)
+        for watchpoint in self.watchList:
+            if watchpoint.matches(address, length, access):
+                if watchpoint.getAction() == Watchpoint.log:
+                    self.watchLog.append((access, address, length, value))
+                elif self.watchHit is None:
+                    self.watchHit = (watchpoint, access, address, length, value)
+        return self.watchHit is not None
+        
+    #
+    # SNAPSHOT management
+    #
+    def snapshot(self):
+        """
+        Save memory content: only pages written since the last snapshot (or restore) are copied
+        Other pages are shared with that snapshot
+        """
+        pageSize = 1 << Memory.pageShift
+        if (self.base is None):
+            pageList = [None] * self.pageCount
+        else:
+            pageList = list(self.base.pageList)
+        storage = self.storage
+        for page in self.dirtySet:
+            start = page << Memory.pageShift
+            pageList[page] = str(storage[start:start + pageSize])
+        self.base = MemorySnapshot(pageList, self.base, self.dirtySet)
+        self.dirtySet = set()
+        return self.base
+    
+    def restore(self, snapshot):
+        """
+        Restore memory content saved by snapshot()
+        Only pages written since the last snapshot (or restore) and pages copied by the snapshots between both
+        snapshots are copied: no page is compared, cost depends on written pages only
+        """
+        pageList = snapshot.pageList
+        pageSet = self.dirtySet
+        if (self.base is not snapshot):
+            pageSet.update(self.__pagesBetween(self.base, snapshot))
+        storage = self.storage
+        for page in pageSet:
+            start = page << Memory.pageShift
+            data = pageList[page]
+            storage[start:start + len(data)] = data
+            self.__restored(start, len(data))
+        self.base = snapshot
+        self.dirtySet = set()
+        self.writeCount += 1
+        
+    def __pagesBetween(self, first, second):
+        """
+        Pages which may differ between two snapshots: pages copied by the snapshots on the path
+        between them and their common ancestor (all pages if they have none)
+        """
+        pageSet = set()
+        while (first is not second):
+            # walk up from the deepest one
+            if (first is None) or ((second is not None) and (second.depth > first.depth)):
+                pageSet.update(second.pageSet)
+                second = second.parent
+            else:
+                pageSet.update(first.pageSet)
+                first = first.parent
+        return pageSet
+        
+    def __restored(self, address, length):
+        "Same updates as set() once a page is restored"
+        if (self.codeListener) and (1 in self.codeMap[address:address + length]):
+            self.codeListener(self, address, length)
+        if self.__isMapped(address, length, Memory.io):
+            for controller in self.controllerList:
+                controller.callInput(self, address, length)
+        if (self.changes is not None):
+            self.changes.memoryList.append((address, length))
+        
+    def markCode(self, address, length):
+        end = min(address + length, self.size)
+        self.codeMap[address:end] = b"\x01" * (end - address)
+            
+    def unmarkCode(self, address, length):
+        end = min(address + length, self.size)
+        self.codeMap[address:end] = bytearray(end - address)
                     
     def getSize(self):
         return self.size
@@ -50,29 +322,178 @@ class Memory:
     def set(self, address, length, value):
         if (not self.__check(address, length)):
             return
-        for i in range(length):
-            if (i == length - 1):
-                self.storage[address + i] = value % 256
-            else:
-                self.storage[address + i] = value / 256
-                value = value % 256
-        for controller in self.controllerList:
-            controller.callInput(self, address, length)
-        Memory.displayChange(self, address, length, self.wordSize)
+        self.__checkWrite(address, length)
+        if (self.recorder is not None):
+            self.recorder.write(address, length, value)
+        if (length == 1):
+            if (self.journal is not None):
+                self.journal.saveByte(address, self.storage[address])
+            self.storage[address] = value & 0xff
+            self.__written(address, 1)
+        else:
+            self.__writeBytes(address, self.toBytes(value, length))
   
     def get(self, address, length):
         if (not self.__check(address, length)):
                 return 0        
-            
+        if (self.pageMap[address >> Memory.pageShift] & Memory.ioRead) or \
+           ((length > 1) and self.__isMapped(address, length, Memory.ioRead)):
+            self.readDevices(address, length)
+        if (self.watchMap[address >> Memory.pageShift] & Watchpoint.read):
+            self.checkWatch(address, length, Watchpoint.read)
+        return libproc.ltoi(self.__getValue(address, length), length)
+    
+    def peek(self, address, length):
+        "Same as get() without watchpoint: used to decode or display memory"
+        if (not self.__check(address, length)):
+                return 0        
+        return libproc.ltoi(self.__getValue(address, length), length)
+    
+    def __getValue(self, address, length):
+        "Unsigned value of length bytes in the byte order of the processor"
+        if (length == 1):
+            return self.storage[address]
+        valueFormat = self.__valueFormat.get(length)
+        if (valueFormat is not None):
+            return valueFormat.unpack_from(self.storage, address)[0]
+        data = self.storage[address:address + length]
+        if (self.littleEndian):
+            data.reverse()
         value = 0
-        for i in range(length):
-            value = (value * 256) + self.storage[address+i]
-        return (libproc.ltoi(value, length))
+        for byte in data:
+            value = (value << 8) | byte
+        return value
+    
+    def toBytes(self, value, length):
+        "Bytes of a value stored on length bytes (as set() does)"
+        valueFormat = self.__valueFormat.get(length)
+        if (valueFormat is not None):
+            return bytearray(valueFormat.pack(value & ((1 << (8 * length)) - 1)))
+        data = bytearray(length)
+        for i in range(length - 1, -1, -1):
+            data[i] = value & 0xff
+            value >>= 8
+        if (self.littleEndian):
+            data.reverse()
+        return data
+    
+    #
+    # 16-BIT accessors: addresses and pointers
+    #
+    def read16(self, address):
+        "Unsigned 16-bit value (same checks as get())"
+        if (address < 0) or (address + 2 > self.size):
+            self.__check(address, 2)
+        if self.__isMapped(address, 2, Memory.ioRead):
+            self.readDevices(address, 2)
+        if (self.watchMap[address >> Memory.pageShift] & Watchpoint.read):
+            self.checkWatch(address, 2, Watchpoint.read)
+        return self.__word.unpack_from(self.storage, address)[0]
+    
+    def write16(self, address, value):
+        "Same as set() of a 16-bit value"
+        self.set(address, 2, value)
+    
+    #
+    # BULK operations
+    #
+    def readBytes(self, address, length):
+        "Copy of length bytes (no watchpoint)"
+        self.__check(address, length)
+        return self.storage[address:address + length]
+    
+    def writeBytes(self, address, data):
+        "Write a sequence of bytes at once: same effects as set() (journal, self-modifying code, watchpoints, devices...)"
+        length = len(data)
+        if (length == 0):
+            return
+        self.__check(address, length)
+        self.__checkWrite(address, length)
+        self.__writeBytes(address, data)
+        
+    def loadBytes(self, address, data):
+        "Same as writeBytes() into ROM too: used to load programs"
+        if (len(data) == 0):
+            return
+        self.__check(address, len(data))
+        self.__writeBytes(address, data)
+        
+    def __writeBytes(self, address, data):
+        length = len(data)
+        if (self.journal is not None):
+            self.journal.saveBytes(address, self.storage[address:address + length])
+        self.storage[address:address + length] = data
+        self.__written(address, length)
+        
+    def fill(self, address, length, value=0):
+        "Write length bytes with the same value"
+        self.writeBytes(address, bytearray([value & 0xff]) * length)
+        
+    def __written(self, address, length):
+        "Updates following a write of length bytes"
+        first = address >> Memory.pageShift
+        last = (address + length - 1) >> Memory.pageShift
+        if (first == last):
+            self.dirtySet.add(first)
+        else:
+            self.dirtySet.update(range(first, last + 1))
+        self.writeCount += 1
+        # decoded instruction overwritten: self-modifying code
+        if (self.codeListener) and (1 in self.codeMap[address:address + length]):
+            self.codeListener(self, address, length)
+        if (self.watchMap[first] & Watchpoint.write) or \
+           ((length > Memory.__maxAccessLength) and (Watchpoint.write in [flag & Watchpoint.write for flag in self.watchMap[first:last + 1]])):
+            self.checkWatch(address, length, Watchpoint.write)
+        if self.__isMapped(address, length, Memory.io):
+            if (self.journal is not None):
+                self.journal.saveDevices()
+            for controller in self.controllerList:
+                controller.callInput(self, address, length)
+        if (self.changes is not None):
+            self.changes.memoryList.append((address, length))
     
     def clear(self):
-        for i in range(self.size):
-            self.storage[i] = 0
+        self.storage[:] = bytearray(self.size)
+        self.codeMap = bytearray(self.size)
+        self.dirtySet = set(range(self.pageCount))
+        self.writeCount += 1
 
     
+    def setByte(self, address, value):
+        "Same as set() for one byte, address being already checked"
+        if (self.pageMap[address >> Memory.pageShift] & Memory.rom):
+            raise MemError(Error.error, "Read-only memory", address, 1)
+        if (self.journal is not None):
+            self.journal.saveByte(address, self.storage[address])
+        if (self.recorder is not None):
+            self.recorder.write(address, 1, value)
+        self.storage[address] = value % 256
+        self.dirtySet.add(address >> Memory.pageShift)
+        self.writeCount += 1
+        if (self.codeListener) and (self.codeMap[address]):
+            self.codeListener(self, address, 1)
+        if (self.watchMap[address >> Memory.pageShift] & Watchpoint.write):
+            self.checkWatch(address, 1, Watchpoint.write)
+        if (self.pageMap[address >> Memory.pageShift] & Memory.io):
+            if (self.journal is not None):
+                self.journal.saveDevices()
+            for controller in self.controllerList:
+                controller.callInput(self, address, 1)
+        if (self.changes is not None):
+            self.changes.memoryList.append((address, 1))
+    
+    def undoByte(self, address, value):
+        "Put back a byte value recorded by the journal: same as setByte() without journal nor watchpoint"
+        self.storage[address] = value
+        self.dirtySet.add(address >> Memory.pageShift)
+        self.writeCount += 1
+        if (self.codeListener) and (self.codeMap[address]):
+            self.codeListener(self, address, 1)
+        if (self.pageMap[address >> Memory.pageShift] & Memory.io):
+            for controller in self.controllerList:
+                controller.callInput(self, address, 1)
+        if (self.changes is not None):
+            self.changes.memoryList.append((address, 1))
+    
     def getByte(self, address):
         return self.storage[address]
\ No newline at end of file
@@ -6,6 +6,7 @@
 import libproc
 import trace
 from error import *
+from scheduler import Scheduler
 
 #
 # EXEC ERROR Exception
@@ -13,9 +14,16 @@ from error import *
 #    raise during execution to process error
 #
 class ExecError(Error):
-    def __init__(self, severity, msg):
+    
+    # kinds of execution error
+    fault   = 0     # instruction failed
+    budget  = 1     # instruction or cycle budget exhausted (see Processor.setBudget)
+    loop    = 2     # program stuck into an infinite loop (see Processor.setLoopDetection)
+    
+    def __init__(self, severity, msg, kind=fault):
         Error.__init__(self, severity)
         self.msg = msg
+        self.kind = kind
         
     def __str__(self):
         return self.msg
@@ -31,6 +39,8 @@ class AddressingMode:
         self.__size       = size
         # function call to convert operand
         self.__processing =   processing
+        # function computing the effective address (bound by the chip)
+        self.__resolver   = None
     
     def __str__(self):
         return self.__name
@@ -43,6 +53,12 @@ class AddressingMode:
     
     def getProcessing(self):
         return self.__processing
+    
+    def setResolver(self, fct):
+        self.__resolver = fct
+        
+    def getResolver(self):
+        return self.__resolver
 
 #
 # SECTION Management
@@ -71,12 +87,14 @@ class Section:
 #
 class Instruction:
         
-    def __init__(self, opcode, mnemonic, callback, addressingMode, isOffset= False):
+    def __init__(self, opcode, mnemonic, callback, addressingMode, isOffset= False, cycles=1):
         self.__opcode     = opcode
         self.__mnemonic   = mnemonic
         self.__callback   = callback
         self.__addressing = addressingMode
         self.__isOffset   = isOffset
+        # number of clock cycles (without penalties added by the callback)
+        self.__cycles     = cycles
         
     def __str__(self):
         return self.__mnemonic
@@ -102,6 +120,9 @@ class Instruction:
     def isOffset(self):
         return self.__isOffset
     
+    def getCycles(self):
+        return self.__cycles
+    
 class Data:
     
     def __init__(self, mnemonic, size, fct):
@@ -127,16 +148,45 @@ class Parameter:
         self.__addressing = addressing
         self.__value      = value
         self.__size       = size
+        # resolved once: parameters are kept into the decode cache
+        self.__resolver   = addressing.getResolver()
         
     def getAddressing(self):
         return self.__addressing
     
+    def getResolver(self):
+        return self.__resolver
+    
     def getValue(self):
         return self.__value
     
     def getSize(self):
         return self.__size
     
+#
+# CHANGE SET
+#
+#    changes done by one execution step, delivered at once to the observer
+#    only created when an observer is attached: without observer, updates are plain stores
+#
+
+class ChangeSet:
+    
+    def __init__(self, status):
+        self.reset(status)
+        
+    def reset(self, status):
+        # address of executed instruction (None if changes are not due to an execution step)
+        self.address        = None
+        # updated registers
+        self.registerSet    = set()
+        # indicators whose value changed (computed when changes are delivered)
+        self.indicatorList  = []
+        # updated memory areas: list of (address, length)
+        self.memoryList     = []
+        # status bitfield before changes
+        self.status         = status
+
 #
 # INDICATOR management
 #
@@ -144,6 +194,9 @@ class Parameter:
 #
 
 class Indicator:
+    """
+    Indicator: one bit of the status bitfield owned by the processor
+    """
     
     Carry       = 1
     Zero        = 2
@@ -154,30 +207,22 @@ class Indicator:
     # class attribute: it used to get a unique rank
     __rank      = 0
 
-    # class attribute because used before instance creation
-    # and common to all indicators
-    # function to call when an indicator value is changed
-    __displayChange = None
-    
     @classmethod
     def reset(self):
         Indicator.__rank = 0
         
-    @classmethod
-    def whenUpdated(cls, fct):
-        cls.__displayChange = fct
-        
     def __init__(self, processor, name, label, indicatorType, rank=None):
         self.__processor = processor
         self.__name = name
         self.__label = label
         self.__indicatorType = indicatorType
-        self.__value = 0
         if (rank):
             self.__rank = rank
         else:    
             self.__rank = Indicator.__rank
         Indicator.__rank += 1
+        # bit of the indicator into the status bitfield
+        self.__mask = 1 << self.__rank
     
     def getName(self):
         return self.__name
@@ -188,26 +233,24 @@ class Indicator:
     def getRank(self):
         return self.__rank
     
+    def getMask(self):
+        return self.__mask
+    
     def getType(self):
         return self.__indicatorType
     
     def get(self):
-        return self.__value
+        if (self.__processor.getStatus() & self.__mask):
+            return 1
+        return 0
     
     def set(self, value):
-        if (value != self.__value):
-            self.__value = value
-            for reg in self.__processor.getRegisterList():
-                if (reg.getType() == Register.Status):
-                    if (value == 1):
-                        mask = 1 << self.__rank
-                        reg.set(reg.get() | mask)
-                    else:
-                        mask = ~(1 << self.__rank)
-                        reg.set(reg.get() & mask)
-                    
-            if (Indicator.__displayChange):
-                Indicator.__displayChange(self)
+        processor = self.__processor
+        status = processor.getStatus()
+        if (value):
+            processor.setStatus(status | self.__mask)
+        else:
+            processor.setStatus(status & ~self.__mask)
 
 #
 # REGISTER management
@@ -230,7 +273,6 @@ class Register:
     UnsignedInteger     = 2
     Float               = 3 # not supported yet
 
-    __displayChange       = None
     __rank = 0
     
     def __init__(self, processor, name, label, regType, status, frmt, size):
@@ -252,14 +294,15 @@ class Register:
             self.__max  = 2 ** (size * 8) - 1
         self.__rank = Register.__rank
         Register.__rank += 1
+        # change set of the processor when an observer is attached
+        self.__changes = None
     
     @classmethod
     def reset(self):
         Register.__rank = 0
     
-    @classmethod    
-    def whenUpdated(cls, fct):
-        cls.__displayChange = fct
+    def setChangeSet(self, changes):
+        self.__changes = changes
        
     def set(self, value):           
         # convert value in sized integer
@@ -270,14 +313,22 @@ class Register:
             value = libproc.ltoui(value, self.__size)
 
         self.__value = value
-        if (Register.__displayChange):
-            Register.__displayChange(self)
+        if (self.__changes is not None):
+            self.__changes.registerSet.add(self)
         if (self.__status == Register.StatusY):
-            self.__processor.setZero(value)
-            self.__processor.setNeg(value)
+            self.__processor.setZeroNeg(value)
+            
+    def restore(self, value):
+        "Set a value returned by get(): no conversion and indicators are not updated"
+        self.__value = value
+        if (self.__changes is not None):
+            self.__changes.registerSet.add(self)
 
     def get(self):
         return self.__value  
+    
+    def getProcessor(self):
+        return self.__processor
                 
     def getName(self):
         return self.__name
@@ -293,22 +344,45 @@ class Register:
     
     def getType(self):
         return self.__regType
+    
+    
+class StatusRegister(Register):
+    """
+    Status register: its value is the status bitfield owned by the processor
+    Indicators are views over the same bitfield
+    """
+    
+    def set(self, value):
+        self.getProcessor().setStatus(libproc.ltoui(value, self.getSize()))
+        
+    def get(self):
+        return self.getProcessor().getStatus()
 
 
 class Processor(object):
     
-    __displayChange = None
-    
-                
-    @classmethod
-    def whenUpdated(cls, fct):
-        cls.__displayChange = fct
+    # instructions executed between two state comparisons of loop detection
+    loopInterval = 256
+    # byte order of multi-byte values in memory (struct format prefix)
+    bigEndian       = ">"
+    littleEndian    = "<"
+    # interrupt lines asserted by devices
+    irq             = 1     # maskable: stays asserted until the device clears it
+    nmi             = 2     # non maskable: cleared once accepted
         
     def __init__(self, name):
         self.__name             = name
         self.__loadAddress      = 0
         self.__regList          = []
         self.__indicatorList    = []
+        # status bitfield: one bit per indicator, shared with the status register (if any)
+        self.__status           = 0
+        self.__statusRegister   = None
+        # indicator per bit and bits per indicator type
+        self.__indicatorPerMask = {}
+        self.__maskPerType      = {}
+        self.__zeroMask         = 0
+        self.__negMask          = 0
         self.__endProgram       = False
         self.__instructionSet   = []
         self.__instructionOpcode = {}
@@ -318,9 +392,45 @@ class Processor(object):
         self.__dataWithAddress  =   False
         self.__wordSize         = 0
         self.__addressSize      = 0
+        self.__byteOrder        = Processor.bigEndian
         self.__instructionSize  = 0
         self.__operandSep       = ''
         self.__helpFile         = ""
+        # clock cycles spent since last clear
+        self.__cycles           = 0
+        # decoded instructions per address: (callback, parameter list, next PC, cycles)
+        # avoid decoding again instructions executed several times (loops)
+        self.__decodeCache      = {}
+        # size (opcode + operands) of the longest decoded instruction
+        self.__maxDecodedSize   = 0
+        # observer of execution: called once per step with the change set
+        self.__observer         = None
+        self.__changes          = None
+        # engine executing translated blocks (optional)
+        self.__engine           = None
+        # undo journal: state before each executed instruction is recorded when it is attached
+        self.__journal          = None
+        # profiler: informed of each executed instruction when it is attached
+        self.__profiler         = None
+        # trace recorder: informed of each executed instruction when it is attached
+        self.__recorder         = None
+        # instruction being executed while one of them is attached: [address, opcode, cycles before it]
+        self.__instrumented     = None
+        # budget and loop detection: checked before each instruction when one of them is set
+        self.__supervised       = False
+        self.__instructionBudget = None
+        self.__cycleBudget      = None
+        # instructions executed and cycle counter when the budget was set
+        self.__executed         = 0
+        self.__budgetCycles     = 0
+        self.__loopDetection    = False
+        self.__loopPolls        = 0
+        self.resetLoopDetection(0)
+        # asserted interrupt lines: checked before each instruction
+        self.__interrupts       = 0
+        # device event scheduler and its nearest deadline (cycle counter value)
+        self.__scheduler        = None
+        self.__nextEvent        = Scheduler.never
         Register.reset()
         Indicator.reset()
         
@@ -329,7 +439,11 @@ class Processor(object):
     #
         
     def addRegister(self, name, label, regType, status, format, size):
-        reg = Register(self, name, label, regType, status, format, size)
+        if (regType == Register.Status):
+            reg = StatusRegister(self, name, label, regType, status, format, size)
+            self.__statusRegister = reg
+        else:
+            reg = Register(self, name, label, regType, status, format, size)
         self.__regList.append(reg)
         return reg
     
@@ -344,15 +458,31 @@ class Processor(object):
     def addIndicator(self, name, label, indicatorType, rank=None):
         indicator = Indicator(self, name, label, indicatorType, rank)
         self.__indicatorList.append(indicator)
+        mask = indicator.getMask()
+        self.__indicatorPerMask[mask] = indicator
+        self.__maskPerType[indicatorType] = self.__maskPerType.get(indicatorType, 0) | mask
+        if (indicatorType == Indicator.Zero):
+            self.__zeroMask |= mask
+        elif (indicatorType == Indicator.Negative):
+            self.__negMask |= mask
         return indicator
         
     def getIndicatorList(self):
         return self.__indicatorList
     
+    def getStatus(self):
+        return self.__status
+    
+    def setStatus(self, value):
+        # changed indicators are computed when changes are delivered to the observer
+        self.__status = value
+    
     def setIndic(self, indicType, value):
-        for ind in self.__indicatorList:
-            if ind.getType() == indicType:
-                ind.set(value)
+        mask = self.__maskPerType.get(indicType, 0)
+        if (value):
+            self.setStatus(self.__status | mask)
+        else:
+            self.setStatus(self.__status & ~mask)
  
     def setZero(self, value):
         if (value == 0):
@@ -365,6 +495,15 @@ class Processor(object):
             self.setIndic(Indicator.Negative, 1)
         else:
             self.setIndic(Indicator.Negative, 0)
+            
+    def setZeroNeg(self, value):
+        "Set Zero and Negative indicators in one update of the status"
+        status = self.__status & ~(self.__zeroMask | self.__negMask)
+        if (value == 0):
+            status |= self.__zeroMask
+        elif (value < 0):
+            status |= self.__negMask
+        self.setStatus(status)
                     
     def setOverflow(self, value):
         self.setIndic(Indicator.Overflow, value)
@@ -373,8 +512,7 @@ class Processor(object):
         self.setIndic(Indicator.Carry, value)
  
     def clearIndicator(self):
-        for ind in self.__indicatorList:
-            ind.set(0)
+        self.setStatus(0)
     
     #
     # DATA definition management
@@ -391,8 +529,8 @@ class Processor(object):
     #
     # INSTRUCTION management
     #
-    def addInstruction(self, opcode, mnemonic, callback, addressingMode, isOffset = False):
-        inst = Instruction(opcode, mnemonic, callback, addressingMode, isOffset)
+    def addInstruction(self, opcode, mnemonic, callback, addressingMode, isOffset = False, cycles=1):
+        inst = Instruction(opcode, mnemonic, callback, addressingMode, isOffset, cycles)
         #self.instructionSet[opcode] = inst
         self.__instructionSet.append(inst)
         self.__instructionOpcode[opcode] = inst
@@ -479,41 +617,439 @@ class Processor(object):
     def getWordSize(self):
         return self.__wordSize
     
+    def setByteOrder(self, value):
+        "Processor.bigEndian (most significant byte first) or Processor.littleEndian"
+        self.__byteOrder = value
+        
+    def getByteOrder(self):
+        return self.__byteOrder
+    
     def setEndProgram(self, value):
         self.__endProgram = value
         
+    def isEndProgram(self):
+        return self.__endProgram
+        
+    #
+    # OBSERVER management
+    #
+    def attachObserver(self, fct):
+        """
+        Attach the function called after each execution step with all changes done by the step
+        Return the change set to be filled by other components (memory)
+        """
+        self.__observer = fct
+        self.__changes = ChangeSet(self.__status)
+        for reg in self.__regList:
+            reg.setChangeSet(self.__changes)
+        return self.__changes
+    
+    def detachObserver(self):
+        self.__observer = None
+        self.__changes = None
+        for reg in self.__regList:
+            reg.setChangeSet(None)
+            
+    def notifyChanges(self):
+        "Deliver pending changes to the observer"
+        changes = self.__changes
+        if changes is None:
+            return
+        changed = changes.status ^ self.__status
+        # only loop on changed bits
+        while changed:
+            mask = changed & -changed
+            changed ^= mask
+            indicator = self.__indicatorPerMask.get(mask)
+            if (indicator):
+                changes.indicatorList.append(indicator)
+        if (self.__statusRegister) and (changes.status != self.__status):
+            changes.registerSet.add(self.__statusRegister)
+        try:
+            self.__observer(changes)
+        finally:
+            changes.reset(self.__status)
+    
+    #
+    # EXECUTION
+    #
     def executeNext(self, board):
-        memory = board.memory
-        if (self.__displayChange):
-            self.__displayChange(self.PC.get())
+        if (self.__supervised):
+            self.supervise(board)
+            self.__executed += 1
+            self.__loopCountdown -= 1
+        if (self.__journal is not None):
+            self.__journal.record(self.saveState())
+        if (self.__changes is not None):
+            # deliver changes once the step is done, even if it failed
+            self.__changes.address = self.PC.get()
+            try:
+                return self.step(board)
+            finally:
+                self.notifyChanges()
+        return self.step(board)
+        
+    def step(self, board):
+        if (self.__cycles >= self.__nextEvent):
+            if (self.__journal is not None):
+                self.__journal.saveDevices()
+            self.__scheduler.run(self.__cycles)
+        if (self.__interrupts):
+            cycles = self.__cycles
+            self.acceptInterrupt(board, self.__interrupts)
+            if (self.__cycles != cycles) and (self.__instrumented is not None):
+                self.__instrumentInterrupt(board, cycles)
         address = self.PC.get()
         
-        opcode = libproc.ltoui(memory.get(address, self.__instructionSize), self.__instructionSize)
-        self.PC.set(self.PC.get() + self.__instructionSize)
+        decoded = self.__decodeCache.get(address)
+        if decoded is None:
+            decoded = self.decode(board.memory, address)
+        callback, parameterList, nextAddress, cycles = decoded
+        self.PC.set(nextAddress)
+        self.__cycles += cycles
+
+        if callback:
+            callback(board, parameterList)
+        return self.__endProgram
+    
+    #
+    # DECODE CACHE management
+    #
+    def decode(self, memory, address):
+        """
+        Decode the instruction stored at address and keep it into the decode cache
+        Memory is informed of bytes used by the instruction in order to invalidate it if they are overwritten 
+        """
+        inst, parameterList, nextAddress = self.decodeInstruction(memory, address)
+        if (not inst):
+            self.PC.set(nextAddress)
+            opcode = libproc.ltoui(memory.peek(address, self.__instructionSize), self.__instructionSize)
+            raise ExecError(Error.error, "Address: " + str(hex(address)) + ": invalid opcode " + str(hex(opcode)))
+
+        decoded = (inst.getCallback(), parameterList, nextAddress, inst.getCycles())
+        self.__decodeCache[address] = decoded
+        size = nextAddress - address
+        if size > self.__maxDecodedSize:
+            self.__maxDecodedSize = size
+        memory.markCode(address, size)
+        return decoded
+    
+    def decodeInstruction(self, memory, address):
+        """
+        Decode the instruction stored at address without executing nor caching it
+        Return instruction (None if opcode is invalid), its parameter list and address of next instruction
+        """
+        opcode = libproc.ltoui(memory.peek(address, self.__instructionSize), self.__instructionSize)
+        nextAddress = address + self.__instructionSize
 
         # check opcode
         inst = self.lookForInstruction(opcode)
         if (not inst):
-            raise ExecError(Error.error, "Address: " + str(hex(address)) + ": invalid opcode " + str(hex(opcode)))
-            return True
+            return (None, [], nextAddress)
         
         parameterList = []
         for addressing in inst.getAddressing():
             size = addressing.getSize()
-            value = memory.get(self.PC.get(), size)
-            self.PC.set(self.PC.get() + size)
+            value = memory.peek(nextAddress, size)
+            nextAddress += size
             parameter = Parameter(addressing, value, size)
             parameterList.append(parameter)
-
-        #self.instructionSet[opcode][self.InstFct](self, board, parameterList)
-        callback = inst.getCallback()
-        if callback:
-            callback(board, parameterList)
-        return self.__endProgram
+        return (inst, parameterList, nextAddress)
+    
+    def invalidateDecoded(self, memory, address, length):
+        """
+        Called when memory used by decoded instructions is overwritten (self-modifying code):
+        remove all instructions overlapping the updated area
+        """
+        for start in range(address - self.__maxDecodedSize + 1, address + length):
+            self.__decodeCache.pop(start, None)
+        self.invalidateTranslated(address, length)
+        memory.unmarkCode(address, length)
+    
+    def clearDecoded(self):
+        self.__decodeCache = {}
+        self.clearTranslated()
+            
+    #
+    # TRANSLATION ENGINE management
+    #
+    def createEngine(self, board):
+        """
+        Create the engine executing translated blocks of instructions
+        None if the processor doesn't provide such an engine
+        """
+        return None
+    
+    def createLockstepEngine(self, board, count):
+        """
+        Create the engine running the program loaded into the board on count machines at once
+        None if the processor doesn't provide such an engine
+        """
+        return None
+    
+    def attachEngine(self, engine):
+        "Engine is informed when decoded code is overwritten"
+        self.__engine = engine
+        
+    def clearTranslated(self):
+        if (self.__engine):
+            self.__engine.clear()
+            
+    def invalidateTranslated(self, address, length):
+        "Translated blocks overlapping the area must be translated again (code or breakpoint changed)"
+        if (self.__engine):
+            self.__engine.invalidate(address, length)
+        
+    #
+    # CYCLE counting
+    #
+    def getCycles(self):
+        return self.__cycles
+    
+    def setCycles(self, value):
+        self.__cycles = value
+    
+    def addCycles(self, value):
+        "Extra cycles spent by the instruction being executed (page crossing, branch taken...)"
+        self.__cycles += value
+        
+    #
+    # BUDGET and LOOP DETECTION
+    #
+    def setBudget(self, instructions=None, cycles=None):
+        """
+        Stop execution with an ExecError of kind ExecError.budget once the budget is spent
+        Instructions and cycles are counted from this call. None: no limit
+        """
+        self.__instructionBudget = instructions
+        self.__cycleBudget = cycles
+        self.__executed = 0
+        self.__budgetCycles = self.__cycles
+        self.__updateSupervised()
+        
+    def setLoopDetection(self, value):
+        """
+        Stop execution with an ExecError of kind ExecError.loop when the program is provably stuck:
+        same registers and indicators again (jump to itself included) without any memory write since
+        State is compared every Processor.loopInterval instructions
+        A program polling devices is not stuck. While a device event is scheduled, the program is idle
+        until it happens: cycles are fast-forwarded to its deadline instead
+        """
+        self.__loopDetection = value
+        self.resetLoopDetection(0)
+        self.__updateSupervised()
+        
+    def isSupervised(self):
+        return self.__supervised
+        
+    def __updateSupervised(self):
+        self.__supervised = (self.__instructionBudget is not None) or (self.__cycleBudget is not None) or \
+                            self.__loopDetection
+        
+    def resetLoopDetection(self, writeCount):
+        # instructions to execute before the next state comparison
+        self.__loopCountdown = Processor.loopInterval
+        # state compared with next ones, memory write counter and instructions executed when it was saved
+        self.__loopState = None
+        self.__loopWrites = writeCount
+        self.__loopExecuted = self.__executed
+        # Brent's cycle detection: saved state is replaced after 1, 2, 4... comparisons
+        self.__loopPower = 1
+        self.__loopSteps = 0
+        
+    def getBudgetLeft(self):
+        """
+        Number of instructions which can be executed before supervise() must be called again
+        None if there is no limit
+        """
+        left = None
+        if (self.__instructionBudget is not None):
+            left = self.__instructionBudget - self.__executed
+        if (self.__loopDetection) or (self.__cycleBudget is not None):
+            left = self.__loopCountdown if left is None else min(left, self.__loopCountdown)
+        return left
+        
+    def addExecuted(self, count):
+        "Instructions executed without executeNext() (translated blocks)"
+        self.__executed += count
+        self.__loopCountdown -= count
+        
+    def supervise(self, board):
+        """
+        Called before executing an instruction (or a block of instructions) when the chip is supervised
+        Raise an ExecError if the budget is spent or if the program is stuck
+        """
+        if (self.__instructionBudget is not None) and (self.__executed >= self.__instructionBudget):
+            raise ExecError(Error.error, "Limit of " + str(self.__instructionBudget) + " instructions reached",
+                            ExecError.budget)
+        if (self.__cycleBudget is not None) and (self.__cycles - self.__budgetCycles >= self.__cycleBudget):
+            raise ExecError(Error.error, "Limit of " + str(self.__cycleBudget) + " cycles reached", ExecError.budget)
+        if (not self.__loopDetection) or (self.__loopCountdown > 0):
+            return
+        self.__loopCountdown = Processor.loopInterval
+        writeCount = board.memory.writeCount
+        pollCount = board.memory.pollCount
+        idle = (self.__nextEvent != Scheduler.never)
+        # device values can change at any time, unless they only change with events
+        if (writeCount != self.__loopWrites) or ((pollCount != self.__loopPolls) and (not idle)):
+            self.resetLoopDetection(writeCount)
+        self.__loopPolls = pollCount
+        state = (tuple([reg.get() for reg in self.__regList]), self.__status)
+        if (state == self.__loopState) and (idle):
+            # nothing happens until the next event: its deadline is reached at once (within cycle budget)
+            deadline = self.__nextEvent
+            if (self.__cycleBudget is not None):
+                deadline = min(deadline, self.__budgetCycles + self.__cycleBudget)
+            self.__cycles = max(self.__cycles, deadline)
+            self.resetLoopDetection(writeCount)
+            return
+        if (state == self.__loopState):
+            raise ExecError(Error.error, "Address: " + str(hex(self.PC.get())) + ": infinite loop (same state after " +
+                            str(self.__executed - self.__loopExecuted) + " instructions without memory write)",
+                            ExecError.loop)
+        if (self.__loopState is None) or (self.__loopSteps == self.__loopPower):
+            self.__loopState = state
+            self.__loopExecuted = self.__executed
+            self.__loopPower *= 2
+            self.__loopSteps = 0
+        self.__loopSteps += 1
+        
+    #
+    # PROFILER and TRACE RECORDER management
+    #
+    #    executeNext() is replaced only while one of them is attached: no overhead without them
+    #
+    def attachProfiler(self, profiler):
+        "Profiler counts each instruction executed by executeNext()"
+        self.__profiler = profiler
+        self.__updateInstrumented()
+            
+    def getProfiler(self):
+        return self.__profiler
+    
+    def attachRecorder(self, recorder):
+        "Trace recorder records each instruction executed by executeNext()"
+        self.__recorder = recorder
+        self.__updateInstrumented()
+        
+    def getRecorder(self):
+        return self.__recorder
+    
+    def isInstrumented(self):
+        "True when each instruction must be executed by executeNext(): journal, profiler or trace recorder attached"
+        return (self.__journal is not None) or (self.__profiler is not None) or (self.__recorder is not None)
+    
+    def __updateInstrumented(self):
+        if (self.__profiler is None) and (self.__recorder is None):
+            self.__dict__.pop('executeNext', None)
+            self.__instrumented = None
+        else:
+            self.executeNext = self.__executeInstrumented
+    
+    def __executeInstrumented(self, board):
+        address = self.PC.get()
+        opcode = libproc.ltoui(board.memory.peek(address, self.__instructionSize), self.__instructionSize)
+        # updated by __instrumentInterrupt() if an interrupt is entered before the instruction
+        instrumented = self.__instrumented = [address, opcode, self.__cycles]
+        recorder = self.__recorder
+        if (recorder is not None):
+            recorder.startInstruction()
+        end = type(self).executeNext(self, board)
+        address, opcode, cycles = instrumented
+        if (self.__profiler is not None):
+            self.__profiler.count(address, opcode, self.__cycles - cycles)
+        if (recorder is not None):
+            operand = 0
+            decoded = self.__decodeCache.get(address)
+            if decoded and decoded[1]:
+                operand = decoded[1][0].getValue()
+            recorder.record(address, opcode, operand, self.__cycles, self.__status)
+        return end
+        
+    def __instrumentInterrupt(self, board, cycles):
+        """
+        An interrupt has been entered by step() before the instruction: the entry is counted and recorded apart,
+        the instruction then executed is the first one of the handler
+        """
+        interrupted, _, before = self.__instrumented
+        if (self.__profiler is not None):
+            self.__profiler.countInterrupt(interrupted, cycles - before, self.__cycles - cycles)
+        if (self.__recorder is not None):
+            self.__recorder.recordInterrupt(interrupted, self.PC.get(), self.__cycles, self.__status)
+        address = self.PC.get()
+        opcode = libproc.ltoui(board.memory.peek(address, self.__instructionSize), self.__instructionSize)
+        self.__instrumented[:] = [address, opcode, self.__cycles]
+        
+    #
+    # INTERRUPT management
+    #
+    def raiseInterrupt(self, line):
+        "Assert an interrupt line (Processor.irq, Processor.nmi): checked before the next instruction"
+        if (self.__journal is not None):
+            self.__journal.saveDevices()
+        self.__interrupts |= line
+        
+    def clearInterrupt(self, line):
+        if (self.__journal is not None):
+            self.__journal.saveDevices()
+        self.__interrupts &= ~line
+        
+    def getInterrupts(self):
+        "Asserted interrupt lines"
+        return self.__interrupts
     
+    def acceptInterrupt(self, board, lines):
+        """
+        Called before an instruction while interrupt lines are asserted: jump to the interrupt handler if it is accepted
+        Processors without interrupts ignore them
+        """
+        self.clearInterrupt(lines)
+        
+    #
+    # EVENT management
+    #
+    def attachScheduler(self, scheduler):
+        "Events of the scheduler are run before the instruction reaching their deadline"
+        self.__scheduler = scheduler
+        scheduler.whenNextChanged(self.setNextEvent)
+        
+    def getScheduler(self):
+        return self.__scheduler
+    
+    def setNextEvent(self, cycle):
+        self.__nextEvent = cycle
+        
+    def getNextEvent(self):
+        "Cycle counter value of the nearest event (infinite when there is none)"
+        return self.__nextEvent
+        
+    #
+    # JOURNAL management
+    #
+    def attachJournal(self, journal):
+        self.__journal = journal
+        
+    def getJournal(self):
+        return self.__journal
+    
+    #
+    # STATE management
+    #
+    def saveState(self):
+        "Register values, status, cycles and end of program flag: see restoreState()"
+        return (tuple([reg.get() for reg in self.__regList]), self.__status, self.__cycles, self.__endProgram)
+    
+    def restoreState(self, state):
+        valueList, status, self.__cycles, self.__endProgram = state
+        for reg, value in zip(self.__regList, valueList):
+            reg.restore(value)
+        self.setStatus(status)
+        
     def clear(self):
+        self.clearDecoded()
+        self.__cycles = 0
+        self.__interrupts = 0
         for reg in self.__regList:
             reg.set(0)
-        for indic in self.__indicatorList:
-            indic.set(0)
+        self.setStatus(0)
         
\ No newline at end of file
@@ -0,0 +1,335 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+
+from array import array
+
+import libproc
+
+class Profiler:
+    """
+    Execution profile of the guest program
+    . executions and clock cycles per instruction address
+    . executions per opcode and per mnemonic
+    . interrupt entries and their clock cycles, apart from instructions
+    . call graph: instructions and cycles per subroutine and per call stack (informed of calls and returns by the chip)
+    Counts are kept into arrays allocated once: counting an instruction allocates nothing
+    """
+
+    def __init__(self, chip, memorySize):
+        """
+        @param chip: processor executing the program
+        @param memorySize: number of addresses of the board memory
+        @type  memorySize: integer
+        """
+        self.__chip = chip
+        opcodeCount = 1 << (8 * chip.getInstructionSize())
+        self.__countList = array('L', [0]) * memorySize
+        self.__cycleList = array('L', [0]) * memorySize
+        self.__opcodeList = array('L', [0]) * opcodeCount
+        self.__mnemonicList = sorted(set([inst.getMnemonic() for inst in chip.getInstructionSet()]))
+        self.__mnemonicCountList = array('L', [0]) * len(self.__mnemonicList)
+        # index into mnemonic list per opcode (only valid opcodes are executed)
+        indexDict = dict([(mnemonic, index) for index, mnemonic in enumerate(self.__mnemonicList)])
+        self.__mnemonicIndex = array('H', [0]) * opcodeCount
+        for inst in chip.getInstructionSet():
+            self.__mnemonicIndex[inst.getOpcode()] = indexDict[inst.getMnemonic()]
+        self.__interruptCount = 0
+        self.__interruptCycles = 0
+        self.clearCalls()
+
+    def clear(self):
+        for countList in (self.__countList, self.__cycleList, self.__opcodeList, self.__mnemonicCountList):
+            countList[:] = array('L', [0]) * len(countList)
+        self.__interruptCount = 0
+        self.__interruptCycles = 0
+        self.clearCalls()
+
+    def count(self, address, opcode, cycles):
+        "Called once the instruction at address has been executed"
+        self.__executed += 1
+        self.__countList[address] += 1
+        self.__cycleList[address] += cycles
+        self.__opcodeList[opcode] += 1
+        self.__mnemonicCountList[self.__mnemonicIndex[opcode]] += 1
+
+    def countInterrupt(self, address, waitedCycles, cycles):
+        """
+        Called once an interrupt has been entered before the instruction at address (which is not executed yet)
+
+        @param waitedCycles: cycles spent before the entry (idle loop fast-forwarded): counted for the address
+        @param cycles: cycles of the entry itself
+        """
+        self.__cycleList[address] += waitedCycles
+        self.__interruptCount += 1
+        self.__interruptCycles += cycles
+
+    def getInterruptCount(self):
+        return self.__interruptCount
+
+    def getInterruptCycles(self):
+        return self.__interruptCycles
+
+    def getCount(self, address):
+        return self.__countList[address]
+
+    def getCycles(self, address):
+        return self.__cycleList[address]
+
+    def getOpcodeCount(self, opcode):
+        return self.__opcodeList[opcode]
+
+    def getMnemonicCount(self, mnemonic):
+        if mnemonic not in self.__mnemonicList:
+            return 0
+        return self.__mnemonicCountList[self.__mnemonicList.index(mnemonic)]
+
+    #
+    # CALL GRAPH
+    #
+    #    call stacks are nodes of a tree: the root is the code executed outside any subroutine
+    #    instructions and cycles are attributed to the node on top of the stack when a call or a return happens:
+    #    the calling instruction belongs to the caller, the returning one to the subroutine
+    #
+
+    def clearCalls(self):
+        # instructions executed since clear
+        self.__executed = 0
+        # per node: subroutine address (None for root), parent node, child node per subroutine address,
+        # instructions and cycles spent while the node was on top of the stack
+        self.__nodeAddress = [None]
+        self.__nodeParent = [None]
+        self.__nodeChildren = [{}]
+        self.__nodeInstructions = [0]
+        self.__nodeCycles = [0]
+        # stack of active calls: [node, stack pointer before the call, instructions and cycles when called]
+        self.__stack = []
+        # instructions and cycles when the last call or return happened
+        self.__lastInstructions = 0
+        self.__lastCycles = self.__chip.getCycles()
+        # per subroutine address: [calls, inclusive instructions, inclusive cycles] and number of active calls
+        self.__callDict = {}
+        self.__activeDict = {}
+
+    def __attribute(self, instructions, cycles):
+        "Instructions and cycles since the last call or return go to the node on top of the stack"
+        node = self.__stack[-1][0] if self.__stack else 0
+        self.__nodeInstructions[node] += instructions - self.__lastInstructions
+        self.__nodeCycles[node] += cycles - self.__lastCycles
+        self.__lastInstructions = instructions
+        self.__lastCycles = cycles
+
+    def enterCall(self, address, stackPointer):
+        """
+        Called while executing a subroutine call
+
+        @param address: address of the subroutine
+        @param stackPointer: stack pointer before the return address is pushed
+        """
+        # the calling instruction is not counted yet: it belongs to the caller
+        instructions = self.__executed + 1
+        cycles = self.__chip.getCycles()
+        self.__attribute(instructions, cycles)
+        parent = self.__stack[-1][0] if self.__stack else 0
+        node = self.__nodeChildren[parent].get(address)
+        if node is None:
+            node = len(self.__nodeAddress)
+            self.__nodeAddress.append(address)
+            self.__nodeParent.append(parent)
+            self.__nodeChildren.append({})
+            self.__nodeInstructions.append(0)
+            self.__nodeCycles.append(0)
+            self.__nodeChildren[parent][address] = node
+        self.__stack.append([node, stackPointer, instructions, cycles])
+        if address not in self.__callDict:
+            self.__callDict[address] = [0, 0, 0]
+        self.__callDict[address][0] += 1
+        self.__activeDict[address] = self.__activeDict.get(address, 0) + 1
+
+    def leaveCall(self, stackPointer):
+        """
+        Called while executing a return from subroutine
+
+        @param stackPointer: stack pointer once the return address is pulled
+        Calls whose stack level is reached are left: several ones if the program has removed return addresses itself
+        """
+        # the returning instruction is not counted yet: it belongs to the subroutine
+        instructions = self.__executed
+        cycles = self.__chip.getCycles()
+        stack = self.__stack
+        if (not stack) or (stack[-1][1] > stackPointer):
+            # return without call (address pushed by the program)
+            return
+        self.__attribute(instructions + 1, cycles)
+        while stack and (stack[-1][1] <= stackPointer):
+            node, _, callInstructions, callCycles = stack.pop()
+            address = self.__nodeAddress[node]
+            self.__activeDict[address] -= 1
+            # recursive calls: only the outermost one is counted as inclusive
+            if self.__activeDict[address] == 0:
+                inclusive = self.__callDict[address]
+                inclusive[1] += instructions + 1 - callInstructions
+                inclusive[2] += cycles - callCycles
+
+    def __getCallCounts(self):
+        """
+        Per node: instructions and cycles including those of calls still active
+        Per subroutine address: [calls, inclusive instructions, inclusive cycles, exclusive instructions, exclusive cycles]
+        """
+        instructions = self.__executed
+        cycles = self.__chip.getCycles()
+        nodeInstructions = list(self.__nodeInstructions)
+        nodeCycles = list(self.__nodeCycles)
+        node = self.__stack[-1][0] if self.__stack else 0
+        nodeInstructions[node] += instructions - self.__lastInstructions
+        nodeCycles[node] += cycles - self.__lastCycles
+        subroutineDict = dict([(address, counts + [0, 0]) for address, counts in self.__callDict.items()])
+        for node in range(1, len(self.__nodeAddress)):
+            counts = subroutineDict[self.__nodeAddress[node]]
+            counts[3] += nodeInstructions[node]
+            counts[4] += nodeCycles[node]
+        # active calls (outermost ones) are counted until now
+        counted = set()
+        for node, _, callInstructions, callCycles in self.__stack:
+            address = self.__nodeAddress[node]
+            if address not in counted:
+                counted.add(address)
+                subroutineDict[address][1] += instructions - callInstructions
+                subroutineDict[address][2] += cycles - callCycles
+        return nodeInstructions, nodeCycles, subroutineDict
+
+    def getCallReport(self, program=None):
+        "Subroutines sorted by inclusive cycles: calls, inclusive and exclusive instructions and cycles"
+        _, _, subroutineDict = self.__getCallCounts()
+        nameDict = self.__getNameDict(program)
+        addressList = sorted(subroutineDict, key=lambda address: (-subroutineDict[address][2], address))
+        lines = ['{:16s}{:>8s}{:>14s}{:>14s}{:>14s}{:>14s}'.format("subroutine", "calls", "instructions", "cycles",
+                                                                   "self instr.", "self cycles")]
+        for address in addressList:
+            calls, instructions, cycles, selfInstructions, selfCycles = subroutineDict[address]
+            lines.append('{:16s}{:8d}{:14d}{:14d}{:14d}{:14d}'.format(self.__getName(nameDict, address), calls,
+                                                                      instructions, cycles, selfInstructions, selfCycles))
+        return lines
+
+    def getCollapsedStacks(self, program=None, cycles=True):
+        """
+        Call stacks in collapsed format used by flame graph tools: one line per stack,
+        subroutine names from the outermost one separated by ";" then cycles (or instructions) spent on top of it
+        """
+        nodeInstructions, nodeCycles, _ = self.__getCallCounts()
+        weightList = nodeCycles if cycles else nodeInstructions
+        nameDict = self.__getNameDict(program)
+        rootName = "main"
+        if program and (program.getCodeBase() in nameDict):
+            rootName = nameDict[program.getCodeBase()]
+        lines = []
+        pathList = [rootName]
+        for node in range(1, len(self.__nodeAddress)):
+            pathList.append(pathList[self.__nodeParent[node]] + ";" + self.__getName(nameDict, self.__nodeAddress[node]))
+        for node in range(len(pathList)):
+            if weightList[node]:
+                lines.append(pathList[node] + " " + str(weightList[node]))
+        return lines
+
+    def __getNameDict(self, program):
+        "Label per address (first label in alphabetical order when there are several)"
+        nameDict = {}
+        if program:
+            for label, address in sorted(program.labelDict.items(), reverse=True):
+                nameDict[address] = label
+        return nameDict
+
+    def __getName(self, nameDict, address):
+        if address in nameDict:
+            return nameDict[address]
+        return "x" + libproc.ltoh(address, self.__chip.getAddressSize())
+
+    #
+    # REPORT
+    #
+
+    def getAddressReport(self, program=None, maxLines=None):
+        """
+        Executed instructions sorted by cycles spent (then by executions), one line per address:
+        address, executions, cycles, share of all cycles and source instruction (if program is given)
+        Interrupt entries, if any, are given last
+        """
+        countList = self.__countList
+        cycleList = self.__cycleList
+        addressList = [address for address in range(len(countList)) if countList[address]]
+        addressList.sort(key=lambda address: (-cycleList[address], -countList[address], address))
+        if maxLines is not None:
+            addressList = addressList[:maxLines]
+        lineDict = self.__getLineDict(program)
+        totalCycles = max(1, sum(cycleList) + self.__interruptCycles)
+        addressSize = self.__chip.getAddressSize()
+        lines = ['{:8s}{:>12s}{:>12s}{:>8s}  {:s}'.format("address", "executions", "cycles", "%", "instruction")]
+        for address in addressList:
+            source = ""
+            if address in lineDict:
+                instLine = lineDict[address]
+                source = '{:8s} {:s} {:s}'.format(instLine.getLabel(), instLine.getMnemonic(), instLine.getOperand())
+            lines.append('x{:7s}{:12d}{:12d}{:8.2f}  {:s}'.format(libproc.ltoh(address, addressSize), countList[address],
+                         cycleList[address], 100.0 * cycleList[address] / totalCycles, source.rstrip()))
+        if self.__interruptCount:
+            lines.append('{:8s}{:12d}{:12d}{:8.2f}  {:s}'.format("-", self.__interruptCount, self.__interruptCycles,
+                         100.0 * self.__interruptCycles / totalCycles, "interrupt entry"))
+        return lines
+
+    def getMnemonicReport(self):
+        "Executions per mnemonic, most executed first"
+        countList = self.__mnemonicCountList
+        total = max(1, sum(countList))
+        indexList = [index for index in range(len(countList)) if countList[index]]
+        indexList.sort(key=lambda index: (-countList[index], self.__mnemonicList[index]))
+        lines = ['{:10s}{:>12s}{:>8s}'.format("mnemonic", "executions", "%")]
+        for index in indexList:
+            lines.append('{:10s}{:12d}{:8.2f}'.format(self.__mnemonicList[index], countList[index],
+                                                       100.0 * countList[index] / total))
+        return lines
+
+    def getOpcodeReport(self):
+        "Executions per opcode, most executed first"
+        opcodeList = self.__opcodeList
+        chip = self.__chip
+        size = chip.getInstructionSize()
+        total = max(1, sum(opcodeList))
+        executedList = [opcode for opcode in range(len(opcodeList)) if opcodeList[opcode]]
+        executedList.sort(key=lambda opcode: (-opcodeList[opcode], opcode))
+        lines = ['{:8s}{:10s}{:>12s}{:>8s}'.format("opcode", "mnemonic", "executions", "%")]
+        for opcode in executedList:
+            inst = chip.lookForInstruction(opcode)
+            lines.append('x{:7s}{:10s}{:12d}{:8.2f}'.format(libproc.ltoh(opcode, size), inst.getMnemonic(),
+                                                             opcodeList[opcode], 100.0 * opcodeList[opcode] / total))
+        return lines
+
+    def getAnnotatedSource(self, program, fileName):
+        """
+        Lines of the source file, each one preceded by executions and cycles of its instruction
+        (blank for lines without instruction)
+        """
+        countDict = {}
+        for instLine in program.getInstructionList():
+            if instLine.type == instLine.Code:
+                address = instLine.getAddress()
+                countDict[instLine.getLineNb()] = (self.__countList[address], self.__cycleList[address])
+        lines = []
+        with open(fileName) as sourceFile:
+            for lineNb, line in enumerate(sourceFile, 1):
+                if lineNb in countDict:
+                    count, cycles = countDict[lineNb]
+                    prefix = '{:10d} {:10d} |'.format(count, cycles)
+                else:
+                    prefix = '{:21s} |'.format("")
+                lines.append(prefix + line.rstrip("\r\n"))
+        return lines
+
+    def __getLineDict(self, program):
+        "Source instruction per address"
+        lineDict = {}
+        if program:
+            for instLine in program.getInstructionList():
+                if instLine.type == instLine.Code:
+                    lineDict[instLine.getAddress()] = instLine
+        return lineDict
@@ -497,16 +497,15 @@ class Program:
         codeAddress = -1
         for instLine in self.instructionList:
             if instLine.type == instLine.Data:
-                memory.set(instLine.address, instLine.size, instLine.value)
+                memory.loadBytes(instLine.address, memory.toBytes(instLine.value, instLine.size))
             elif instLine.type == instLine.Code:
-                address = instLine.address
                 if (codeAddress == -1):
-                    codeAddress = address
-                memory.set(address, instLine.size, instLine.opcode)
-                address += instLine.size
+                    codeAddress = instLine.address
+                # opcode and operands written at once
+                data = memory.toBytes(instLine.opcode, instLine.size)
                 for operand in instLine.operandList:
-                    memory.set(address, operand.size, operand.value)
-                    address += operand.size
+                    data += memory.toBytes(operand.value, operand.size)
+                memory.loadBytes(instLine.address, data)
         
         if (codeAddress == -1):
             raise ProgramError(Error.error, ["No instruction"])
@@ -0,0 +1,118 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# Device events scheduled on the cycle counter of the processor
+#
+#    events are kept into a heap ordered by deadline: the processor only compares its cycle counter
+#    with the nearest deadline before each instruction, events are run once it is reached
+#
+
+import heapq
+
+class Event:
+    "Function called when the cycle counter reaches a deadline"
+
+    def __init__(self, cycle, fct):
+        self.cycle = cycle
+        self.fct = fct
+        self.cancelled = False
+
+    def getCycle(self):
+        return self.cycle
+
+    def isPending(self):
+        return (self.fct is not None) and (not self.cancelled)
+
+
+class Scheduler:
+
+    # deadline when no event is scheduled
+    never = float("inf")
+
+    def __init__(self):
+        # (deadline, sequence number, event): events with the same deadline run in scheduling order
+        self.__heap = []
+        self.__sequence = 0
+        self.__nextCycle = Scheduler.never
+        # function called with the nearest deadline when it changes
+        self.__listener = None
+
+    def whenNextChanged(self, fct):
+        self.__listener = fct
+        fct(self.__nextCycle)
+
+    def getNextCycle(self):
+        "Nearest deadline, Scheduler.never if no event is pending"
+        return self.__nextCycle
+
+    def getPendingCount(self):
+        return len([entry for entry in self.__heap if not entry[2].cancelled])
+
+    def schedule(self, cycle, fct):
+        """
+        Call fct(cycle) once the cycle counter reaches cycle
+        Return the event (see cancel())
+        """
+        event = Event(cycle, fct)
+        heapq.heappush(self.__heap, (cycle, self.__sequence, event))
+        self.__sequence += 1
+        if (cycle < self.__nextCycle):
+            self.__setNext(cycle)
+        return event
+
+    def cancel(self, event):
+        "The event is dropped from the heap when it reaches its top"
+        event.cancelled = True
+        if (event.cycle == self.__nextCycle):
+            self.__purge()
+
+    def run(self, cycle):
+        "Run events whose deadline is reached: called by the processor when cycle >= getNextCycle()"
+        heap = self.__heap
+        while heap and (heap[0][0] <= cycle):
+            event = heapq.heappop(heap)[2]
+            if not event.cancelled:
+                fct = event.fct
+                event.fct = None
+                fct(event.cycle)
+        self.__purge()
+
+    def saveState(self):
+        "Pending events: see restoreState()"
+        return (self.__sequence, [(entry, entry[2].fct) for entry in self.__heap if not entry[2].cancelled])
+
+    def restoreState(self, state):
+        "Events pending when the state was saved are pending again (same Event objects), the others are cancelled"
+        self.__sequence, entryList = state
+        for entry in self.__heap:
+            entry[2].cancelled = True
+        self.__heap = []
+        for entry, fct in entryList:
+            entry[2].fct = fct
+            entry[2].cancelled = False
+            self.__heap.append(entry)
+        heapq.heapify(self.__heap)
+        self.__purge()
+
+    def clear(self):
+        for entry in self.__heap:
+            entry[2].cancelled = True
+        self.__heap = []
+        self.__setNext(Scheduler.never)
+
+    def __purge(self):
+        "Drop cancelled events from the top of the heap and update the nearest deadline"
+        heap = self.__heap
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+        if heap:
+            self.__setNext(heap[0][0])
+        else:
+            self.__setNext(Scheduler.never)
+
+    def __setNext(self, cycle):
+        self.__nextCycle = cycle
+        if (self.__listener is not None):
+            self.__listener(cycle)
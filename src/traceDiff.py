@@ -0,0 +1,136 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# Comparison of two execution traces (see traceFile)
+#
+#    reports the first instruction where both runs diverge: address, registers, status,
+#    cycles or memory write
+#    traces are compared per block of records with byte comparison of their memory-mapped files,
+#    the first differing block is then bisected down to the first differing record
+#
+#    board_simulator --tracediff <trace> <trace>
+#
+
+import sys
+import argparse
+
+import libproc
+from traceFile import TraceReader
+
+# records compared at once
+blockRecords = 65536
+
+def findDivergence(first, second):
+    """
+    Index of the first record differing between both traces
+    Length of the shortest trace if one is the beginning of the other, None if they are identical
+    """
+    if first.registerNameList != second.registerNameList:
+        raise ValueError("traces of different processors")
+    size = first.getRecordSize()
+    count = min(len(first), len(second))
+    start = 0
+    while start < count:
+        stop = min(start + blockRecords, count)
+        firstBlock = first.getBytes(start, stop)
+        secondBlock = second.getBytes(start, stop)
+        if firstBlock != secondBlock:
+            # records before low are equal, the first differing one is before high
+            low = 0
+            high = stop - start
+            while high - low > 1:
+                middle = (low + high) / 2
+                if firstBlock[low * size:middle * size] == secondBlock[low * size:middle * size]:
+                    low = middle
+                else:
+                    high = middle
+            return start + low
+        start = stop
+    if len(first) != len(second):
+        return count
+    return None
+
+def getDifferenceList(firstRecord, secondRecord, registerNameList):
+    "Names of fields differing between two records"
+    nameList = []
+    if firstRecord.address != secondRecord.address:
+        nameList.append("address")
+    if firstRecord.opcode != secondRecord.opcode:
+        nameList.append("opcode")
+    if firstRecord.operand != secondRecord.operand:
+        nameList.append("operand")
+    for name, firstValue, secondValue in zip(registerNameList, firstRecord.registers, secondRecord.registers):
+        if firstValue != secondValue:
+            nameList.append(name)
+    if firstRecord.status != secondRecord.status:
+        nameList.append("status")
+    if firstRecord.cycles != secondRecord.cycles:
+        nameList.append("cycles")
+    if (firstRecord.writeAddress, firstRecord.writeValue, firstRecord.writeCount) != \
+       (secondRecord.writeAddress, secondRecord.writeValue, secondRecord.writeCount):
+        nameList.append("memory write")
+    return nameList
+
+def formatRecord(record, registerNameList):
+    if record.isInterrupt():
+        text = '{:10d}  x{:s}  interrupt -> x{:s}'.format(record.index, libproc.ltoh(record.address, 2),
+                                                          libproc.ltoh(record.operand, 2))
+    else:
+        text = '{:10d}  x{:s}  x{:s} {:6d}'.format(record.index, libproc.ltoh(record.address, 2),
+                                                   libproc.ltoh(record.opcode, 1), record.operand)
+    for name, value in zip(registerNameList, record.registers):
+        text += "  " + name + "=" + str(value)
+    text += "  status=x" + libproc.ltoh(record.status, 1) + "  cycles=" + str(record.cycles)
+    if record.writeCount:
+        text += "  write x" + libproc.ltoh(record.writeAddress, 2) + "=" + str(record.writeValue)
+        if record.writeCount > 1:
+            text += " (" + str(record.writeCount) + " bytes)"
+    return text
+
+def getReport(first, second, index, context=3):
+    "Lines describing the divergence at index: previous records (identical in both traces) then both records"
+    nameList = first.registerNameList
+    lines = ["first divergence at instruction " + str(index)]
+    for record in first.iterate(max(0, index - context), index):
+        lines.append("    " + formatRecord(record, nameList))
+    if index < len(first) and index < len(second):
+        firstRecord = first[index]
+        secondRecord = second[index]
+        lines.append("<   " + formatRecord(firstRecord, nameList))
+        lines.append(">   " + formatRecord(secondRecord, nameList))
+        lines.append("differences: " + ", ".join(getDifferenceList(firstRecord, secondRecord, nameList)))
+    elif index < len(first):
+        lines.append("<   " + formatRecord(first[index], nameList))
+        lines.append("second trace ends")
+    else:
+        lines.append("first trace ends")
+        lines.append(">   " + formatRecord(second[index], nameList))
+    return lines
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="board_simulator --tracediff",
+                                     description="Report the first instruction where two execution traces diverge")
+    parser.add_argument("--tracediff", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--context", type=int, default=3, help="identical records displayed before the divergence")
+    parser.add_argument("first", help="trace file (board_simulator --headless --trace)")
+    parser.add_argument("second", help="trace file")
+    args = parser.parse_args(argv)
+
+    try:
+        first = TraceReader(args.first)
+        second = TraceReader(args.second)
+        index = findDivergence(first, second)
+    except (IOError, ValueError) as e:
+        sys.stderr.write(str(e) + "\n")
+        return 2
+    if index is None:
+        print str(len(first)) + " identical instructions"
+        return 0
+    for line in getReport(first, second, index, args.context):
+        print line
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
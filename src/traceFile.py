@@ -0,0 +1,178 @@
+# -*- coding:utf-8 -*- 
+#
+# Copyright(C) 2014 Laurent Faipot (laurent.faipot@free.fr). All rights reserved.
+#
+#
+# Binary execution trace
+#
+#    one fixed-size record per executed instruction, appended to a file
+#
+#    header:  magic (8 bytes), register count and record size (2 little-endian unsigned shorts),
+#             register names (8 bytes each, padded with zeros)
+#    record:  address of the instruction, opcode, first operand, cycles once executed, registers and status
+#             once executed, first memory write of the instruction (address, value) and number of written bytes
+#             all little-endian, address -1 when nothing is written
+#    interrupt entry: record of its own with opcode 0xffff, address of the interrupted instruction (not executed yet),
+#             handler address as operand, cycles and registers once entered, first write of the pushed bytes
+#
+
+import mmap
+import struct
+
+class TraceRecorder:
+    """
+    Append records to a trace file: records are packed into a chunk written to the file when it is full
+    Nothing but the chunk is kept in memory
+    """
+
+    magic = "BSIMTRC1"
+    headerFormat = "<HH"
+    nameSize = 8
+    # records packed before writing the chunk to the file
+    chunkRecords = 16384
+    # opcode of the records of interrupt entries
+    interruptOpcode = 0xffff
+
+    @staticmethod
+    def getRecordFormat(registerCount):
+        "address, opcode, operand, cycles, registers, status, write address, write value, written bytes"
+        return "<IHiQ" + "i" * registerCount + "IiiH"
+
+    def __init__(self, fileName, chip):
+        """
+        Create (or overwrite) the trace file
+
+        @param fileName: trace file
+        @param chip: processor whose registers are recorded
+        """
+        self.__regList = chip.getRegisterList()
+        self.__record = struct.Struct(TraceRecorder.getRecordFormat(len(self.__regList)))
+        self.__chunk = bytearray(self.__record.size * TraceRecorder.chunkRecords)
+        self.__offset = 0
+        self.__count = 0
+        self.__file = open(fileName, "wb")
+        header = TraceRecorder.magic + struct.pack(TraceRecorder.headerFormat, len(self.__regList), self.__record.size)
+        for reg in self.__regList:
+            header += reg.getName()[:TraceRecorder.nameSize].ljust(TraceRecorder.nameSize, "\0")
+        self.__file.write(header)
+        self.startInstruction()
+
+    def getCount(self):
+        "Number of recorded instructions"
+        return self.__count
+
+    def startInstruction(self):
+        # first memory write of the instruction being executed
+        self.__writeAddress = -1
+        self.__writeValue = 0
+        self.__writeCount = 0
+
+    def write(self, address, length, value):
+        "Called by memory for each write of the instruction being executed"
+        if self.__writeCount == 0:
+            self.__writeAddress = address
+            self.__writeValue = value
+        self.__writeCount += length
+
+    def record(self, address, opcode, operand, cycles, status):
+        "Called once the instruction at address has been executed"
+        valueList = [reg.get() for reg in self.__regList]
+        self.__record.pack_into(self.__chunk, self.__offset, address, opcode, operand, cycles, *(valueList +
+                                [status, self.__writeAddress, self.__writeValue, self.__writeCount & 0xffff]))
+        self.__offset += self.__record.size
+        self.__count += 1
+        if self.__offset == len(self.__chunk):
+            self.flush()
+        self.startInstruction()
+
+    def recordInterrupt(self, address, handler, cycles, status):
+        "Called once an interrupt has been entered before the instruction at address"
+        self.record(address, TraceRecorder.interruptOpcode, handler, cycles, status)
+
+    def flush(self):
+        self.__file.write(self.__chunk[:self.__offset])
+        self.__offset = 0
+        self.__file.flush()
+
+    def close(self):
+        if not self.__file.closed:
+            self.flush()
+            self.__file.close()
+
+
+class TraceRecord:
+    "One executed instruction read from a trace file"
+
+    def __init__(self, index, valueTuple, registerCount):
+        self.index = index
+        self.address, self.opcode, self.operand, self.cycles = valueTuple[:4]
+        self.registers = valueTuple[4:4 + registerCount]
+        self.status, self.writeAddress, self.writeValue, self.writeCount = valueTuple[4 + registerCount:]
+
+    def isInterrupt(self):
+        "Interrupt entry: address of the interrupted instruction, handler address as operand"
+        return self.opcode == TraceRecorder.interruptOpcode
+
+
+class TraceReader:
+    """
+    Read a trace file through a memory map: records are only read when they are accessed
+    """
+
+    def __init__(self, fileName):
+        with open(fileName, "rb") as traceFile:
+            if traceFile.read(len(TraceRecorder.magic)) != TraceRecorder.magic:
+                raise IOError(fileName + ": not a trace file")
+            registerCount, recordSize = struct.unpack(TraceRecorder.headerFormat,
+                                                      traceFile.read(struct.calcsize(TraceRecorder.headerFormat)))
+            self.registerNameList = []
+            for _ in range(registerCount):
+                self.registerNameList.append(traceFile.read(TraceRecorder.nameSize).rstrip("\0"))
+            self.__base = traceFile.tell()
+            self.__record = struct.Struct(TraceRecorder.getRecordFormat(registerCount))
+            if self.__record.size != recordSize:
+                raise IOError(fileName + ": invalid record size")
+            traceFile.seek(0, 2)
+            self.__count = (traceFile.tell() - self.__base) / recordSize
+            self.__map = None
+            if self.__count > 0:
+                self.__map = mmap.mmap(traceFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.__count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.__count
+        if (index < 0) or (index >= self.__count):
+            raise IndexError("trace record index out of range")
+        return TraceRecord(index, self.__record.unpack_from(self.__map, self.__base + index * self.__record.size),
+                           len(self.registerNameList))
+
+    def __iter__(self):
+        return self.iterate()
+
+    def iterate(self, start=0, stop=None):
+        "Records from index start to stop (excluded)"
+        if stop is None or stop > self.__count:
+            stop = self.__count
+        unpack = self.__record.unpack_from
+        size = self.__record.size
+        registerCount = len(self.registerNameList)
+        for index in xrange(start, stop):
+            yield TraceRecord(index, unpack(self.__map, self.__base + index * size), registerCount)
+
+    def getRecordSize(self):
+        return self.__record.size
+
+    def getBytes(self, start, stop):
+        "Raw bytes of records from index start to stop (excluded)"
+        size = self.__record.size
+        if self.__map is None:
+            return ""
+        return self.__map[self.__base + start * size:self.__base + min(stop, self.__count) * size]
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None